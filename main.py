@@ -3,7 +3,7 @@ import sys
 import os
 import asyncio
 import uvicorn
-from typing import Dict
+from typing import Dict, Optional
 
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
@@ -11,12 +11,26 @@ from fastapi import FastAPI, Request, Response
 from telegram import Update
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, filters,
-    ConversationHandler, CallbackQueryHandler, ContextTypes, ExtBot
+    CallbackQueryHandler, ContextTypes, ExtBot, TypeHandler
 )
 
 from src.shared.logger import logger
 from src.shared.config import (
-    PUBLIC_APP_URL, PORT, RUN_MODE, 
+    PUBLIC_APP_URL, PORT, RUN_MODE, UPDATE_DISPATCH_MODE, UPDATE_CONCURRENCY_LIMIT,
+    WEBHOOK_INGRESS_MODE, SPOOL_DB_PATH, SPOOL_MAX_IN_FLIGHT, SPOOL_POLL_INTERVAL, SPOOL_LEASE_SECONDS, SPOOL_MAX_ATTEMPTS,
+    UPDATE_DEDUP_ENABLED, UPDATE_DEDUP_DB_PATH, UPDATE_DEDUP_TTL, UPDATE_DEDUP_MAX_ENTRIES,
+    STATE_PERSISTENCE_ENABLED, STATE_DB_PATH, FAQ_INDEX_ENABLED, FAQ_FILE_PATH,
+    RAG_ENABLED, VECTOR_CACHE_DIR, VECTOR_CACHE_REFRESH_INTERVAL, VECTOR_INDEX_QUANTIZED,
+    VECTOR_ANN_MIN_CHUNKS, VECTOR_ANN_LISTS, VECTOR_ANN_PROBE, RAG_FUSION, RAG_HYBRID_ALPHA, RAG_RRF_K, RAG_CANDIDATES, RAG_BM25_THRESHOLD,
+    EMBEDDING_CACHE_ENABLED, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_MODEL_NAME,
+    EMBEDDING_BATCH_MAX_SIZE, EMBEDDING_BATCH_MAX_WAIT_MS, TENANT_CONFIG_TTL, TENANT_CONFIG_DB_PATH,
+    MESSAGE_JOURNAL_ENABLED, MESSAGE_JOURNAL_DIR, MESSAGE_JOURNAL_BATCH_SIZE, MESSAGE_JOURNAL_FLUSH_INTERVAL,
+    CONVERSATION_MEMORY_ENABLED, CONVERSATION_MEMORY_MAX_MESSAGES, CONVERSATION_MEMORY_IDLE_TTL,
+    CONVERSATION_MEMORY_MAX_MB, CONVERSATION_MEMORY_DB_PATH,
+    CONVERSATION_SUMMARY_ENABLED, CONVERSATION_SUMMARY_EVERY_TURNS, CONVERSATION_SUMMARY_KEEP_RECENT,
+    CONVERSATION_SUMMARY_MAX_BATCH, CONVERSATION_SUMMARY_MAX_CHARS, CONVERSATION_SUMMARY_MAX_CONCURRENCY,
+    CONVERSATION_SUMMARY_DB_PATH,
+    INTENT_MODEL_PATH,
     GET_NAME, GET_DEBT, GET_INCOME, GET_REGION,
     GET_BROADCAST_MESSAGE, GET_BROADCAST_MEDIA, CONFIRM_BROADCAST,
     CHECKLIST_ACTION, CHECKLIST_UPLOAD_FILE
@@ -24,14 +38,38 @@ from src.shared.config import (
 from src.infra.clients.supabase_repo import SupabaseRepo
 from src.infra.clients.openrouter_client import OpenRouterClient
 from src.infra.clients.hf_whisper_client import WhisperClient
+from src.infra.clients.embedding_client import EmbeddingClient
+from src.infra.clients.embedding_batcher import EmbeddingBatcher
+from src.infra.knowledge.faq_index import FaqIndex
+from src.infra.knowledge.vector_store import VectorStore
+from src.infra.knowledge.hybrid_retriever import HybridRetriever
+from src.infra.knowledge.embedding_cache import EmbeddingCache
+from src.infra.storage.update_spool import UpdateSpool, SpoolConsumer, SpooledUpdate
+from src.infra.storage.update_dedup import UpdateDeduplicator
+from src.infra.storage.sqlite_persistence import SQLitePersistence
+from src.infra.storage.message_journal import MessageJournal
 from src.app.services.ai_service import AIService
 from src.app.services.lead_service import LeadService
 from src.app.services.analytics_service import AnalyticsService
+from src.app.services.tenant_config import TenantConfigCache
+from src.app.services.intent_classifier import IntentClassifier
+from src.app.services.model_router import DEFAULT_ROUTE
+from src.app.memory.conversation_memory import ConversationMemory
+from src.app.memory.summarizer import ConversationSummarizer
 from src.api.telegram import user_handlers, admin_handlers
+from src.api.telegram.update_processor import ChatOrderedUpdateProcessor
+from src.api.telegram.shared_conversation import SharedConversationHandler, sync_shared_conversations
 
 fastapi_app = FastAPI(docs_url=None, redoc_url=None)
 bots: Dict[str, Application] = {}
 client_configs: Dict[str, Dict] = {}
+common_services: Dict = {}
+spool: Optional[UpdateSpool] = None
+spool_consumer: Optional[SpoolConsumer] = None
+deduplicator: Optional[UpdateDeduplicator] = None
+embedding_batcher: Optional[EmbeddingBatcher] = None
+message_journal: Optional[MessageJournal] = None
+summarizer: Optional[ConversationSummarizer] = None
 
 def register_handlers(app: Application):
     form_button_filter = filters.Regex('^📝 Заполнить анкету$')
@@ -47,8 +85,9 @@ def register_handlers(app: Application):
     checklist_management_button_filter = filters.Regex('^🧩 Управление Чек-листом$')
 
     form_text_filter = filters.TEXT & ~filters.COMMAND & ~cancel_filter
+    persistent = app.persistence is not None
 
-    form_conv_handler = ConversationHandler(
+    form_conv_handler = SharedConversationHandler(
         entry_points=[MessageHandler(form_button_filter, user_handlers.start_form)],
         states={
             GET_NAME: [MessageHandler(form_text_filter, user_handlers.get_name)],
@@ -57,9 +96,10 @@ def register_handlers(app: Application):
             GET_REGION: [MessageHandler(form_text_filter, user_handlers.get_region)],
         },
         fallbacks=[CommandHandler('cancel', user_handlers.cancel), MessageHandler(cancel_filter, user_handlers.cancel)],
+        name='form', persistent=persistent,
     )
 
-    broadcast_conv_handler = ConversationHandler(
+    broadcast_conv_handler = SharedConversationHandler(
         entry_points=[MessageHandler(broadcast_menu_button_filter, admin_handlers.broadcast_start)],
         states={
             GET_BROADCAST_MESSAGE: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_handlers.broadcast_get_message)],
@@ -73,9 +113,10 @@ def register_handlers(app: Application):
             ]
         },
         fallbacks=[CommandHandler('cancel', admin_handlers.broadcast_cancel), MessageHandler(cancel_filter, admin_handlers.broadcast_cancel)],
+        name='broadcast', persistent=persistent,
     )
     
-    checklist_conv_handler = ConversationHandler(
+    checklist_conv_handler = SharedConversationHandler(
         entry_points=[MessageHandler(checklist_management_button_filter, admin_handlers.checklist_management_start)],
         states={
             CHECKLIST_ACTION: [
@@ -89,8 +130,11 @@ def register_handlers(app: Application):
             ]
         },
         fallbacks=[CommandHandler('cancel', admin_handlers.checklist_cancel), MessageHandler(cancel_filter, admin_handlers.checklist_cancel)],
+        name='checklist_management', persistent=persistent,
     )
     
+    # Свежие настройки клиента в bot_data до всех остальных обработчиков
+    app.add_handler(TypeHandler(Update, user_handlers.sync_tenant_config), group=-1)
     app.add_handler(CommandHandler("start", user_handlers.start))
     app.add_handler(CommandHandler("admin", admin_handlers.admin_panel))
     app.add_handler(CommandHandler("stats", admin_handlers.stats))
@@ -100,6 +144,7 @@ def register_handlers(app: Application):
     app.add_handler(CommandHandler("health_check", admin_handlers.health_check))
     app.add_handler(CommandHandler("get_prompt", admin_handlers.get_prompt))
     app.add_handler(CommandHandler("set_prompt", admin_handlers.set_prompt))
+    app.add_handler(CommandHandler("perf_stats", admin_handlers.perf_stats))
 
     app.add_handler(MessageHandler(stats_button_filter, admin_handlers.stats))
     app.add_handler(MessageHandler(export_button_filter, admin_handlers.export_leads))
@@ -129,15 +174,15 @@ def register_handlers(app: Application):
     app.add_handler(MessageHandler(text_filter, user_handlers.handle_text_message))
 
 async def setup_bot(token: str, client_config: Dict, common_services: Dict) -> Application:
-    app = Application.builder().token(token).build()
+    builder = Application.builder().token(token)
+    if UPDATE_DISPATCH_MODE == 'CONCURRENT':
+        builder = builder.concurrent_updates(ChatOrderedUpdateProcessor(UPDATE_CONCURRENCY_LIMIT, client_config['id']))
+    if STATE_PERSISTENCE_ENABLED:
+        builder = builder.persistence(SQLitePersistence(STATE_DB_PATH, namespace=client_config['id']))
+    app = builder.build()
     app.bot_data.update(common_services)
     app.bot_data['client_id'] = client_config['id']
-    app.bot_data['manager_contact'] = client_config.get('manager_contact')
-    app.bot_data['checklist_data'] = client_config.get('checklist_data')
-    app.bot_data['quiz_data'] = client_config.get('quiz_data')
-    app.bot_data['google_sheet_id'] = client_config.get('google_sheet_id')
-    app.bot_data['lead_magnet_enabled'] = client_config.get('lead_magnet_enabled')
-    app.bot_data['lead_magnet_file_id'] = client_config.get('lead_magnet_file_id')
+    await common_services['tenant_configs'].sync_bot_data(app.bot_data, client_config['id'])
     register_handlers(app)
     await app.initialize()
     await app.start()
@@ -154,38 +199,161 @@ async def setup_bot(token: str, client_config: Dict, common_services: Dict) -> A
 
     return app
 
+async def dispatch_update(app: Application, update: Update):
+    """Передает апдейт в обработку с учетом выбранного режима диспетчеризации."""
+    processor = app.update_processor
+    if isinstance(processor, ChatOrderedUpdateProcessor):
+        await processor.submit(update, _process_and_persist(app, update))
+    else:
+        await _process_and_persist(app, update)
+
+async def _process_and_persist(app: Application, update: Update):
+    # Состояния диалогов могли измениться в другом воркере
+    await sync_shared_conversations(app, update)
+    await app.process_update(update)
+    if app.persistence is not None:
+        # Сохраняем состояние сразу, чтобы следующий апдейт этого чата в другом воркере его увидел
+        await app.update_persistence()
+
+async def process_spooled_update(item: SpooledUpdate):
+    app = bots.get(item.bot_token)
+    if app is None:
+        logger.warning(f"Dropping spooled update {item.update_id}: bot ...{item.bot_token[-4:]} is not active.")
+        return
+    await dispatch_update(app, Update.de_json(item.payload, app.bot))
+
 @fastapi_app.post("/{bot_token}")
 async def handle_webhook(bot_token: str, request: Request):
-    if bot_token in bots:
-        update = Update.de_json(await request.json(), bots[bot_token].bot)
-        await bots[bot_token].process_update(update)
-        return Response(status_code=200)
-    return Response(status_code=404)
+    if bot_token not in bots:
+        return Response(status_code=404)
+    try:
+        payload = await request.json()
+        update = Update.de_json(payload, bots[bot_token].bot)
+    except Exception as e:
+        logger.warning(f"Rejected malformed update for bot ...{bot_token[-4:]}: {e}")
+        return Response(status_code=400)
+    if update is None:
+        return Response(status_code=400)
+    bot_key = UpdateDeduplicator.bot_key(bot_token)
+    if deduplicator is not None:
+        if await asyncio.to_thread(deduplicator.is_duplicate, bot_key, update.update_id):
+            logger.info(f"Skipping duplicate update {update.update_id} for bot {bot_key}.")
+            return Response(status_code=200)
+    try:
+        if spool_consumer is not None:
+            chat_id = update.effective_chat.id if update.effective_chat else None
+            await asyncio.to_thread(spool.append, bot_token, update.update_id, chat_id, payload)
+            spool_consumer.notify()
+        else:
+            await dispatch_update(bots[bot_token], update)
+    except Exception:
+        # Апдейт не принят: Telegram получит 500 и повторит доставку, которую нельзя считать дубликатом
+        if deduplicator is not None:
+            await asyncio.to_thread(deduplicator.forget, bot_key, update.update_id)
+        raise
+    return Response(status_code=200)
 
 @fastapi_app.on_event("startup")
 async def startup_event():
     logger.info("Application startup...")
+    global spool, spool_consumer, deduplicator, embedding_batcher, message_journal, summarizer
     supabase_repo = SupabaseRepo()
-    common_services = {
-        'ai_service': AIService(OpenRouterClient(), WhisperClient(), supabase_repo),
+    faq_index = FaqIndex(FAQ_FILE_PATH) if FAQ_INDEX_ENABLED else None
+    embedding_client, retriever = None, None
+    if RAG_ENABLED:
+        fusion = RAG_FUSION
+        if fusion != 'bm25' and not EmbeddingClient.is_available():
+            # Чанки и BM25 берутся из кэша базы знаний, энкодер нужен только для векторов запросов
+            logger.warning(f"sentence-transformers is not installed: RAG falls back from '{fusion}' to BM25-only retrieval.")
+            fusion = 'bm25'
+        if fusion != 'bm25':
+            embedding_cache = None
+            if EMBEDDING_CACHE_ENABLED:
+                embedding_cache = EmbeddingCache(EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_NAME, EMBEDDING_CACHE_MAX_ENTRIES)
+            embedding_batcher = EmbeddingBatcher(
+                EmbeddingClient(EMBEDDING_MODEL_NAME, cache=embedding_cache),
+                EMBEDDING_BATCH_MAX_SIZE, EMBEDDING_BATCH_MAX_WAIT_MS
+            )
+            embedding_batcher.start()
+            embedding_client = embedding_batcher
+        vector_store = VectorStore(
+            supabase_repo, VECTOR_CACHE_DIR, VECTOR_CACHE_REFRESH_INTERVAL, quantize=VECTOR_INDEX_QUANTIZED,
+            ann_min_chunks=VECTOR_ANN_MIN_CHUNKS, ann_lists=VECTOR_ANN_LISTS, ann_probe=VECTOR_ANN_PROBE
+        )
+        retriever = HybridRetriever(vector_store, fusion, RAG_HYBRID_ALPHA, RAG_RRF_K, RAG_CANDIDATES, RAG_BM25_THRESHOLD)
+    conversation_memory = None
+    if CONVERSATION_MEMORY_ENABLED:
+        conversation_memory = ConversationMemory(
+            CONVERSATION_MEMORY_DB_PATH, CONVERSATION_MEMORY_MAX_MESSAGES,
+            CONVERSATION_MEMORY_IDLE_TTL, CONVERSATION_MEMORY_MAX_MB * 1024 * 1024
+        )
+    if MESSAGE_JOURNAL_ENABLED:
+        # Версии диалогов в памяти растут только после записи строк в БД, в том числе строк из replay
+        message_journal = MessageJournal(
+            supabase_repo, MESSAGE_JOURNAL_DIR, MESSAGE_JOURNAL_BATCH_SIZE, MESSAGE_JOURNAL_FLUSH_INTERVAL,
+            on_confirmed=conversation_memory.confirm if conversation_memory is not None else None
+        )
+        message_journal.start()
+        await asyncio.to_thread(message_journal.replay)
+    tenant_configs = TenantConfigCache(supabase_repo, TENANT_CONFIG_DB_PATH, TENANT_CONFIG_TTL)
+    or_client = OpenRouterClient()
+    if CONVERSATION_SUMMARY_ENABLED:
+        summarizer = ConversationSummarizer(
+            or_client, supabase_repo, CONVERSATION_SUMMARY_DB_PATH, CONVERSATION_SUMMARY_KEEP_RECENT,
+            CONVERSATION_SUMMARY_EVERY_TURNS, CONVERSATION_SUMMARY_MAX_BATCH, CONVERSATION_SUMMARY_MAX_CHARS,
+            CONVERSATION_SUMMARY_MAX_CONCURRENCY, CONVERSATION_MEMORY_IDLE_TTL
+        )
+        summarizer.start()
+    intent_classifier = IntentClassifier.load(INTENT_MODEL_PATH)
+    if intent_classifier is None:
+        logger.warning(
+            f"Without an intent model every question uses the '{DEFAULT_ROUTE}' model route. "
+            f"Train it with scripts/train_intent_classifier.py and deploy it to {INTENT_MODEL_PATH}."
+        )
+    common_services.update({
+        'ai_service': AIService(
+            or_client, WhisperClient(), supabase_repo,
+            faq_index=faq_index, embedding_client=embedding_client, retriever=retriever,
+            tenant_configs=tenant_configs, journal=message_journal, memory=conversation_memory,
+            summarizer=summarizer, intent_classifier=intent_classifier
+        ),
+        'tenant_configs': tenant_configs,
         'lead_service': LeadService(supabase_repo, ExtBot(token="12345:ABCDE")),
         'analytics_service': AnalyticsService(supabase_repo),
         'last_debug_info': {}
-    }
+    })
     clients = supabase_repo.get_active_clients()
     if not clients:
         logger.error("No active clients found.")
         return
     for client in clients:
+        tenant_configs.prime(client)
         bots[client['bot_token']] = await setup_bot(client['bot_token'], client, common_services)
     logger.info(f"Initialized {len(bots)} bot(s).")
+    if UPDATE_DEDUP_ENABLED:
+        deduplicator = UpdateDeduplicator(UPDATE_DEDUP_DB_PATH, UPDATE_DEDUP_TTL, UPDATE_DEDUP_MAX_ENTRIES)
+    if WEBHOOK_INGRESS_MODE == 'SPOOL':
+        spool = UpdateSpool(SPOOL_DB_PATH, lease_seconds=SPOOL_LEASE_SECONDS, max_attempts=SPOOL_MAX_ATTEMPTS)
+        spool_consumer = SpoolConsumer(spool, process_spooled_update, SPOOL_MAX_IN_FLIGHT, SPOOL_POLL_INTERVAL)
+        spool_consumer.start()
     
 @fastapi_app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Application shutdown...")
+    if spool_consumer is not None:
+        await spool_consumer.stop()
     for app in bots.values():
         await app.stop()
         await app.shutdown()
+    if embedding_batcher is not None:
+        await asyncio.to_thread(embedding_batcher.stop)
+    if summarizer is not None:
+        await summarizer.stop()
+    if message_journal is not None:
+        # После остановки ботов новых сообщений нет: сбрасываем журнал полностью
+        await asyncio.to_thread(message_journal.stop)
+    if 'ai_service' in common_services:
+        await common_services['ai_service'].or_client.close()
 
 def main():
     if RUN_MODE == 'POLLING':
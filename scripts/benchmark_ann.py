@@ -0,0 +1,98 @@
+# path: scripts/benchmark_ann.py
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# --- НАДЁЖНЫЙ ШАБЛОН ЗАГРУЗКИ ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+from dotenv import load_dotenv
+load_dotenv(project_root / ".env")
+# ------------------------------------
+
+import numpy as np
+
+from src.infra.knowledge.vector_store import VectorStore
+from src.shared.logger import logger
+
+class SyntheticRepo:
+    """Подменяет выгрузку knowledge_base из SupabaseRepo: кластеризованные нормированные векторы."""
+    def __init__(self, count: int, dim: int, seed: int):
+        rng = np.random.default_rng(seed)
+        centers = rng.standard_normal((max(1, count // 200), dim)).astype(np.float32)
+        vectors = centers[rng.integers(0, len(centers), count)] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+        self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.ids = list(range(count))
+        self.rng = rng
+
+    def grow(self, extra: int):
+        """Добавляет extra новых записей рядом с существующими (как новая загрузка в ту же тему)."""
+        base = self.vectors[self.rng.integers(0, len(self.vectors), extra)]
+        fresh = base + 0.3 * self.rng.standard_normal(base.shape).astype(np.float32)
+        fresh /= np.linalg.norm(fresh, axis=1, keepdims=True)
+        self.vectors = np.vstack([self.vectors, fresh])
+        self.ids += list(range(self.ids[-1] + 1, self.ids[-1] + 1 + extra))
+
+    def get_knowledge_base_hashes(self, client_id: int):
+        return {str(record_id): [record_id] for record_id in self.ids}
+
+    def iter_knowledge_base_records(self, client_id: int, record_ids: list[int], page_size: int = 500):
+        for start in range(0, len(record_ids), page_size):
+            yield [
+                {"id": record_id, "content": str(record_id), "source": "synthetic", "content_hash": str(record_id), "embedding": self.vectors[record_id].tolist()}
+                for record_id in record_ids[start:start + page_size]
+            ]
+
+def measure(index, queries: np.ndarray, top_k: int, exact_rows: np.ndarray):
+    latencies, overlap = [], 0
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        rows, _ = VectorStore.rank(index, query[None, :], top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        overlap += len(set(rows[0].tolist()) & set(exact_rows[i].tolist()))
+    latencies.sort()
+    return overlap / exact_rows.size, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+def run_benchmark(count: int, dim: int, queries_count: int, top_k: int, probes: list[int], seed: int):
+    repo = SyntheticRepo(count, dim, seed)
+    queries = repo.vectors[np.random.default_rng(seed + 1).integers(0, count, queries_count)]
+    queries = queries + 0.2 * np.random.default_rng(seed + 2).standard_normal(queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        brute = VectorStore(repo, cache_dir, ann_min_chunks=0).build(0)
+        exact_rows, _ = VectorStore.rank(brute, queries, top_k)
+        recall, p50, p95 = measure(brute, queries, top_k, exact_rows)
+        logger.info(f"{count} x {dim}: brute force  recall@{top_k}={recall:.3f}  p50={p50:.2f} ms  p95={p95:.2f} ms")
+
+        for probe in probes:
+            store = VectorStore(repo, cache_dir, ann_min_chunks=1, ann_probe=probe)
+            started = time.perf_counter()
+            index = store.build(0)
+            build_time = time.perf_counter() - started
+            recall, p50, p95 = measure(index, queries, top_k, exact_rows)
+            logger.info(
+                f"{count} x {dim}: IVF {index.ann.n_lists} lists, probe {probe:>3}  recall@{top_k}={recall:.3f}  "
+                f"p50={p50:.2f} ms  p95={p95:.2f} ms  (build {build_time:.1f}s)"
+            )
+
+        # Инкрементальное обновление: +5% записей, центроиды переиспользуются
+        repo.grow(count // 20)
+        started = time.perf_counter()
+        index = store.build(0)
+        logger.info(f"Incremental rebuild with {count // 20} new chunks: {time.perf_counter() - started:.1f}s total (only the new rows are fetched).")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк IVF-индекса VectorStore против полного просмотра на синтетических векторах.")
+    parser.add_argument("--count", type=int, default=200000, help="Число векторов в базе.")
+    parser.add_argument("--dim", type=int, default=312, help="Размерность (rubert-tiny2 — 312).")
+    parser.add_argument("--queries", type=int, default=200, help="Число запросов.")
+    parser.add_argument("--top-k", type=int, default=10, help="Сколько соседей сравнивать с точным поиском.")
+    parser.add_argument("--probes", type=int, nargs="+", default=[4, 16, 32], help="Значения VECTOR_ANN_PROBE для прогона.")
+    parser.add_argument("--seed", type=int, default=42, help="Seed генератора данных.")
+    args = parser.parse_args()
+
+    run_benchmark(args.count, args.dim, args.queries, args.top_k, args.probes, args.seed)
+# path: scripts/benchmark_ann.py
@@ -0,0 +1,88 @@
+# path: scripts/benchmark_faq_index.py
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+# --- НАДЁЖНЫЙ ШАБЛОН ЗАГРУЗКИ ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+from dotenv import load_dotenv
+load_dotenv(project_root / ".env")
+# ------------------------------------
+
+from src.infra.knowledge.faq_index import FaqIndex, pick_direct_answer
+from src.shared.config import FAQ_DIRECT_ANSWER_CONFIDENCE, FAQ_DIRECT_ANSWER_MIN_LEMMAS
+from src.shared.logger import logger
+
+def load_eval_set(path: str) -> list[tuple[str, str | None]]:
+    """
+    Отложенная выборка: переформулировки вопросов FAQ, написанные вручную (не из ключевых
+    слов индекса), и близкие по словам вопросы, на которые в FAQ нет ответа (expected = null).
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return [(row['question'], row.get('expected')) for row in json.load(f)]
+
+def run_benchmark(file_path: str, eval_path: str, confidence: float, min_lemmas: int, repeat: int):
+    started = time.perf_counter()
+    index = FaqIndex(file_path)
+    build_time = time.perf_counter() - started
+    questions = load_eval_set(eval_path)
+
+    # Прогрев кэша лемматизатора, чтобы мерить установившийся режим
+    for text, _ in questions:
+        index.search(text, top_k=3)
+
+    latencies = []
+    for _ in range(repeat):
+        for text, _ in questions:
+            t0 = time.perf_counter()
+            index.search(text, top_k=3)
+            latencies.append(time.perf_counter() - t0)
+
+    positives = sum(1 for _, expected in questions if expected)
+    negatives = len(questions) - positives
+    top1_correct = answered_correct = answered_wrong = false_positives = 0
+    for text, expected in questions:
+        matches = index.search(text, top_k=3)
+        if expected and matches and max(matches, key=lambda m: m.confidence).entry.question == expected:
+            top1_correct += 1
+        direct = pick_direct_answer(matches, confidence, min_lemmas)
+        if direct is None:
+            continue
+        if not expected:
+            false_positives += 1
+            logger.warning(f"Direct answer to a question outside the FAQ: '{text}' -> '{direct.entry.question}' ({direct.confidence:.2f}).")
+        elif direct.entry.question == expected:
+            answered_correct += 1
+        else:
+            answered_wrong += 1
+            logger.warning(f"Wrong direct answer: '{text}' -> '{direct.entry.question}' ({direct.confidence:.2f}).")
+
+    answered = answered_correct + answered_wrong + false_positives
+    latencies.sort()
+    logger.info(f"Index build: {build_time * 1000:.1f} ms for {len(index)} entries.")
+    logger.info(
+        f"Latency per question: p50={latencies[len(latencies) // 2] * 1e6:.0f} µs, "
+        f"p95={latencies[int(len(latencies) * 0.95)] * 1e6:.0f} µs, max={latencies[-1] * 1e6:.0f} µs."
+    )
+    logger.info(f"Top-1 accuracy on {positives} paraphrases: {top1_correct / max(positives, 1):.1%}.")
+    logger.info(
+        f"Direct answers (confidence >= {confidence}, >= {min_lemmas} lemmas): "
+        f"recall {answered_correct / max(positives, 1):.1%} of paraphrases, "
+        f"precision {answered_correct / max(answered, 1):.1%}, "
+        f"{false_positives}/{negatives} questions outside the FAQ answered."
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Точность и скорость прямых ответов из FAQ на отложенной выборке переформулировок.")
+    parser.add_argument("--file-path", type=str, default=str(project_root / "data" / "faq.json"), help="Путь к faq.json.")
+    parser.add_argument("--eval-path", type=str, default=str(project_root / "data" / "faq_eval.json"), help="Размеченные вопросы: [{question, expected}].")
+    parser.add_argument("--confidence", type=float, default=FAQ_DIRECT_ANSWER_CONFIDENCE, help="Порог двусторонней уверенности.")
+    parser.add_argument("--min-lemmas", type=int, default=FAQ_DIRECT_ANSWER_MIN_LEMMAS, help="Минимум совпавших лемм.")
+    parser.add_argument("--repeat", type=int, default=200, help="Сколько раз прогнать выборку для замера задержки.")
+    args = parser.parse_args()
+
+    run_benchmark(args.file_path, args.eval_path, args.confidence, args.min_lemmas, args.repeat)
+# path: scripts/benchmark_faq_index.py
@@ -0,0 +1,158 @@
+# path: scripts/benchmark_retrieval.py
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+# --- НАДЁЖНЫЙ ШАБЛОН ЗАГРУЗКИ ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+from dotenv import load_dotenv
+load_dotenv(project_root / ".env")
+# ------------------------------------
+
+import numpy as np
+
+from src.app.parsing.chunker import iter_chunks
+from src.infra.clients.embedding_client import EmbeddingClient
+from src.infra.knowledge.embedding_cache import EmbeddingCache
+from src.infra.knowledge.hybrid_retriever import HybridRetriever, FUSION_MODES
+from src.infra.knowledge.vector_store import TenantIndex, VectorStore, quantize_int8
+from src.shared.config import EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_NAME, RAG_BM25_THRESHOLD
+from src.shared.logger import logger
+
+DATA_FILES = ["bankruptcy_law.md", "interviews.md", "interviews.json", "faq.json"]
+_ARTICLE_RE = re.compile(r"(?:статья|ст\.)\s*(\d+(?:\.\d+)?)", re.IGNORECASE)
+_NOISE = ["подскажите", "пожалуйста", "а", "вот", "у меня", "скажите", "интересно"]
+
+def load_corpus(data_dir: Path) -> list[dict]:
+    chunks = []
+    for name in DATA_FILES:
+        for chunk in iter_chunks(str(data_dir / name)):
+            chunks.append({"content": chunk.content, "source": chunk.source, "metadata": chunk.metadata})
+    return chunks
+
+def build_queries(chunks: list[dict], seed: int) -> dict[str, list[tuple[str, set[int]]]]:
+    """
+    Наборы запросов с известными релевантными чанками:
+    - faq: "разговорные" вопросы из ключевых слов faq.json -> чанк этой записи FAQ;
+    - articles: "что говорит статья N" -> чанки, где упоминается эта статья;
+    - headings: заголовок раздела markdown без номера -> чанки этого раздела.
+    """
+    rng = random.Random(seed)
+    with open(project_root / "data" / "faq.json", 'r', encoding='utf-8') as f:
+        faq_items = json.load(f)
+    by_question = {c["metadata"].get("question"): i for i, c in enumerate(chunks) if c["source"] == "faq.json"}
+    faq_queries = []
+    for item in faq_items:
+        keywords = rng.sample(item['keywords'], k=min(len(item['keywords']), 3))
+        faq_queries.append((" ".join(rng.sample(_NOISE, k=2) + keywords) + "?", {by_question[item['question']]}))
+
+    articles: dict[str, set[int]] = {}
+    for i, chunk in enumerate(chunks):
+        for number in _ARTICLE_RE.findall(chunk["content"]):
+            articles.setdefault(number, set()).add(i)
+    article_queries = [(f"Что говорит статья {number} закона?", rows) for number, rows in articles.items()]
+
+    sections: dict[str, set[int]] = {}
+    for i, chunk in enumerate(chunks):
+        headings = chunk["metadata"].get("headings")
+        if headings:
+            sections.setdefault(headings, set()).add(i)
+    heading_queries = [
+        (re.sub(r"^\d+\.\s*", "", path.split(" > ")[-1]), rows)
+        for path, rows in sections.items()
+    ]
+    return {"faq": faq_queries, "articles": article_queries, "headings": heading_queries}
+
+def quantization_overlap(f32: TenantIndex, i8: TenantIndex, vectors: np.ndarray, top_k: int) -> float:
+    """Доля точного top_k (полный просмотр float32), которую находит int8-индекс с пересчетом кандидатов."""
+    exact, _ = VectorStore.rank(f32, vectors, top_k)
+    approx, _ = VectorStore.rank(i8, vectors, top_k)
+    return sum(len(set(a.tolist()) & set(e.tolist())) for a, e in zip(approx, exact)) / exact.size
+
+def report_quantization(recalls: dict[tuple[str, str, str], float], overlaps: dict[str, float], top_k: int):
+    """
+    Сводка для решения о VECTOR_INDEX_QUANTIZED на реальных эмбеддингах data/: изменение
+    recall@k каждого метода при переходе на int8 и совпадение с точным векторным top_k.
+    """
+    deltas = []
+    for (set_name, method, index_format), recall in sorted(recalls.items()):
+        if index_format != "i8":
+            continue
+        delta = recall - recalls[(set_name, method, "f32")]
+        deltas.append(delta)
+        logger.info(f"[{set_name:>8}] {method:>8}: recall@{top_k} i8 - f32 = {delta:+.1%}  (overlap with exact top-{top_k}: {overlaps[set_name]:.1%})")
+    worst = min(deltas, default=0.0)
+    if worst < 0:
+        logger.warning(f"int8 index loses up to {-worst:.1%} recall@{top_k} on this corpus: keep VECTOR_INDEX_QUANTIZED=false.")
+    else:
+        logger.info(f"int8 index keeps recall@{top_k} on this corpus: VECTOR_INDEX_QUANTIZED=true is safe for similar data.")
+
+def run_benchmark(top_k: int, seed: int, threshold: float, bm25_threshold: float):
+    chunks = load_corpus(project_root / "data")
+    queries = build_queries(chunks, seed)
+    logger.info(f"Corpus: {len(chunks)} chunks; queries: " + ", ".join(f"{k}={len(v)}" for k, v in queries.items()))
+
+    embedding_client = None
+    if EmbeddingClient.is_available():
+        embedding_client = EmbeddingClient(EMBEDDING_MODEL_NAME, cache=EmbeddingCache(EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_NAME))
+        matrix = embedding_client.encode([c["content"] for c in chunks])
+        methods = list(FUSION_MODES)
+    else:
+        logger.warning("sentence-transformers is not installed: only BM25 is benchmarked.")
+        matrix = np.zeros((len(chunks), 0), dtype=np.float32)
+        methods = ['bm25']
+
+    records = [{"id": i, "content": c["content"], "source": c["source"]} for i, c in enumerate(chunks)]
+    indexes = {"f32": TenantIndex(client_id=0, matrix=matrix, chunks=records)}
+    if embedding_client:
+        quantized, scales = quantize_int8(matrix)
+        # Отдельный client_id, чтобы кэш BM25 в ретривере не перестраивался при смене формата
+        indexes["i8"] = TenantIndex(client_id=1, matrix=matrix, chunks=records, quantized=quantized, scales=scales)
+        logger.info(
+            f"Vector memory scanned per query: f32={matrix.nbytes / 1024:.0f} KiB, "
+            f"i8={(quantized.nbytes + scales.nbytes) / 1024:.0f} KiB"
+        )
+    retriever = HybridRetriever(vector_store=None, bm25_threshold=bm25_threshold)
+
+    recalls: dict[tuple[str, str, str], float] = {}
+    overlaps: dict[str, float] = {}
+    for set_name, items in queries.items():
+        vectors = embedding_client.encode([q for q, _ in items]) if embedding_client else [None] * len(items)
+        if "i8" in indexes:
+            overlaps[set_name] = quantization_overlap(indexes["f32"], indexes["i8"], np.asarray(vectors, dtype=np.float32), top_k)
+        for method in methods:
+            for index_format, index in indexes.items():
+                if method == 'bm25' and index_format != "f32":
+                    continue
+                retriever.search_index(index, "прогрев", None, fusion='bm25')  # строим BM25 заранее
+                hits, latencies = 0, []
+                for (question, relevant), vector in zip(items, vectors):
+                    started = time.perf_counter()
+                    results = retriever.search_index(index, question, vector, top_k, threshold, fusion=method)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    hits += any(r["id"] in relevant for r in results)
+                latencies.sort()
+                recalls[(set_name, method, index_format)] = hits / len(items)
+                logger.info(
+                    f"[{set_name:>8}] {method:>8}/{index_format}: recall@{top_k}={hits / len(items):.1%}  "
+                    f"avg={sum(latencies) / len(latencies):.2f} ms  p95={latencies[int(len(latencies) * 0.95)]:.2f} ms"
+                )
+
+    if "i8" in indexes:
+        report_quantization(recalls, overlaps, top_k)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк качества и скорости поиска (BM25 / вектор / гибрид) на файлах из data/.")
+    parser.add_argument("--top-k", type=int, default=3, help="Сколько чанков возвращать на запрос.")
+    parser.add_argument("--threshold", type=float, default=0.3, help="Порог косинусной близости для векторных кандидатов.")
+    parser.add_argument("--bm25-threshold", type=float, default=RAG_BM25_THRESHOLD, help="Минимальная доля максимальной BM25-оценки запроса.")
+    parser.add_argument("--seed", type=int, default=42, help="Seed генератора запросов.")
+    args = parser.parse_args()
+
+    run_benchmark(args.top_k, args.seed, args.threshold, args.bm25_threshold)
+# path: scripts/benchmark_retrieval.py
@@ -0,0 +1,141 @@
+# path: scripts/train_intent_classifier.py
+# Шаг развертывания: размечает сообщения пользователей и вопросы FAQ через LLM, обучает локальный
+# классификатор и сохраняет его в INTENT_MODEL_PATH (data/intent_model.json). Модель нужно обучить
+# до сборки образа; без нее бот отвечает, но выбор модели по категории запроса не работает.
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+# --- НАДЁЖНЫЙ ШАБЛОН ЗАГРУЗКИ ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+from dotenv import load_dotenv
+load_dotenv(project_root / ".env")
+# ------------------------------------
+
+from src.app.services.intent_classifier import IntentClassifier, INTENT_CATEGORIES, classify_with_llm
+from src.shared.config import FAQ_FILE_PATH, INTENT_MODEL_PATH, INTENT_CONFIDENCE_THRESHOLD, LOCAL_STATE_DIR
+from src.shared.logger import logger
+
+def load_labels(path: str) -> dict[str, str]:
+    """Кэш разметки {текст: категория}: повторный запуск не платит за уже размеченные тексты."""
+    labels = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                row = json.loads(line)
+                if row['label'] in INTENT_CATEGORIES:
+                    labels[row['text']] = row['label']
+    return labels
+
+async def label_with_llm(texts: list[str], labels_path: str, concurrency: int) -> dict[str, str]:
+    from src.infra.clients.openrouter_client import OpenRouterClient
+    labels = load_labels(labels_path)
+    todo = [text for text in dict.fromkeys(texts) if text not in labels]
+    if not todo:
+        return labels
+    logger.info(f"Labeling {len(todo)} new text(s) with the LLM ({len(labels)} cached)...")
+    or_client = OpenRouterClient(app_title="Intent classifier training")
+    semaphore = asyncio.Semaphore(concurrency)
+    os.makedirs(os.path.dirname(labels_path) or ".", exist_ok=True)
+
+    async def label(text: str):
+        async with semaphore:
+            category = await classify_with_llm(or_client, text)
+        if category is not None:
+            labels[text] = category
+            with open(labels_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"text": text, "label": category}, ensure_ascii=False) + "\n")
+
+    try:
+        await asyncio.gather(*(label(text) for text in todo))
+    finally:
+        await or_client.close()
+    return labels
+
+def faq_documents(faq_path: str) -> list[tuple[str, str]]:
+    """Записи FAQ как документы для разметки: вопрос и вопрос вместе с ключевыми словами."""
+    with open(faq_path, 'r', encoding='utf-8') as f:
+        items = json.load(f)
+    return [(item['question'], item['question'] + " " + " ".join(item.get('keywords', []))) for item in items]
+
+def evaluate(model: IntentClassifier, examples: list[tuple[str, str]], threshold: float):
+    latencies, correct, confident, confident_correct = [], 0, 0, 0
+    confusion = Counter()
+    for text, expected in examples:
+        started = time.perf_counter()
+        predicted, confidence = model.predict(text)
+        latencies.append((time.perf_counter() - started) * 1000)
+        correct += predicted == expected
+        confusion[(expected, predicted)] += 1
+        if confidence >= threshold:
+            confident += 1
+            confident_correct += predicted == expected
+    latencies.sort()
+    total = len(examples)
+    logger.info(f"Accuracy vs LLM labels: {correct / total:.3f} on {total} held-out texts.")
+    logger.info(
+        f"Threshold {threshold}: {confident / total:.1%} answered locally with accuracy "
+        f"{confident_correct / max(confident, 1):.3f}; {total - confident} fall back to the LLM."
+    )
+    logger.info(f"Latency: p50={latencies[total // 2]:.3f} ms  p99={latencies[min(total - 1, int(total * 0.99))]:.3f} ms")
+    for category in INTENT_CATEGORIES:
+        support = sum(count for (expected, _), count in confusion.items() if expected == category)
+        if support:
+            errors = {predicted: count for (expected, predicted), count in confusion.items() if expected == category and predicted != category}
+            logger.info(f"  {category}: {confusion[(category, category)]}/{support} correct, confused with {errors or '-'}")
+
+def run(args):
+    texts = []
+    if not args.skip_messages:
+        from src.infra.clients.supabase_repo import SupabaseRepo
+        texts = SupabaseRepo().get_user_message_texts(args.limit, args.client_id)
+        logger.info(f"Fetched {len(texts)} user message(s) from the database.")
+    faq_docs = faq_documents(args.faq_path) if args.faq_path else []
+    labels = asyncio.run(label_with_llm(texts + [question for question, _ in faq_docs], args.labels_path, args.concurrency))
+
+    messages = [(text, labels[text]) for text in dict.fromkeys(texts) if text in labels]
+    if not messages:
+        # Без сообщений пользователей оцениваем на самих вопросах FAQ
+        messages = [(question, labels[question]) for question, _ in faq_docs if question in labels]
+    faq_examples = [(doc, labels[question]) for question, doc in faq_docs if question in labels]
+    logger.info(f"Labeled examples: {len(messages)} message(s), {len(faq_examples)} FAQ document(s). Classes: {dict(Counter(label for _, label in messages))}")
+    if not messages:
+        logger.error("Nothing to train on.")
+        return
+
+    random.Random(args.seed).shuffle(messages)
+    held_out = max(1, int(len(messages) * args.test_share))
+    test, train = messages[:held_out], messages[held_out:]
+    # Документы FAQ с вопросами из отложенной выборки в обучение не берем, иначе оценка завышена
+    held_out_texts = {text for text, _ in test}
+    train_faq = [(doc, labels[question]) for question, doc in faq_docs if question in labels and question not in held_out_texts]
+    model = IntentClassifier.train(train + train_faq, alpha=args.alpha)
+    evaluate(model, test, args.threshold)
+
+    if not args.dry_run:
+        IntentClassifier.train(messages + faq_examples, alpha=args.alpha).save(args.output)
+        logger.info(f"Model trained on all {len(messages) + len(faq_examples)} examples saved to {args.output}.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обучение и оценка локального классификатора запросов по разметке LLM.")
+    parser.add_argument("--client-id", type=int, help="Брать сообщения только этого клиента.")
+    parser.add_argument("--limit", type=int, default=3000, help="Сколько последних сообщений пользователей разметить.")
+    parser.add_argument("--skip-messages", action="store_true", help="Не читать сообщения из БД (только FAQ и кэш разметки).")
+    parser.add_argument("--faq-path", default=FAQ_FILE_PATH, help="faq.json: вопросы и ключевые слова добавляются в обучение.")
+    parser.add_argument("--labels-path", default=os.path.join(LOCAL_STATE_DIR, 'intent_labels.jsonl'), help="Кэш разметки LLM (JSONL).")
+    parser.add_argument("--concurrency", type=int, default=8, help="Параллельных запросов к LLM при разметке.")
+    parser.add_argument("--test-share", type=float, default=0.2, help="Доля сообщений для оценки.")
+    parser.add_argument("--threshold", type=float, default=INTENT_CONFIDENCE_THRESHOLD, help="Порог уверенности для отчета о доле локальных ответов.")
+    parser.add_argument("--alpha", type=float, default=0.1, help="Сглаживание наивного Байеса.")
+    parser.add_argument("--seed", type=int, default=42, help="Seed разбиения на обучение и оценку.")
+    parser.add_argument("--output", default=INTENT_MODEL_PATH, help="Куда сохранить модель.")
+    parser.add_argument("--dry-run", action="store_true", help="Только оценить, не сохраняя модель.")
+    run(parser.parse_args())
+# path: scripts/train_intent_classifier.py
@@ -1,9 +1,15 @@
 # path: scripts/vectorize_knowledge_base.py
 import argparse
 import json
+import multiprocessing
 import os
 import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
+from typing import Iterable, Iterator
 
 # --- НАДЁЖНЫЙ ШАБЛОН ЗАГРУЗКИ ---
 project_root = Path(__file__).resolve().parent.parent
@@ -12,97 +18,307 @@ from dotenv import load_dotenv
 load_dotenv(project_root / ".env")
 # ------------------------------------
 
-from sentence_transformers import SentenceTransformer
 from src.infra.clients.supabase_repo import SupabaseRepo
+from src.app.parsing.chunker import iter_chunks
+from src.infra.knowledge.embedding_cache import EmbeddingCache, text_hash
+from src.infra.knowledge.vector_store import VectorStore
+from src.shared.config import (
+    EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_MODEL_NAME,
+    VECTOR_CACHE_DIR, VECTOR_INDEX_QUANTIZED, VECTOR_ANN_MIN_CHUNKS, VECTOR_ANN_LISTS, VECTOR_ANN_PROBE
+)
 from src.shared.logger import logger
 
-def load_data_from_file(file_path: str) -> list[dict]:
-    """Загружает и подготавливает данные из файла (пока только .json)."""
-    prepared_data = []
-    
+def load_data_from_file(file_path: str, max_tokens: int = 256, overlap_tokens: int = 48) -> Iterator[dict]:
+    """
+    Лениво выдает подготовленные чанки из файла: .json (FAQ или цитаты) или .md
+    (разбивка по заголовкам с перекрывающимися окнами), см. src/app/parsing/chunker.py.
+    """
     if not os.path.exists(file_path):
         logger.error(f"Файл не найден по пути: {file_path}")
-        return prepared_data
+        return
+
+    count = 0
+    try:
+        for chunk in iter_chunks(file_path, max_tokens, overlap_tokens):
+            count += 1
+            yield {"content": chunk.content, "source": chunk.source, "content_hash": chunk.content_hash}
+        logger.info(f"Успешно загружено {count} чанков из {file_path}.")
+    except (json.JSONDecodeError, ValueError) as e:
+        logger.error(f"Ошибка чтения или валидации файла {file_path}: {e}")
+        raise
+    except Exception as e:
+        logger.error(f"Непредвиденная ошибка при обработке {file_path}: {e}", exc_info=True)
+        raise
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
 
-    if file_path.endswith('.json'):
+
+MODEL_NAME = EMBEDDING_MODEL_NAME
+
+def load_model(model_name: str = MODEL_NAME):
+    from sentence_transformers import SentenceTransformer
+    logger.info(f"Загрузка локальной модели SentenceTransformer: {model_name}...")
+    return SentenceTransformer(model_name, device='cpu')
+
+# --- Кодирование в пуле процессов ---
+# Функции уровня модуля: пул запускается через spawn, и дочерний процесс импортирует этот файл
+
+_worker_model = None
+
+def _init_worker(model_name: str, threads: int):
+    global _worker_model
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_model = load_model(model_name)
+
+def _encode_in_worker(texts: list[str]):
+    return _worker_model.encode(texts, show_progress_bar=False)
+
+class BatchEncoder:
+    """
+    Кодирует батчи текстов: при workers <= 1 — в текущем процессе, иначе в пуле процессов
+    с отдельной моделью и своей долей потоков CPU в каждом. submit возвращает Future,
+    так что чтение и вставка следующих батчей идут, пока кодируются предыдущие.
+    """
+    def __init__(self, model_name: str, workers: int):
+        self.model_name = model_name
+        self.workers = workers
+        self._model = None
+        self._pool = None
+        if workers > 1:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(model_name, threads)
+            )
+
+    def submit(self, texts: list[str]) -> Future:
+        if self._pool is not None:
+            return self._pool.submit(_encode_in_worker, texts)
+        future: Future = Future()
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                faq_data = json.load(f)
-            
-            # Валидация структуры
-            if not isinstance(faq_data, list) or not all(isinstance(item, dict) for item in faq_data):
-                 raise ValueError("JSON должен быть списком объектов.")
-
-            for item in faq_data:
-                question = item.get('question')
-                answer = item.get('answer')
-                if not question or not answer:
-                    logger.warning(f"Пропущена запись из-за отсутствия 'question' или 'answer': {item}")
-                    continue
-                
-                content = f"Вопрос: {question}\nОтвет: {answer}"
-                prepared_data.append({"content": content, "source": os.path.basename(file_path)})
-            logger.info(f"Успешно загружено {len(prepared_data)} записей из {file_path}.")
-        except (json.JSONDecodeError, ValueError) as e:
-            logger.error(f"Ошибка чтения или валидации JSON файла {file_path}: {e}")
+            if self._model is None:
+                self._model = load_model(self.model_name)
+            future.set_result(self._model.encode(texts, show_progress_bar=False))
         except Exception as e:
-            logger.error(f"Непредвиденная ошибка при обработке {file_path}: {e}", exc_info=True)
-    else:
-        logger.error(f"Формат файла не поддерживается: {file_path}. Поддерживается только .json.")
+            future.set_exception(e)
+        return future
 
-    return prepared_data
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
 
-
-def run_vectorization(client_id: int, file_path: str, clear_before_upload: bool):
+def insert_with_retry(repo: SupabaseRepo, records: list[dict], chunk_size: int, retries: int = 3):
     """
-    Вычисляет эмбеддинги для данных из файла и загружает их в Supabase
-    для конкретного client_id.
+    Вставляет записи частями не больше chunk_size (лимит размера запроса PostgREST),
+    повторяя неудачную часть с экспоненциальной паузой. Если вставка на самом деле прошла,
+    а ответ потерялся, дубликат хэша удалится в конце синхронизации или при следующем запуске.
     """
-    logger.info(f"--- Запуск векторизации для клиента ID: {client_id} ---")
-    
-    data_to_process = load_data_from_file(file_path)
-    if not data_to_process:
-        logger.warning("Нет данных для обработки. Завершение работы."); return
+    for part in batched(records, chunk_size):
+        for attempt in range(retries + 1):
+            if repo.insert_into_knowledge_base(part):
+                break
+            if attempt == retries:
+                raise RuntimeError(f"ошибка вставки в knowledge_base после {retries + 1} попыток")
+            delay = 2 ** attempt
+            logger.warning(f"Повтор вставки {len(part)} записей через {delay} с...")
+            time.sleep(delay)
 
-    model_name = 'cointegrated/rubert-tiny2'
-    logger.info(f"Загрузка локальной модели SentenceTransformer: {model_name}...")
+def refresh_local_index(repo: SupabaseRepo, client_id: int):
+    """
+    Пересобирает локальный кэш поиска (VectorStore) в VECTOR_CACHE_DIR: IVF-индекс
+    обновляется инкрементально, а воркеры с тем же каталогом подхватывают новую версию
+    при следующем вопросе, не дожидаясь VECTOR_CACHE_REFRESH_INTERVAL.
+    """
+    store = VectorStore(
+        repo, VECTOR_CACHE_DIR, quantize=VECTOR_INDEX_QUANTIZED,
+        ann_min_chunks=VECTOR_ANN_MIN_CHUNKS, ann_lists=VECTOR_ANN_LISTS, ann_probe=VECTOR_ANN_PROBE
+    )
     try:
-        model = SentenceTransformer(model_name, device='cpu')
+        store.build(client_id)
     except Exception as e:
-        logger.error(f"Не удалось загрузить модель: {e}", exc_info=True); return
-        
-    contents = [item['content'] for item in data_to_process]
-    logger.info(f"Кодирование {len(contents)} документов...")
-    embeddings = model.encode(contents, show_progress_bar=True)
-    
-    records_to_upload = [
-        {
-            'content': item['content'], 
-            'embedding': emb.tolist(), 
-            'source': item['source'],
-            'client_id': client_id  # <-- КЛЮЧЕВОЕ ИЗМЕНЕНИЕ
-        }
-        for item, emb in zip(data_to_process, embeddings)
-    ]
-    
-    repo = SupabaseRepo()
+        logger.error(f"Не удалось обновить локальный индекс поиска: {e}", exc_info=True)
+
+def iter_fresh_batches(file_paths: list[str], existing: dict, seen: set, stats: dict, batch_size: int, max_tokens: int, overlap_tokens: int) -> Iterator[list[dict]]:
+    """Лениво выдает батчи новых/измененных чанков из всех файлов подряд, считая пропущенные."""
+    for file_path in file_paths:
+        for batch in batched(load_data_from_file(file_path, max_tokens, overlap_tokens), batch_size):
+            fresh = []
+            for item in batch:
+                stats["read"] += 1
+                if item['content_hash'] in seen:
+                    continue
+                seen.add(item['content_hash'])
+                if item['content_hash'] in existing:
+                    stats["unchanged"] += 1
+                else:
+                    fresh.append(item)
+            if fresh:
+                yield fresh
+
+def run_vectorization(
+    client_id: int,
+    file_paths: list[str],
+    clear_before_upload: bool,
+    max_tokens: int,
+    overlap_tokens: int,
+    dry_run: bool = False,
+    use_cache: bool = True,
+    batch_size: int = 256,
+    refresh_index: bool = False,
+    workers: int = 1,
+    insert_chunk_size: int = 500
+):
+    """
+    Инкрементально синхронизирует базу знаний клиента с файлами по content_hash чанков:
+    кодируются и вставляются только новые/измененные чанки, затем удаляются исчезнувшие.
+    Старые записи удаляются только после успешной вставки новых, поэтому поиск
+    ни в какой момент не остается без данных.
+
+    Файлы читаются потоково, батчи по batch_size кодируются в пуле из workers процессов
+    (не больше 2 * workers батчей в работе), вставка идет частями по insert_chunk_size
+    с повторами. Контрольная точка — content_hash уже вставленных записей в БД: после
+    сбоя повторный запуск пропускает все, что успело загрузиться, и продолжает с места остановки.
 
+    Область сравнения — записи с тем же source (имена файлов); с --clear — вся база клиента,
+    то есть все, чего нет во входных файлах, будет удалено. Требует колонку
+    knowledge_base.content_hash (text) в БД.
+    """
+    logger.info(f"--- Запуск векторизации для клиента ID: {client_id} ---")
+    sources = list(dict.fromkeys(os.path.basename(path) for path in file_paths))
+    repo = SupabaseRepo()
+    existing: dict = {}
+    try:
+        for source in ([None] if clear_before_upload else sources):
+            for h, ids in repo.get_knowledge_base_hashes(client_id, source=source).items():
+                existing.setdefault(h, []).extend(ids)
+    except Exception:
+        logger.error("Не удалось получить текущее состояние базы знаний. Завершение работы."); return
     if clear_before_upload:
-        logger.warning(f"Опция --clear включена. Удаление ВСЕХ предыдущих записей из базы знаний для клиента {client_id}...")
-        repo.clear_knowledge_base_for_client(client_id)
-        logger.info(f"База знаний для клиента {client_id} очищена.")
+        logger.warning(f"Опция --clear включена. Все записи клиента {client_id}, которых нет в {', '.join(sources)}, будут удалены.")
+    already = sum(len(ids) for h, ids in existing.items() if h is not None)
+    if already:
+        logger.info(f"В базе уже {already} записей с content_hash: они не кодируются и не вставляются повторно.")
 
-    logger.info(f"Загрузка {len(records_to_upload)} записей в Supabase...")
-    repo.insert_into_knowledge_base(records_to_upload)
-    
-    logger.info(f"✅ База знаний для клиента {client_id} успешно векторизована и загружена!")
+    cache = EmbeddingCache(EMBEDDING_CACHE_DIR, MODEL_NAME, EMBEDDING_CACHE_MAX_ENTRIES) if use_cache and not dry_run else None
+    seen, stats = set(), {"read": 0, "unchanged": 0}
+    inserted = 0
+    preview = []  # для --dry-run: начала добавляемых чанков
+    started = time.perf_counter()
+    batches = iter_fresh_batches(file_paths, existing, seen, stats, batch_size, max_tokens, overlap_tokens)
+
+    if dry_run:
+        try:
+            for fresh in batches:
+                inserted += len(fresh)
+                preview += [item['content'][:80].replace("\n", " ") for item in fresh][:max(0, 20 - len(preview))]
+        except Exception as e:
+            logger.error(f"Чтение прервано: {e}."); return
+    else:
+        encoder = BatchEncoder(MODEL_NAME, workers)
+        # (чанки, хэши, найденные в кэше векторы, хэши к расчету, future расчета)
+        pending: deque = deque()
+
+        def finish_oldest():
+            nonlocal inserted
+            fresh, hashes, found, missing, future = pending.popleft()
+            if future is not None:
+                computed = dict(zip(missing, future.result()))
+                if cache is not None:
+                    try:
+                        cache.put_many(computed)
+                    except Exception as e:
+                        logger.warning(f"Failed to store embeddings in cache: {e}")
+                found.update(computed)
+            records = [
+                {
+                    'content': item['content'],
+                    'embedding': found[h].tolist(),
+                    'source': item['source'],
+                    'content_hash': item['content_hash'],
+                    'client_id': client_id
+                }
+                for item, h in zip(fresh, hashes)
+            ]
+            insert_with_retry(repo, records, insert_chunk_size)
+            inserted += len(records)
+            elapsed = time.perf_counter() - started
+            logger.info(f"Вставлено {inserted} новых записей, прочитано {stats['read']} чанков ({stats['read'] / elapsed:.1f} док/с).")
+
+        try:
+            for fresh in batches:
+                hashes = [text_hash(item['content']) for item in fresh]
+                found = cache.get_many(hashes) if cache is not None else {}
+                missing = [h for h in hashes if h not in found]
+                texts = {h: item['content'] for item, h in zip(fresh, hashes)}
+                future = encoder.submit([texts[h] for h in missing]) if missing else None
+                pending.append((fresh, hashes, found, missing, future))
+                if len(pending) >= 2 * max(1, workers):
+                    finish_oldest()
+            while pending:
+                finish_oldest()
+        except Exception as e:
+            logger.error(f"Синхронизация прервана: {e}. Устаревшие записи не удалялись; повторный запуск продолжит с этого места.")
+            return
+        finally:
+            encoder.close()
+
+    if not seen:
+        logger.warning("Нет данных для обработки. Завершение работы."); return
+
+    # Исчезнувшие чанки, записи без хэша и дубликаты одного хэша
+    to_delete = [record_id for h, ids in existing.items() if h not in seen for record_id in ids]
+    to_delete += [record_id for h, ids in existing.items() if h in seen for record_id in ids[1:]]
+    unchanged = stats["unchanged"]
+
+    if dry_run:
+        logger.info(
+            f"[DRY RUN] Клиент {client_id}, {', '.join(sources)}: будет добавлено {inserted}, "
+            f"без изменений {unchanged}, будет удалено {len(to_delete)}."
+        )
+        for line in preview:
+            logger.info(f"[DRY RUN]   + {line}")
+        if inserted > len(preview):
+            logger.info(f"[DRY RUN]   ... и еще {inserted - len(preview)}")
+        return
+
+    if to_delete and not repo.delete_knowledge_base_records(to_delete):
+        logger.error("Новые записи вставлены, но удалить устаревшие не удалось. Повторите запуск."); return
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"✅ База знаний для клиента {client_id} синхронизирована с {', '.join(sources)}: "
+        f"добавлено {inserted}, без изменений {unchanged}, удалено {len(to_delete)}."
+    )
+    logger.info(
+        f"Обработано {stats['read']} чанков за {elapsed:.1f} с: {stats['read'] / elapsed:.1f} док/с "
+        f"(новых {inserted / elapsed:.1f} док/с)."
+    )
+    if refresh_index:
+        refresh_local_index(repo, client_id)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Скрипт для векторизации и загрузки базы знаний для конкретного клиента.")
     parser.add_argument("--client-id", type=int, required=True, help="ID клиента, для которого загружается база знаний.")
-    parser.add_argument("--file-path", type=str, required=True, help="Путь к .json файлу с данными (список объектов с ключами 'question' и 'answer').")
-    parser.add_argument("--clear", action="store_true", help="Если указано, полностью очистить базу знаний для этого клиента перед загрузкой новых данных.")
+    parser.add_argument("--file-path", type=str, nargs="+", action="extend", required=True, help="Пути к файлам с данными: .json (FAQ с 'question'/'answer' или цитаты с 'quote') или .md. Можно указать несколько.")
+    parser.add_argument("--clear", action="store_true", help="Если указано, после загрузки удалить из базы знаний клиента все записи, которых нет во входных файлах (а не только записи этих файлов).")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет добавлено, оставлено и удалено, ничего не меняя.")
+    parser.add_argument("--no-cache", action="store_true", help="Не использовать локальный кэш эмбеддингов (всегда пересчитывать моделью).")
+    parser.add_argument("--refresh-index", action="store_true", help="После синхронизации обновить локальный индекс поиска в VECTOR_CACHE_DIR (если скрипт запущен на машине бота).")
+    parser.add_argument("--workers", type=int, default=1, help="Число процессов для кодирования (у каждого своя копия модели).")
+    parser.add_argument("--batch-size", type=int, default=256, help="Сколько чанков кодировать за один вызов модели.")
+    parser.add_argument("--insert-chunk-size", type=int, default=500, help="Максимум записей в одном запросе вставки.")
+    parser.add_argument("--max-tokens", type=int, default=256, help="Максимальный размер чанка markdown (в словах).")
+    parser.add_argument("--overlap-tokens", type=int, default=48, help="Перекрытие соседних чанков markdown (в словах).")
     args = parser.parse_args()
     
-    run_vectorization(args.client_id, args.file_path, args.clear)
+    run_vectorization(
+        args.client_id, args.file_path, args.clear, args.max_tokens, args.overlap_tokens, args.dry_run,
+        not args.no_cache, args.batch_size, args.refresh_index, args.workers, args.insert_chunk_size
+    )
 # path: scripts/vectorize_knowledge_base.py
\ No newline at end of file
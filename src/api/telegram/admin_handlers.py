@@ -9,12 +9,15 @@ from telegram.constants import ParseMode, ChatAction
 from src.app.services.ai_service import AIService
 from src.app.services.lead_service import LeadService
 from src.app.services.analytics_service import AnalyticsService
+from src.app.services.tenant_config import TenantConfigCache
 from src.api.telegram.keyboards import (
     admin_keyboard, cancel_keyboard, 
     broadcast_confirm_keyboard, checklist_management_keyboard
 )
 from src.infra.clients.sheets_client import GoogleSheetsClient
+from src.infra.storage.sqlite_persistence import SQLitePersistence
 from src.shared.logger import logger
+from src.shared.metrics import metrics
 from src.shared.config import (
     GET_BROADCAST_MESSAGE, GET_BROADCAST_MEDIA, CONFIRM_BROADCAST,
     CHECKLIST_ACTION, CHECKLIST_UPLOAD_FILE,
@@ -84,6 +87,9 @@ async def last_answer_debug(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update, context): return
     client_id, _ = get_client_context(context)
     debug_info = context.application.bot_data.get('last_debug_info', {}).get(client_id)
+    if isinstance(context.application.persistence, SQLitePersistence):
+        # Последний ответ мог быть сгенерирован в другом воркере
+        debug_info = await context.application.persistence.load_shared_value('last_debug_info') or debug_info
     if not debug_info:
         await update.message.reply_text("Отладочная информация еще не была записана.")
         return
@@ -92,6 +98,12 @@ async def last_answer_debug(update: Update, context: ContextTypes.DEFAULT_TYPE):
     report = (f"<b>--- Отладка последнего ответа (Клиент ID: {client_id}) ---</b>\n\n"
               f"<b>Вопрос пользователя:</b> {debug_info.get('user_question', 'N/A')}\n\n"
               f"<b>--- Использованная история диалога ---</b>\n{history_report}")
+    prompt_tokens = debug_info.get('prompt_tokens')
+    if isinstance(prompt_tokens, dict):
+        usage = ", ".join(f"{section}: {count}" for section, count in prompt_tokens['usage'].items())
+        dropped = ", ".join(f"{section}: {count}" for section, count in prompt_tokens['dropped'].items()) or "нет"
+        report += (f"\n\n<b>--- Токены промпта (оценка, бюджет {prompt_tokens['budget']}) ---</b>\n{usage}\n"
+                   f"<b>Не вошло:</b> {dropped}")
     await update.message.reply_text(report, parse_mode=ParseMode.HTML)
 
 async def get_file_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -142,7 +154,7 @@ async def health_check(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if OPENROUTER_API_KEY:
         try:
             ai_service: AIService = context.application.bot_data['ai_service']
-            await context.application.loop.run_in_executor(None, ai_service.or_client.client.models.list)
+            await ai_service.or_client.client.models.list()
             report_lines.append("✅ <b>OpenRouter (AI):</b> OK")
         except Exception as e:
             report_lines.append(f"❌ <b>OpenRouter (AI):</b> Ошибка API: {e}")
@@ -170,11 +182,16 @@ async def health_check(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
     await update.message.reply_text("\n".join(report_lines), parse_mode=ParseMode.HTML)
 
+async def perf_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update, context): return
+    client_id, _ = get_client_context(context)
+    await update.message.reply_text(metrics.format_report(client_id), parse_mode=ParseMode.HTML)
+
 async def get_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update, context): return
     client_id, _ = get_client_context(context)
     ai_service: AIService = context.application.bot_data['ai_service']
-    current_prompt = ai_service.repo.get_client_system_prompt(client_id)
+    current_prompt = await ai_service.get_system_prompt(client_id)
     if current_prompt:
         response_text = f"<b>Текущий системный промпт (Клиент ID: {client_id}):</b>\n\n<pre>{current_prompt}</pre>"
         await update.message.reply_text(response_text, parse_mode=ParseMode.HTML)
@@ -189,7 +206,7 @@ async def set_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("<b>Ошибка:</b> вы не указали текст промпта.\n\n<b>Пример:</b> /set_prompt Ты — пират.", parse_mode=ParseMode.HTML)
         return
     new_prompt = " ".join(context.args)
-    success = ai_service.repo.update_client_system_prompt(client_id, new_prompt)
+    success = ai_service.update_system_prompt(client_id, new_prompt)
     if success:
         await update.message.reply_text("✅ Системный промпт успешно обновлен!")
         await get_prompt(update, context)
@@ -236,10 +253,10 @@ async def checklist_delete(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     query = update.callback_query
     await query.answer()
     client_id, _ = get_client_context(context)
-    lead_service: LeadService = context.application.bot_data['lead_service']
-    success = lead_service.repo.update_client_checklist(client_id, None)
+    tenant_configs: TenantConfigCache = context.application.bot_data['tenant_configs']
+    success = tenant_configs.update_checklist(client_id, None)
     if success:
-        context.bot_data['checklist_data'] = None
+        await tenant_configs.sync_bot_data(context.bot_data, client_id)
         await query.edit_message_text("✅ Чек-лист успешно удален.")
     else:
         await query.edit_message_text("❌ Произошла ошибка при удалении чек-листа в базе данных.")
@@ -282,10 +299,10 @@ async def checklist_receive_file(update: Update, context: ContextTypes.DEFAULT_T
         file_content_str = file_content_bytes.decode('utf-8')
         new_checklist_data = json.loads(file_content_str)
         _validate_checklist_structure(new_checklist_data)
-        lead_service: LeadService = context.application.bot_data['lead_service']
-        success = lead_service.repo.update_client_checklist(client_id, new_checklist_data)
+        tenant_configs: TenantConfigCache = context.application.bot_data['tenant_configs']
+        success = tenant_configs.update_checklist(client_id, new_checklist_data)
         if success:
-            context.bot_data['checklist_data'] = new_checklist_data
+            await tenant_configs.sync_bot_data(context.bot_data, client_id)
             await update.message.reply_text("✅ Новый чек-лист успешно загружен и сохранен!", reply_markup=admin_keyboard)
             return ConversationHandler.END
         else:
@@ -0,0 +1,71 @@
+# START OF FILE: src/api/telegram/shared_conversation.py
+
+import asyncio
+from typing import List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application, ConversationHandler
+
+from src.infra.storage.sqlite_persistence import ConversationKey, SQLitePersistence
+
+class SharedConversationHandler(ConversationHandler):
+    """
+    ConversationHandler, состояние которого перед обработкой апдейта подтягивается
+    из общей SQLitePersistence. Так шаги мастера, начатого в одном воркере,
+    корректно продолжаются в другом.
+
+    Сам check_update в базу не ходит (он синхронный и выполняется в event loop):
+    состояния всех таких обработчиков приложения читаются заранее одним запросом
+    в отдельном потоке — см. sync_shared_conversations.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._shared_persistence: Optional[SQLitePersistence] = None
+
+    async def _initialize_persistence(self, application):
+        if isinstance(application.persistence, SQLitePersistence):
+            self._shared_persistence = application.persistence
+        return await super()._initialize_persistence(application)
+
+    def shared_key(self, update: Update) -> Optional[ConversationKey]:
+        """Ключ диалога, состояние которого нужно подтянуть; None — синхронизировать нечего."""
+        if self._shared_persistence is None:
+            return None
+        if (self.per_chat and not update.effective_chat) or (self.per_user and not update.effective_user):
+            return None
+        if self.per_message and not update.callback_query:
+            return None
+        key = self._get_key(update)
+        if key in self._conversations and not isinstance(self._conversations[key], (int, str)):
+            # Незавершенный неблокирующий обработчик (PendingState) — локальное состояние главнее
+            return None
+        return key
+
+    def apply_shared_state(self, key: ConversationKey, state: Optional[object]):
+        if state is None:
+            # Удаляем без пометки на запись: диалог уже завершен в общем хранилище
+            self._conversations.data.pop(key, None)
+        else:
+            self._conversations.update_no_track({key: state})
+
+async def sync_shared_conversations(application: Application, update: object):
+    """Подтягивает состояния всех SharedConversationHandler приложения для апдейта одним чтением вне event loop."""
+    persistence = application.persistence
+    if not isinstance(persistence, SQLitePersistence) or not isinstance(update, Update):
+        return
+    targets: List[Tuple[SharedConversationHandler, ConversationKey]] = []
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, SharedConversationHandler):
+                key = handler.shared_key(update)
+                if key is not None:
+                    targets.append((handler, key))
+    if not targets:
+        return
+    states = await asyncio.to_thread(
+        persistence.load_conversation_states, [(handler.name, key) for handler, key in targets]
+    )
+    for handler, key in targets:
+        handler.apply_shared_state(key, states.get((handler.name, key)))
+
+# END OF FILE: src/api/telegram/shared_conversation.py
@@ -0,0 +1,73 @@
+# START OF FILE: src/api/telegram/streaming_reply.py
+
+import time
+from typing import Optional
+
+from telegram import Message, InlineKeyboardMarkup
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+from src.shared.logger import logger
+
+# Маркер "ответ еще печатается"
+_CURSOR = " ▌"
+
+class StreamingReply:
+    """
+    Показывает ответ модели по мере генерации: первое сообщение отправляется, как только
+    накопилось немного текста, дальше оно редактируется не чаще, чем раз в edit_interval
+    секунд (Telegram ограничивает частоту правок в одном чате).
+    """
+    def __init__(self, source_message: Message, edit_interval: float = 1.5, min_first_chars: int = 20):
+        self.source_message = source_message
+        self.edit_interval = edit_interval
+        self.min_first_chars = min_first_chars
+        self.message: Optional[Message] = None
+        self._last_text = ""
+        self._next_edit_at = 0.0
+
+    async def update(self, text: str):
+        now = time.monotonic()
+        if now < self._next_edit_at or text == self._last_text:
+            return
+        if self.message is None and len(text) < self.min_first_chars:
+            return
+        try:
+            if self.message is None:
+                self.message = await self.source_message.reply_text(text + _CURSOR)
+            else:
+                await self.message.edit_text(text + _CURSOR)
+            self._last_text = text
+            self._next_edit_at = time.monotonic() + self.edit_interval
+        except RetryAfter as e:
+            self._next_edit_at = time.monotonic() + float(e.retry_after)
+        except TelegramError as e:
+            logger.warning(f"Failed to update streaming reply: {e}")
+            self._next_edit_at = time.monotonic() + self.edit_interval
+
+    async def finish(self, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None, parse_mode: Optional[str] = None):
+        """Публикует итоговый текст: правкой уже отправленного сообщения или новым сообщением."""
+        if self.message is None:
+            try:
+                await self.source_message.reply_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+            except BadRequest:
+                await self.source_message.reply_text(text, reply_markup=reply_markup)
+            return
+        try:
+            await self.message.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                return
+            # Скорее всего, разметка модели не прошла парсер Telegram — отправляем как есть
+            logger.warning(f"Final streaming edit failed ({e}). Retrying without parse mode.")
+            await self.message.edit_text(text, reply_markup=reply_markup)
+
+    async def discard(self):
+        """Удаляет промежуточное сообщение, если ответ в итоге не получен."""
+        if self.message is not None:
+            try:
+                await self.message.delete()
+            except TelegramError as e:
+                logger.warning(f"Failed to delete streaming reply: {e}")
+            self.message = None
+
+# END OF FILE: src/api/telegram/streaming_reply.py
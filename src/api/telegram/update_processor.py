@@ -0,0 +1,94 @@
+# START OF FILE: src/api/telegram/update_processor.py
+
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from src.shared.logger import logger
+from src.shared.metrics import metrics
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Обрабатывает апдейты разных чатов параллельно (не больше max_concurrent_updates),
+    а апдейты одного чата — строго по очереди, чтобы состояния ConversationHandler
+    не перепутались. Апдейты нужно передавать через submit().
+    """
+    def __init__(self, max_concurrent_updates: int, client_id: Optional[int] = None):
+        super().__init__(max_concurrent_updates)
+        self.client_id = client_id
+        self._chat_locks: Dict[int, asyncio.Lock] = {}
+        self._chat_waiters: Dict[int, int] = {}
+        self._pending = 0
+
+    @staticmethod
+    def _chat_key(update: object) -> Optional[int]:
+        if isinstance(update, Update) and update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    def _set_queue_depth(self):
+        metrics.set_gauge("dispatch.queue_depth", self._pending, client_id=self.client_id)
+
+    async def submit(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """Ставит апдейт в очередь своего чата и ждет окончания его обработки."""
+        enqueued_at = time.monotonic()
+        started = False
+        self._pending += 1
+        self._set_queue_depth()
+
+        async def run():
+            nonlocal started
+            started = True
+            await self._run_timed(coroutine, enqueued_at)
+
+        chat_key = self._chat_key(update)
+        try:
+            if chat_key is None:
+                await self.process_update(update, run())
+                return
+            lock = self._chat_locks.setdefault(chat_key, asyncio.Lock())
+            self._chat_waiters[chat_key] = self._chat_waiters.get(chat_key, 0) + 1
+            try:
+                async with lock:
+                    await self.process_update(update, run())
+            finally:
+                self._chat_waiters[chat_key] -= 1
+                if not self._chat_waiters[chat_key]:
+                    del self._chat_waiters[chat_key]
+                    self._chat_locks.pop(chat_key, None)
+        finally:
+            if not started:
+                # Апдейт сняли с очереди до запуска (например, отмена) — корутину нужно закрыть
+                if asyncio.iscoroutine(coroutine):
+                    coroutine.close()
+                self._pending -= 1
+                self._set_queue_depth()
+
+    async def _run_timed(self, coroutine: Awaitable[Any], enqueued_at: float) -> None:
+        wait_ms = (time.monotonic() - enqueued_at) * 1000
+        self._pending -= 1
+        self._set_queue_depth()
+        metrics.observe("dispatch.wait_ms", wait_ms, client_id=self.client_id)
+        if wait_ms > 1000:
+            logger.warning(f"Update waited {wait_ms:.0f}ms in dispatch queue (client {self.client_id}).")
+        started_at = time.monotonic()
+        try:
+            await coroutine
+        finally:
+            metrics.observe("dispatch.handle_ms", (time.monotonic() - started_at) * 1000, client_id=self.client_id)
+            metrics.incr("dispatch.updates_processed", client_id=self.client_id)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        logger.info(f"Concurrent dispatcher for client {self.client_id} started (limit: {self.max_concurrent_updates}).")
+
+    async def shutdown(self) -> None:
+        self._chat_locks.clear()
+        self._chat_waiters.clear()
+
+# END OF FILE: src/api/telegram/update_processor.py
@@ -1,4 +1,5 @@
 # path: src/api/telegram/user_handlers.py
+import asyncio
 import io
 import re
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, User as TelegramUser
@@ -8,10 +9,14 @@ from telegram.error import TelegramError
 
 from src.app.services.ai_service import AIService
 from src.app.services.lead_service import LeadService
+from src.app.services.tenant_config import TenantConfigCache
 from src.domain.models import User, Message
+from src.infra.clients.openrouter_client import LLM_ERROR_MESSAGE
+from src.infra.storage.sqlite_persistence import SQLitePersistence
 from src.api.telegram.keyboards import get_main_keyboard, cancel_keyboard, make_quiz_keyboard
+from src.api.telegram.streaming_reply import StreamingReply
 from src.shared.logger import logger
-from src.shared.config import GET_NAME, GET_DEBT, GET_INCOME, GET_REGION
+from src.shared.config import GET_NAME, GET_DEBT, GET_INCOME, GET_REGION, STREAM_REPLIES_ENABLED, STREAM_EDIT_INTERVAL
 
 # --- Вспомогательные функции ---
 def get_client_context(context: ContextTypes.DEFAULT_TYPE) -> (int, str):
@@ -19,6 +24,18 @@ def get_client_context(context: ContextTypes.DEFAULT_TYPE) -> (int, str):
     manager_contact = context.bot_data.get('manager_contact')
     return client_id, manager_contact
 
+async def sync_tenant_config(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Выполняется перед остальными обработчиками (group=-1): подтягивает в bot_data
+    актуальные настройки клиента, если их поменяли в другом воркере.
+    """
+    tenant_configs: TenantConfigCache = context.application.bot_data['tenant_configs']
+    client_id, _ = get_client_context(context)
+    try:
+        await tenant_configs.sync_bot_data(context.bot_data, client_id)
+    except Exception as e:
+        logger.error(f"Failed to refresh config for client {client_id}: {e}", exc_info=True)
+
 async def _send_contact_request(user: TelegramUser, context: ContextTypes.DEFAULT_TYPE):
     """Отправляет уведомление менеджеру о запросе на связь."""
     _, manager_contact = get_client_context(context)
@@ -57,15 +74,27 @@ async def _process_user_message(update: Update, context: ContextTypes.DEFAULT_TY
         await update.message.reply_text("Вы находитесь в режиме администратора. Для выхода введите /start.")
         return
 
-    ai_service.repo.save_message(user_id, Message(role='user', content=user_question), client_id)
-    await update.message.reply_chat_action(ChatAction.TYPING)
+    # Сохранение вопроса и загрузка промпта, истории и квиза — одним параллельным батчем
+    turn, _ = await asyncio.gather(
+        ai_service.load_turn_context(user_id, client_id, user_question),
+        update.message.reply_chat_action(ChatAction.TYPING)
+    )
 
-    response_text, debug_info = ai_service.get_text_response(user_id, user_question, client_id)
+    streaming_reply = StreamingReply(update.message, edit_interval=STREAM_EDIT_INTERVAL) if STREAM_REPLIES_ENABLED else None
+    response_text, debug_info = await ai_service.get_text_response(
+        user_id, user_question, client_id,
+        on_partial=streaming_reply.update if streaming_reply else None,
+        turn=turn
+    )
     context.application.bot_data.setdefault('last_debug_info', {})[client_id] = debug_info
+    if isinstance(context.application.persistence, SQLitePersistence):
+        await context.application.persistence.save_shared_value('last_debug_info', debug_info)
     
     # --- "Пуленепробиваемый" Fallback ---
     if response_text is None:
         logger.warning(f"AI service failed for user {user_id} (client {client_id}). Triggering fallback.")
+        if streaming_reply:
+            await streaming_reply.discard()
         await update.message.reply_text(
             "К сожалению, мой AI-модуль сейчас испытывает трудности с ответом. "
             "Ваш вопрос очень важен для нас, и я уже передал его менеджеру."
@@ -73,13 +102,19 @@ async def _process_user_message(update: Update, context: ContextTypes.DEFAULT_TY
         await _send_contact_request(update.effective_user, context)
         return
 
-    ai_service.repo.save_message(user_id, Message(role='assistant', content=response_text), client_id)
-    
-    quiz_completed, _ = ai_service.repo.get_user_quiz_status(user_id, client_id)
+    incomplete = debug_info.get('incomplete')
+    if incomplete:
+        # Пользователь видит то, что успело прийти, но в историю оборванный ответ не попадает
+        if incomplete == 'length':
+            response_text += "\n\n_Ответ получился слишком длинным и был обрезан. Уточните вопрос, чтобы получить полный ответ._"
+        elif response_text != LLM_ERROR_MESSAGE:
+            response_text += "\n\n_Ответ прервался из-за технической ошибки. Пожалуйста, повторите вопрос._"
+    else:
+        ai_service.save_message(user_id, Message(role='assistant', content=response_text), client_id)
     
     action_buttons = []
     checklist_data = context.bot_data.get('checklist_data')
-    if checklist_data and not quiz_completed:
+    if checklist_data and not turn.quiz_completed:
         action_buttons.append(InlineKeyboardButton("Пройти чек-лист", callback_data="start_quiz_from_prompt"))
     
     action_buttons.append(InlineKeyboardButton("Связь с человеком", callback_data="request_human_contact"))
@@ -89,7 +124,10 @@ async def _process_user_message(update: Update, context: ContextTypes.DEFAULT_TY
     disclaimer = "\n\n*Важно: эта информация носит справочный характер и не является юридической консультацией.*"
     final_text = response_text + disclaimer
     
-    await update.message.reply_text(final_text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
+    if streaming_reply:
+        await streaming_reply.finish(final_text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
+    else:
+        await update.message.reply_text(final_text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
 
 async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await _process_user_message(update, context, update.message.text)
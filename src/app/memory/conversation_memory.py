@@ -0,0 +1,196 @@
+# START OF FILE: src/app/memory/conversation_memory.py
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from src.domain.models import Message
+from src.infra.storage.sqlite_db import SQLiteDB
+from src.shared.metrics import metrics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversation_versions (
+    client_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (client_id, user_id)
+);
+"""
+
+# Примерные накладные расходы на одно сообщение в памяти (объект, строка, ячейка deque)
+_RECORD_OVERHEAD = 120
+
+ConversationKey = Tuple[int, int]  # (client_id, user_id)
+
+class MemoryRecord:
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+
+    @property
+    def size(self) -> int:
+        return len(self.content) + _RECORD_OVERHEAD
+
+class _Conversation:
+    __slots__ = ("records", "version", "complete", "last_access", "size")
+
+    def __init__(self, records: deque, version: int, complete: bool):
+        self.records = records
+        self.version = version
+        self.complete = complete  # в deque вся история пользователя, а не только хвост
+        self.last_access = time.monotonic()
+        self.size = sum(record.size for record in records)
+
+class ConversationMemory:
+    """
+    Последние сообщения диалогов (client_id, user_id) в памяти воркера: кольцевой
+    буфер на max_messages записей для каждого пользователя.
+
+    Буфер наполняется записями (append) и один раз загружается из БД при промахе
+    (load). Диалог может переходить между воркерами, поэтому у каждого пользователя
+    есть номер версии в общей SQLite, а буфер с отставшей версией считается промахом.
+    Версия — это номер состояния истории в БД: она увеличивается, только когда сообщение
+    там точно есть (append с confirmed=True или confirm после сброса журнала). Иначе
+    другой воркер мог бы загрузить историю без чужих несброшенных строк и запомнить ее
+    как актуальную. Горячий путь не обращается к Supabase.
+
+    Диалоги без обращений дольше idle_ttl вытесняются, общий объем ограничен max_bytes
+    (вытесняются давно не использованные).
+    """
+    def __init__(self, db_path: str, max_messages: int = 20, idle_ttl: float = 1800, max_bytes: int = 64 * 1024 * 1024):
+        self.db = SQLiteDB(db_path, _SCHEMA)
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self._conversations: "OrderedDict[ConversationKey, _Conversation]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _shared_version(self, key: ConversationKey) -> int:
+        row = self.db.execute(
+            "SELECT version FROM conversation_versions WHERE client_id = ? AND user_id = ?", key
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _bump(self, key: ConversationKey) -> int:
+        return self.db.execute(
+            "INSERT INTO conversation_versions (client_id, user_id, version) VALUES (?, ?, 1) "
+            "ON CONFLICT (client_id, user_id) DO UPDATE SET version = version + 1 RETURNING version",
+            key
+        ).fetchone()[0]
+
+    # --- Вытеснение (вызывается под self._lock) ---
+
+    def _drop(self, key: ConversationKey):
+        conversation = self._conversations.pop(key, None)
+        if conversation is not None:
+            self._bytes -= conversation.size
+
+    def _evict(self):
+        now = time.monotonic()
+        # OrderedDict упорядочен по последнему обращению: простаивающие диалоги — в голове
+        while self._conversations:
+            key, conversation = next(iter(self._conversations.items()))
+            if now - conversation.last_access <= self.idle_ttl and self._bytes <= self.max_bytes:
+                break
+            self._drop(key)
+            metrics.incr("memory.evictions")
+        metrics.set_gauge("memory.conversations", len(self._conversations))
+        metrics.set_gauge("memory.bytes", self._bytes)
+
+    # --- Чтение ---
+
+    def get(self, client_id: int, user_id: int, limit: int) -> Optional[List[Message]]:
+        """Последние limit сообщений или None, если их нужно загрузить из БД."""
+        key = (client_id, user_id)
+        with self._lock:
+            conversation = self._conversations.get(key)
+        if conversation is None or not (conversation.complete or len(conversation.records) >= limit):
+            metrics.incr("memory.misses")
+            return None
+        if self._shared_version(key) != conversation.version:
+            metrics.incr("memory.stale")
+            with self._lock:
+                self._drop(key)
+            return None
+        with self._lock:
+            conversation.last_access = time.monotonic()
+            self._conversations.move_to_end(key)
+            records = list(conversation.records)[-limit:] if limit else []
+            self._evict()
+        metrics.incr("memory.hits")
+        return [Message(role=record.role, content=record.content) for record in records]
+
+    def load(self, client_id: int, user_id: int, limit: int, loader: Callable[[int], List[Message]]) -> List[Message]:
+        """
+        Загружает историю через loader(n) (например, из БД) и запоминает ее.
+        Версия читается до загрузки: если за это время кто-то дописал диалог,
+        следующий get увидит расхождение и загрузит заново.
+        """
+        key = (client_id, user_id)
+        version = self._shared_version(key)
+        fetch = max(limit, self.max_messages)
+        messages = loader(fetch)
+        records = deque((MemoryRecord(m.role, m.content) for m in messages), maxlen=self.max_messages)
+        conversation = _Conversation(records, version, complete=len(messages) < fetch)
+        with self._lock:
+            self._drop(key)
+            self._conversations[key] = conversation
+            self._bytes += conversation.size
+            self._evict()
+        return messages[-limit:] if limit else []
+
+    # --- Запись ---
+
+    def append(self, client_id: int, user_id: int, message: Message, confirmed: bool = True):
+        """
+        Дописывает сообщение в буфер (если диалог в памяти). confirmed — сообщение уже
+        записано в БД, и общая версия увеличивается сразу; иначе (строка ждет в журнале)
+        версию увеличит confirm после записи.
+        """
+        key = (client_id, user_id)
+        version = self._bump(key) if confirmed else None
+        with self._lock:
+            conversation = self._conversations.get(key)
+            if conversation is None:
+                return
+            if version is not None and conversation.version != version - 1:
+                # Пока буфер лежал здесь, диалог продолжался в другом воркере
+                self._drop(key)
+                return
+            records = conversation.records
+            if len(records) == records.maxlen:
+                conversation.size -= records[0].size
+                self._bytes -= records[0].size
+                conversation.complete = False
+            record = MemoryRecord(message.role, message.content)
+            records.append(record)
+            conversation.size += record.size
+            self._bytes += record.size
+            if version is not None:
+                conversation.version = version
+            conversation.last_access = time.monotonic()
+            self._conversations.move_to_end(key)
+            self._evict()
+
+    def confirm(self, keys: Iterable[ConversationKey]):
+        """
+        Отмечает, что отложенные сообщения диалогов (client_id, user_id) записаны в БД:
+        увеличивает их общие версии, чтобы буферы других воркеров перечитали историю.
+        Свой буфер остается актуальным, если за это время версию не менял никто другой.
+        """
+        for key in set(keys):
+            version = self._bump(key)
+            with self._lock:
+                conversation = self._conversations.get(key)
+                if conversation is None:
+                    continue
+                if conversation.version != version - 1:
+                    self._drop(key)
+                else:
+                    conversation.version = version
+
+# END OF FILE: src/app/memory/conversation_memory.py
@@ -0,0 +1,192 @@
+# START OF FILE: src/app/memory/summarizer.py
+
+import asyncio
+import time
+from typing import Optional, Set, Tuple
+
+from src.infra.clients.openrouter_client import OpenRouterClient, ThinkTagFilter, LLM_ERROR_MESSAGE
+from src.infra.clients.supabase_repo import SupabaseRepo
+from src.infra.storage.sqlite_db import SQLiteDB
+from src.shared.logger import logger
+from src.shared.metrics import metrics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS summary_turns (
+    client_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    turns INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (client_id, user_id)
+);
+"""
+
+_SUMMARY_INSTRUCTION = (
+    "Ты ведешь краткую сводку переписки консультанта с клиентом. Обнови сводку, добавив в нее "
+    "новые сообщения. Сохрани все факты о клиенте и его ситуации (суммы, сроки, регион, документы), "
+    "заданные вопросы и данные ответы, договоренности. Не добавляй ничего от себя. "
+    "Пиши в третьем лице, без приветствий и вступлений, не длиннее {max_chars} символов. "
+    "Ответь только текстом сводки."
+)
+
+ConversationKey = Tuple[int, int]  # (client_id, user_id)
+
+class ConversationSummarizer:
+    """
+    Фоновое сворачивание старых сообщений диалога в короткую сводку (users.conversation_summary).
+
+    notify вызывается после каждого ответа ассистента. Каждые every_turns ответов пользователю
+    ставится фоновая задача: она берет сообщения после users.conversation_summary_through,
+    оставляет последние keep_recent нетронутыми и сворачивает остальные вместе с прежней
+    сводкой одним запросом к модели. Ответ пользователю задачу не ждет; одновременно
+    выполняется не больше max_concurrency задач.
+
+    До следующего сворачивания к keep_recent несвернутым сообщениям добавляется до
+    every_turns ходов, поэтому в промпт дословно идут history_window последних сообщений:
+    все, что старше, уже есть в сводке. Счетчик ходов хранится в общей для воркеров SQLite
+    (диалог может переходить между воркерами); счетчики без ходов дольше idle_ttl удаляются,
+    а пользователь без счетчика считается должником — его сообщения сворачиваются на первом
+    же ходе, чтобы сброс счетчика не оставил дыру между сводкой и промптом.
+    """
+    def __init__(
+        self,
+        or_client: OpenRouterClient,
+        repo: SupabaseRepo,
+        db_path: str,
+        keep_recent: int = 4,
+        every_turns: int = 3,
+        max_batch: int = 30,
+        max_chars: int = 1500,
+        max_concurrency: int = 2,
+        idle_ttl: float = 1800
+    ):
+        self.or_client = or_client
+        self.repo = repo
+        self.db = SQLiteDB(db_path, _SCHEMA)
+        self.keep_recent = keep_recent
+        self.every_turns = every_turns
+        self.max_batch = max_batch
+        self.max_chars = max_chars
+        self.idle_ttl = idle_ttl
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._last_prune = 0.0
+        self._running: Set[ConversationKey] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def history_window(self) -> int:
+        """Сколько последних сообщений нужно дословно передать в промпт, чтобы между ними и сводкой не было пропуска."""
+        return self.keep_recent + 2 * self.every_turns
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        logger.info(
+            f"Conversation summarizer started (every {self.every_turns} turns, {self.keep_recent} recent messages "
+            f"kept unfolded, {self.history_window} messages sent verbatim)."
+        )
+
+    async def stop(self):
+        """Дожидается начатых сводок при остановке воркера."""
+        self._loop = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def notify(self, client_id: int, user_id: int):
+        """Отмечает завершенный ход диалога. Можно вызывать из любого потока."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._count_turn, (client_id, user_id))
+
+    def _take_turn(self, key: ConversationKey) -> bool:
+        """Учитывает ход в общем счетчике; True, если пора сворачивать (счетчик при этом обнуляется)."""
+        now = time.time()
+        with self.db.transaction() as conn:
+            # Нет счетчика — новый пользователь или счетчик удален по простою: сворачиваем сразу
+            turns = conn.execute(
+                "INSERT INTO summary_turns (client_id, user_id, turns, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (client_id, user_id) DO UPDATE SET turns = turns + 1, updated_at = excluded.updated_at "
+                "RETURNING turns",
+                (*key, self.every_turns, now)
+            ).fetchone()[0]
+            due = turns >= self.every_turns
+            if due:
+                conn.execute("UPDATE summary_turns SET turns = 0 WHERE client_id = ? AND user_id = ?", key)
+            if now - self._last_prune > self.idle_ttl / 10:
+                self._last_prune = now
+                conn.execute("DELETE FROM summary_turns WHERE updated_at < ?", (now - self.idle_ttl,))
+        return due
+
+    def _retry_next_turn(self, key: ConversationKey):
+        """После неудачи сворачивание повторяется на следующем ходе, а не через every_turns."""
+        self.db.execute(
+            "UPDATE summary_turns SET turns = MAX(turns, ?) WHERE client_id = ? AND user_id = ?",
+            (self.every_turns - 1, *key)
+        )
+
+    def _count_turn(self, key: ConversationKey):
+        if self._loop is None:
+            return
+        if key in self._running:
+            # Пока идет сворачивание, ходы копятся: следующее начнется, как только счетчик дойдет до порога
+            self.db.execute(
+                "UPDATE summary_turns SET turns = turns + 1, updated_at = ? WHERE client_id = ? AND user_id = ?",
+                (time.time(), *key)
+            )
+            return
+        if not self._take_turn(key):
+            return
+        self._running.add(key)
+        task = asyncio.create_task(self._summarize(*key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, client_id: int, user_id: int):
+        try:
+            async with self._semaphore:
+                if await self.summarize(client_id, user_id) is None:
+                    self._retry_next_turn((client_id, user_id))
+        except Exception as e:
+            metrics.incr("summary.errors", client_id=client_id)
+            logger.error(f"Conversation summary failed for user {user_id} (client {client_id}): {e}", exc_info=True)
+            self._retry_next_turn((client_id, user_id))
+        finally:
+            self._running.discard((client_id, user_id))
+
+    async def summarize(self, client_id: int, user_id: int) -> Optional[bool]:
+        """
+        Сворачивает накопившиеся сообщения пользователя в сводку. True — сводка обновлена,
+        False — сворачивать нечего, None — не удалось (стоит повторить).
+        """
+        started = time.perf_counter()
+        summary, through = await asyncio.to_thread(self.repo.get_conversation_summary, user_id, client_id)
+        limit = self.max_batch + self.keep_recent
+        rows = await asyncio.to_thread(self.repo.get_messages_after, user_id, client_id, through, limit)
+        # Если сообщений больше, чем влезло в выборку, последние из них еще не самые свежие
+        folded = rows[:self.max_batch] if len(rows) == limit else rows[:-self.keep_recent]
+        if len(folded) < 2:
+            return False
+
+        transcript = "\n".join(f"{row['role']}: {row['content']}" for row in folded)
+        messages = [
+            {"role": "system", "content": _SUMMARY_INSTRUCTION.format(max_chars=self.max_chars)},
+            {"role": "user", "content": f"Текущая сводка:\n{summary or '(пусто)'}\n\nНовые сообщения:\n{transcript}"}
+        ]
+        response = await self.or_client.get_chat_completion(messages)
+        if not response or response == LLM_ERROR_MESSAGE:
+            metrics.incr("summary.errors", client_id=client_id)
+            return None
+        think_filter = ThinkTagFilter()
+        new_summary = (think_filter.feed(response) + think_filter.flush()).strip()[:self.max_chars]
+        if not new_summary:
+            return None
+
+        if not await asyncio.to_thread(self.repo.update_conversation_summary, user_id, client_id, new_summary, folded[-1]['created_at']):
+            return None
+        if len(rows) == limit:
+            self._retry_next_turn((client_id, user_id))  # свернута не вся очередь — продолжим на следующем ходе
+        metrics.incr("summary.updates", client_id=client_id)
+        metrics.observe("summary.folded_messages", len(folded), client_id=client_id)
+        metrics.observe("summary.ms", (time.perf_counter() - started) * 1000, client_id=client_id)
+        logger.info(f"Folded {len(folded)} message(s) into the summary of user {user_id} (client {client_id}), {len(new_summary)} chars.")
+        return True
+
+# END OF FILE: src/app/memory/summarizer.py
@@ -0,0 +1,203 @@
+# START OF FILE: src/app/parsing/chunker.py
+
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass, field, asdict
+from itertools import chain
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.shared.logger import logger
+
+_WORD_RE = re.compile(r"\S+")
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+")
+
+@dataclass
+class Chunk:
+    content: str
+    source: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def content_hash(self) -> str:
+        return content_hash(self.content)
+
+    def to_dict(self):
+        return asdict(self)
+
+def content_hash(content: str) -> str:
+    """Отпечаток текста чанка: по нему определяется, нужно ли заново считать эмбеддинг."""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка длины текста в токенах (по числу слов)."""
+    return len(_WORD_RE.findall(text))
+
+# --- Окна фиксированного размера ---
+
+def _split_units(text: str, max_tokens: int) -> List[str]:
+    """
+    Делит текст на неделимые единицы для упаковки в окна: абзацы, длинные абзацы —
+    на предложения, слишком длинные предложения — на куски по max_tokens слов.
+    """
+    units = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            units.append(paragraph)
+            continue
+        for sentence in _SENTENCE_RE.split(paragraph):
+            words = sentence.split()
+            for start in range(0, len(words), max_tokens):
+                units.append(" ".join(words[start:start + max_tokens]))
+    return units
+
+def window_text(text: str, max_tokens: int, overlap_tokens: int) -> Iterator[str]:
+    """
+    Упаковывает текст в окна не длиннее max_tokens. Соседние окна перекрываются
+    хвостовыми единицами предыдущего окна суммарной длиной не больше overlap_tokens.
+    """
+    window: List[Tuple[str, int]] = []
+    size = 0
+    fresh = False  # есть ли в окне что-то кроме перекрытия
+    for unit in _split_units(text, max_tokens):
+        tokens = estimate_tokens(unit)
+        if window and size + tokens > max_tokens:
+            yield "\n\n".join(u for u, _ in window)
+            overlap, overlap_size = [], 0
+            for u, t in reversed(window):
+                if overlap_size + t > overlap_tokens or overlap_size + t + tokens > max_tokens:
+                    break
+                overlap.insert(0, (u, t))
+                overlap_size += t
+            window, size, fresh = overlap, overlap_size, False
+        window.append((unit, tokens))
+        size += tokens
+        fresh = True
+    if window and fresh:
+        yield "\n\n".join(u for u, _ in window)
+
+# --- Markdown ---
+
+def iter_markdown_chunks(file_path: str, max_tokens: int = 256, overlap_tokens: int = 48) -> Iterator[Chunk]:
+    """
+    Построчно читает markdown и режет его по иерархии заголовков: каждый раздел
+    делится на окна, а к каждому окну добавляется путь заголовков ("Глава > Раздел"),
+    чтобы чанк оставался понятным в отрыве от документа. Путь входит в max_tokens:
+    окна раздела короче на его длину (а сам путь — не длиннее половины лимита).
+    """
+    source = os.path.basename(file_path)
+    headings: List[Tuple[int, str]] = []
+    body: List[str] = []
+
+    def flush() -> Iterator[Chunk]:
+        text = "\n".join(body).strip()
+        if not text:
+            return
+        path = " > ".join(title for _, title in headings)
+        if estimate_tokens(path) > max_tokens // 2:
+            # Слишком длинный путь не должен вытеснять текст: оставляем ближайшие заголовки
+            path = "… " + " ".join(path.split()[-(max_tokens // 2 - 1):]) if max_tokens > 3 else ""
+        budget = max_tokens - estimate_tokens(path)
+        for window in window_text(text, budget, min(overlap_tokens, budget // 2)):
+            content = f"{path}\n\n{window}" if path else window
+            yield Chunk(content=content, source=source, metadata={"headings": path})
+
+    in_code_block = False
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.lstrip().startswith("```"):
+                in_code_block = not in_code_block
+            match = None if in_code_block else _HEADING_RE.match(line)
+            if match is None:
+                body.append(line)
+                continue
+            yield from flush()
+            body = []
+            level = len(match.group(1))
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, match.group(2)))
+    yield from flush()
+
+# --- JSON ---
+
+def iter_json_array(file_path: str, read_size: int = 1 << 16) -> Iterator[Any]:
+    """Потоково читает элементы JSON-массива верхнего уровня, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        buffer = f.read(read_size).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError("JSON должен быть списком объектов.")
+        buffer = buffer[1:]
+        eof = False
+        while True:
+            buffer = buffer.lstrip().lstrip(',').lstrip()
+            if buffer.startswith(']'):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more = f.read(read_size)
+                eof = not more
+                buffer += more
+                continue
+            yield item
+            buffer = buffer[end:]
+            if len(buffer) < read_size and not eof:
+                more = f.read(read_size)
+                eof = not more
+                buffer += more
+
+def faq_item_to_chunk(item: Dict[str, Any], source: str) -> Optional[Chunk]:
+    question, answer = item.get('question'), item.get('answer')
+    if not question or not answer:
+        return None
+    return Chunk(content=f"Вопрос: {question}\nОтвет: {answer}", source=source, metadata={"question": question})
+
+def quote_item_to_chunk(item: Dict[str, Any], source: str) -> Optional[Chunk]:
+    quote = item.get('quote')
+    if not quote:
+        return None
+    attribution = ", ".join(part for part in (item.get('source_name'), item.get('source_url')) if part)
+    content = f"{quote}\nИсточник: {attribution}" if attribution else quote
+    metadata = {key: item[key] for key in ('source_name', 'source_url', 'keywords') if item.get(key)}
+    return Chunk(content=content, source=source, metadata=metadata)
+
+def iter_json_chunks(file_path: str) -> Iterator[Chunk]:
+    """
+    Читает JSON-список FAQ ({question, answer}) или цитат ({quote, source_name,
+    source_url, keywords}); формат определяется по первой записи.
+    """
+    source = os.path.basename(file_path)
+    items = iter_json_array(file_path)
+    first = next(items, None)
+    if first is None:
+        return
+    convert = quote_item_to_chunk if isinstance(first, dict) and 'quote' in first else faq_item_to_chunk
+    for item in chain([first], items):
+        chunk = convert(item, source) if isinstance(item, dict) else None
+        if chunk is None:
+            logger.warning(f"Skipping malformed record in {source}: {str(item)[:200]}")
+            continue
+        yield chunk
+
+# --- Точка входа ---
+
+def iter_chunks(file_path: str, max_tokens: int = 256, overlap_tokens: int = 48) -> Iterator[Chunk]:
+    """Лениво выдает чанки файла базы знаний (.md / .markdown / .json)."""
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in ('.md', '.markdown'):
+        return iter_markdown_chunks(file_path, max_tokens, overlap_tokens)
+    if extension == '.json':
+        return iter_json_chunks(file_path)
+    raise ValueError(f"Unsupported knowledge base file format: {file_path}")
+
+# END OF FILE: src/app/parsing/chunker.py
@@ -0,0 +1,136 @@
+# START OF FILE: src/app/prompts/compiler.py
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from src.app.prompts.tokens import estimate_tokens, MESSAGE_OVERHEAD
+from src.domain.models import Message
+from src.shared.logger import logger
+
+_QUIZ_HEADER = (
+    "**ВАЖНО:** У тебя есть дополнительная информация о клиенте, "
+    "полученная из квиза. Обязательно используй её для более точного "
+    "и персонализированного ответа.\n"
+    "--- КОНТЕКСТ КЛИЕНТА ---\n"
+)
+_QUIZ_FOOTER = "\n--- КОНЕЦ КОНТЕКСТА ---"
+_SUMMARY_HEADER = "Краткое содержание более ранней части разговора:\n"
+_KNOWLEDGE_HEADER = "Справочные материалы из базы знаний (используй их, если они относятся к вопросу):\n"
+_KNOWLEDGE_SEPARATOR = "\n\n---\n\n"
+_HISTORY_HEADER = "Вот предыдущая часть нашего разговора:\n"
+
+@dataclass
+class CompiledPrompt:
+    messages: List[Dict[str, str]]
+    usage: Dict[str, int]  # оценка токенов по секциям и total
+    budget: int
+    dropped: Dict[str, int] = field(default_factory=dict)  # сколько элементов секции не вошло в бюджет
+    rag_chunks: List[Dict[str, Any]] = field(default_factory=list)  # вошедшие фрагменты
+    history: List[Message] = field(default_factory=list)  # вошедшая история (без текущего вопроса)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.usage['total']
+
+    def to_debug(self) -> Dict[str, Any]:
+        return {"usage": self.usage, "budget": self.budget, "dropped": self.dropped}
+
+class PromptCompiler:
+    """
+    Собирает сообщения для модели в порядке от самого стабильного к самому изменчивому:
+
+    1. системный промпт клиента — байт в байт как в настройках, отдельным сообщением
+       (общий префикс для всех диалогов клиента, его кэширует провайдер);
+    2. контекст квиза и сводка диалога — меняются редко, префикс пользователя;
+    3. фрагменты базы знаний — свои для каждого вопроса;
+    4. история и вопрос.
+
+    Системный промпт и вопрос входят всегда. Остальное добавляется по приоритету, пока
+    хватает budget токенов: квиз, сводка, затем поочередно фрагменты базы знаний
+    (в порядке ранга) и сообщения истории (от новых к старым). Не поместившиеся
+    фрагменты и старые сообщения отбрасываются.
+    """
+    def __init__(self, budget: int = 6000):
+        self.budget = budget
+
+    @staticmethod
+    def _cost(text: str) -> int:
+        return estimate_tokens(text) + MESSAGE_OVERHEAD
+
+    def compile(
+        self,
+        system_prompt: str,
+        question: str,
+        history: List[Message],
+        rag_chunks: List[Dict[str, Any]],
+        quiz_context: Optional[str] = None,
+        summary: Optional[str] = None
+    ) -> CompiledPrompt:
+        question_text = f"Вопрос клиента: «{question}»"
+        question_line = f"user: {question}"
+        # В блоке истории, как и раньше, последней строкой идет текущий вопрос
+        usage = {
+            'system': self._cost(system_prompt),
+            'question': self._cost(question_text) + self._cost(_HISTORY_HEADER + question_line),
+        }
+        remaining = self.budget - usage['system'] - usage['question']
+
+        def fits(cost: int) -> bool:
+            nonlocal remaining
+            if cost > remaining:
+                return False
+            remaining -= cost
+            return True
+
+        quiz_text = _QUIZ_HEADER + quiz_context + _QUIZ_FOOTER if quiz_context else None
+        quiz_fits = quiz_text is not None and fits(self._cost(quiz_text))
+        summary_text = _SUMMARY_HEADER + summary if summary else None
+        summary_fits = summary_text is not None and fits(self._cost(summary_text))
+
+        # Заголовок блока знаний оплачивается вместе с первым вошедшим фрагментом
+        chunk_costs = [estimate_tokens(chunk['content'] + _KNOWLEDGE_SEPARATOR) for chunk in rag_chunks]
+        history_costs = [estimate_tokens(f"{msg.role}: {msg.content}\n") for msg in history]
+        knowledge_header_cost = self._cost(_KNOWLEDGE_HEADER)
+        kept_chunks, kept_history = set(), set()
+        for i in range(max(len(rag_chunks), len(history))):
+            if i < len(rag_chunks) and fits(chunk_costs[i] + (0 if kept_chunks else knowledge_header_cost)):
+                kept_chunks.add(i)
+            h = len(history) - 1 - i
+            # История обрезается только с начала: после первого непоместившегося сообщения старшие не берем
+            if h >= 0 and len(kept_history) == i and fits(history_costs[h]):
+                kept_history.add(h)
+
+        chunks = [chunk for i, chunk in enumerate(rag_chunks) if i in kept_chunks]
+        prior_history = [msg for i, msg in enumerate(history) if i in kept_history]
+
+        messages = [{"role": "system", "content": system_prompt}]
+        if quiz_fits:
+            messages.append({"role": "system", "content": quiz_text})
+            usage['quiz'] = self._cost(quiz_text)
+        if summary_fits:
+            messages.append({"role": "system", "content": summary_text})
+            usage['summary'] = self._cost(summary_text)
+        if chunks:
+            knowledge_text = _KNOWLEDGE_SEPARATOR.join(chunk['content'] for chunk in chunks)
+            messages.append({"role": "system", "content": _KNOWLEDGE_HEADER + knowledge_text})
+            usage['knowledge'] = self._cost(_KNOWLEDGE_HEADER + knowledge_text)
+        history_lines = [f"{msg.role}: {msg.content}" for msg in prior_history] + [question_line]
+        messages.append({"role": "system", "content": _HISTORY_HEADER + "\n".join(history_lines)})
+        messages.append({"role": "user", "content": question_text})
+        if prior_history:
+            usage['history'] = self._cost(messages[-2]['content']) - self._cost(_HISTORY_HEADER + question_line)
+        usage['total'] = sum(usage.values())
+
+        dropped = {
+            name: count for name, count in (
+                ('quiz', int(quiz_text is not None and not quiz_fits)),
+                ('summary', int(summary_text is not None and not summary_fits)),
+                ('knowledge', len(rag_chunks) - len(chunks)),
+                ('history', len(history) - len(prior_history)),
+            ) if count
+        }
+        if remaining < 0:
+            logger.warning(f"System prompt and question alone take ~{usage['total']} tokens, over the budget of {self.budget}.")
+        return CompiledPrompt(messages, usage, self.budget, dropped, chunks, prior_history)
+
+# END OF FILE: src/app/prompts/compiler.py
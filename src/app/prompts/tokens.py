@@ -0,0 +1,17 @@
+# START OF FILE: src/app/prompts/tokens.py
+
+# Служебные токены чат-формата на каждое сообщение (роль, разделители)
+MESSAGE_OVERHEAD = 4
+
+def estimate_tokens(text: str) -> int:
+    """
+    Приблизительное число токенов без токенизатора модели: латиница и цифры — около
+    4 символов на токен, кириллица и прочие символы — около 2.5. Для русских текстов
+    погрешность на типичных BPE-словарях — в пределах 10-15%.
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ch < '\x80')
+    return int(ascii_chars / 4 + (len(text) - ascii_chars) / 2.5) + 1
+
+# END OF FILE: src/app/prompts/tokens.py
@@ -1,13 +1,32 @@
 # path: src/app/services/ai_service.py
+import asyncio
 import time
 import re
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Callable, Awaitable
 
-from src.infra.clients.openrouter_client import OpenRouterClient
+from src.infra.clients.openrouter_client import OpenRouterClient, LLM_ERROR_MESSAGE, INCOMPLETE_FINISH_REASONS
 from src.infra.clients.hf_whisper_client import WhisperClient
 from src.infra.clients.supabase_repo import SupabaseRepo
-from src.domain.models import Message
+from src.infra.clients.embedding_client import EmbeddingClient
+from src.infra.clients.embedding_batcher import EmbeddingBatcher
+from src.infra.knowledge.faq_index import FaqIndex, pick_direct_answer
+from src.infra.knowledge.hybrid_retriever import HybridRetriever
+from src.app.services.response_cache import ResponseCache
+from src.app.services.tenant_config import TenantConfigCache
+from src.app.services.intent_classifier import IntentClassifier, classify_with_llm, DEFAULT_CATEGORY
+from src.app.services.model_router import ModelRouter
+from src.infra.storage.message_journal import MessageJournal
+from src.app.memory.conversation_memory import ConversationMemory
+from src.app.memory.summarizer import ConversationSummarizer
+from src.app.prompts.compiler import PromptCompiler
+from src.domain.models import Message, ModelRoute, TurnContext
 from src.shared.logger import logger
+from src.shared.metrics import metrics
+from src.shared.config import (
+    RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL,
+    FAQ_DIRECT_ANSWER_CONFIDENCE, FAQ_DIRECT_ANSWER_MIN_LEMMAS, FAQ_GROUNDING_CONFIDENCE, RAG_TOP_K, RAG_MATCH_THRESHOLD,
+    PROMPT_TOKEN_BUDGET, INTENT_CONFIDENCE_THRESHOLD
+)
 
 def strip_all_html_tags(text: str) -> Optional[str]:
     """Полностью удаляет все HTML-теги из текста."""
@@ -15,103 +34,265 @@ def strip_all_html_tags(text: str) -> Optional[str]:
         return None
     return re.sub(r'<.*?>', '', text)
 
+def format_faq_answer(answer: str) -> str:
+    """Превращает HTML-ответ из faq.json в простой текст, сохраняя пункты списков."""
+    return strip_all_html_tags(answer.replace('<li>', '• ')).strip()
+
 class AIService:
     def __init__(
         self,
         or_client: OpenRouterClient,
         whisper_client: WhisperClient,
-        repo: SupabaseRepo
+        repo: SupabaseRepo,
+        faq_index: Optional[FaqIndex] = None,
+        embedding_client: Optional[EmbeddingClient | EmbeddingBatcher] = None,
+        retriever: Optional[HybridRetriever] = None,
+        tenant_configs: Optional[TenantConfigCache] = None,
+        journal: Optional[MessageJournal] = None,
+        memory: Optional[ConversationMemory] = None,
+        summarizer: Optional[ConversationSummarizer] = None,
+        intent_classifier: Optional[IntentClassifier] = None,
+        model_router: Optional[ModelRouter] = None
     ):
         self.or_client = or_client
         self.whisper_client = whisper_client
         self.repo = repo
-        logger.info("AIService initialized with DYNAMIC system prompts. RAG is DISABLED.")
-        self.embedding_client = None
+        self.faq_index = faq_index
+        self.embedding_client = embedding_client
+        self.retriever = retriever
+        self.tenant_configs = tenant_configs
+        self.journal = journal
+        self.memory = memory
+        self.summarizer = summarizer
+        # Без сводки в промпт идут 3 последних сообщения; со сводкой — все, что в нее еще не свернуто
+        self.history_limit = summarizer.history_window if summarizer is not None else 3
+        if memory is not None and self.history_limit + 1 > memory.max_messages:
+            logger.warning(f"Conversation memory keeps {memory.max_messages} messages, fewer than the prompt needs ({self.history_limit + 1}); history will be read from the database.")
+        self.intent_classifier = intent_classifier
+        self.model_router = model_router or ModelRouter.from_config()
+        rag_status = f"ENABLED (in-process, fusion: {retriever.fusion})" if self.rag_enabled else "DISABLED"
+        logger.info(f"AIService initialized with DYNAMIC system prompts. RAG is {rag_status}.")
+        self.prompt_compiler = PromptCompiler(PROMPT_TOKEN_BUDGET)
+        self.response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL) if RESPONSE_CACHE_ENABLED else None
+
+    @property
+    def rag_enabled(self) -> bool:
+        # В режиме bm25 векторы запросов не нужны, поэтому энкодер не обязателен
+        return self.retriever is not None and (self.embedding_client is not None or self.retriever.fusion == 'bm25')
 
-    def classify_text(self, text: str) -> Optional[str]:
-        """Классифицирует текст запроса по заданным категориям."""
+    async def classify_text(self, text: str, allow_llm: bool = True) -> Optional[str]:
+        """
+        Классифицирует текст запроса по заданным категориям: локальной моделью, а если
+        она не уверена (или не обучена) — запросом к LLM. С allow_llm=False в этом
+        случае возвращает None.
+        """
         clean_text = " ".join(text.strip().split())
         if not clean_text:
             return "Нецелевой запрос"
 
-        categories = [
-            "Вопрос о стоимости",
-            "Условия и процесс банкротства",
-            "Последствия банкротства",
-            "Общая консультация",
-            "Нецелевой запрос"
-        ]
-        
-        classifier_prompt = (
-            "Твоя задача - классифицировать запрос пользователя. "
-            "Проанализируй следующий текст и определи, к какой из этих категорий он относится:\n"
-            f"- {', '.join(categories)}\n\n"
-            "В своем ответе напиши ТОЛЬКО название одной категории и ничего больше. Будь точен."
-        )
-
-        messages = [
-            {"role": "system", "content": classifier_prompt},
-            {"role": "user", "content": clean_text}
-        ]
+        if self.intent_classifier is not None:
+            started = time.perf_counter()
+            category, confidence = self.intent_classifier.predict(clean_text)
+            metrics.observe("intent.local_ms", (time.perf_counter() - started) * 1000)
+            if confidence >= INTENT_CONFIDENCE_THRESHOLD:
+                metrics.incr("intent.local")
+                logger.info(f"Text classified locally as '{category}' (confidence {confidence:.2f}).")
+                return category
+        if not allow_llm:
+            return None
+        metrics.incr("intent.llm_fallbacks")
 
         try:
-            category = self.or_client.get_chat_completion(messages)
-            if category is None: return "Общая консультация" # Fallback
-            clean_category = category.strip().replace('.', '')
-            if clean_category in categories:
-                logger.info(f"Text classified as '{clean_category}'.")
-                return clean_category
-            else:
-                logger.warning(f"LLM returned an unknown category: '{category}'. Defaulting to 'Общая консультация'.")
-                return "Общая консультация"
+            category = await classify_with_llm(self.or_client, clean_text)
+            if category is None:
+                return DEFAULT_CATEGORY
+            logger.info(f"Text classified as '{category}'.")
+            return category
         except Exception as e:
             logger.error(f"Failed to classify text: {e}", exc_info=True)
-            return "Общая консультация"
-        
-    def _build_rag_prompt(self, system_prompt: str, question: str, history: List[Message], rag_chunks: List[Dict[str, Any]], quiz_context: Optional[str] = None) -> List[Dict[str, str]]:
-        """Собирает полный промпт, используя предоставленный system_prompt."""
-        current_system_prompt = system_prompt
-        
-        if quiz_context:
-            current_system_prompt += (
-                "\n\n**ВАЖНО:** У тебя есть дополнительная информация о клиенте, "
-                "полученная из квиза. Обязательно используй её для более точного "
-                "и персонализированного ответа.\n"
-                f"--- КОНТЕКСТ КЛИЕНТА ---\n{quiz_context}\n--- КОНЕЦ КОНТЕКСТА ---"
-            )
+            return DEFAULT_CATEGORY
 
-        messages = [{"role": "system", "content": current_system_prompt}]
-        
-        history_text_for_prompt = "\n".join([f"{msg.role}: {msg.content}" for msg in history])
-        
-        if history:
-            messages.append({"role": "system", "content": f"Вот предыдущая часть нашего разговора:\n{history_text_for_prompt}"})
-        user_prompt_text = f"Вопрос клиента: «{question}»"
+    async def load_turn_context(
+        self,
+        user_id: int,
+        client_id: int,
+        user_question: Optional[str] = None,
+        save_question: bool = True,
+        history_limit: Optional[int] = None
+    ) -> TurnContext:
+        """
+        Загружает промпт, историю и статус квиза параллельно (промпт обычно из кэша
+        настроек, история — из памяти диалогов, без сети). user_question исключается
+        из истории и, если save_question, сохраняется в том же батче.
+        По умолчанию история — self.history_limit последних сообщений.
+        """
+        started = time.perf_counter()
+        if history_limit is None:
+            history_limit = self.history_limit
+        question = Message(role='user', content=user_question) if user_question is not None and save_question else None
+        calls = [
+            self._load_prompt_settings(client_id),
+            self._load_history(user_id, client_id, history_limit + 1),
+            asyncio.to_thread(self.repo.get_user_turn_state, user_id, client_id),
+        ]
+        if question is not None:
+            if self.journal is not None:
+                self.save_message(user_id, question, client_id)
+            elif self.memory is not None:
+                # Без журнала вопрос пишется в БД до чтения истории: иначе холодная загрузка
+                # памяти могла бы его не увидеть и запомнить историю без него
+                await asyncio.to_thread(self.save_message, user_id, question, client_id)
+            else:
+                calls.append(asyncio.to_thread(self.repo.save_message, user_id, question, client_id))
+        (system_prompt, model_routes), history, (quiz_completed, quiz_results, summary), *_ = await asyncio.gather(*calls)
+
+        # Вопрос сохраняется одновременно с чтением истории (или раньше), поэтому может в нее попасть
+        if user_question is not None and history and history[-1].role == 'user' and history[-1].content == user_question:
+            history = history[:-1]
+        turn = TurnContext(
+            user_id=user_id, client_id=client_id, system_prompt=system_prompt,
+            history=history[-history_limit:] if history_limit else [],
+            quiz_completed=quiz_completed, quiz_results=quiz_results, summary=summary,
+            model_routes=model_routes
+        )
+        metrics.observe("turn.context_ms", (time.perf_counter() - started) * 1000, client_id=client_id)
+        return turn
 
-        messages.append({"role": "user", "content": user_prompt_text})
-        return messages
+    async def _load_history(self, user_id: int, client_id: int, limit: int) -> List[Message]:
+        """Последние limit сообщений: из памяти диалогов, а при промахе — из БД с запоминанием."""
+        if self.memory is None:
+            return await asyncio.to_thread(self._read_history, user_id, client_id, limit)
+        history = self.memory.get(client_id, user_id, limit)
+        if history is not None:
+            return history
+        return await asyncio.to_thread(
+            self.memory.load, client_id, user_id, limit,
+            lambda count: self._read_history(user_id, client_id, count)
+        )
+
+    def _read_history(self, user_id: int, client_id: int, limit: int) -> List[Message]:
+        """История из БД вместе с сообщениями, еще ожидающими записи в журнале."""
+        history = self.repo.get_recent_messages(user_id, client_id, limit)
+        if self.journal is not None:
+            history = self._merge_pending(history, self.journal.pending_messages(user_id, client_id))
+        return history[-limit:]
+
+    @staticmethod
+    def _merge_pending(history: List[Message], pending: List[Message]) -> List[Message]:
+        """
+        Дописывает к истории из БД сообщения, еще ожидающие записи в журнале. Строки,
+        которые журнал успел записать между двумя чтениями, в истории уже есть — их пропускаем.
+        """
+        overlap = 0
+        for size in range(min(len(history), len(pending)), 0, -1):
+            if history[-size:] == pending[:size]:
+                overlap = size
+                break
+        return history + pending[overlap:]
 
-    def get_text_response(self, user_id: int, user_question: str, client_id: int) -> Tuple[Optional[str], dict]:
-        """Генерирует ответ, используя динамический системный промпт и контекст квиза."""
+    def save_message(self, user_id: int, message: Message, client_id: int):
+        """
+        Сохраняет сообщение: через журнал (без ожидания БД) или напрямую; дописывает его в память
+        диалогов. Общую версию диалога для отложенной строки увеличит журнал после записи в БД.
+        """
+        if self.journal is not None:
+            deferred = self.journal.append(user_id, message, client_id)
+        else:
+            self.repo.save_message(user_id, message, client_id)
+            deferred = False
+        if self.memory is not None:
+            self.memory.append(client_id, user_id, message, confirmed=not deferred)
+        if self.summarizer is not None and message.role == 'assistant':
+            self.summarizer.notify(client_id, user_id)
+
+    async def get_text_response(
+        self,
+        user_id: int,
+        user_question: str,
+        client_id: int,
+        on_partial: Optional[Callable[[str], Awaitable[None]]] = None,
+        turn: Optional[TurnContext] = None
+    ) -> Tuple[Optional[str], dict]:
+        """
+        Генерирует ответ, используя динамический системный промпт и контекст квиза.
+        turn — заранее загруженный снимок (load_turn_context); без него он загружается здесь.
+        Если передан on_partial, ответ запрашивается потоком и колбэк получает накопленный текст.
+        debug_info["incomplete"] — причина, по которой ответ оборван ('error' или 'length'), иначе None:
+        такой ответ не кэшируется, и сохранять его в историю как обычный ответ нельзя.
+        """
         start_time = time.time()
-        
-        system_prompt = self.repo.get_client_system_prompt(client_id)
+        if turn is None:
+            turn = await self.load_turn_context(user_id, client_id, user_question, save_question=False)
+
+        system_prompt = turn.system_prompt
         if not system_prompt:
             logger.error(f"Could not retrieve system prompt for client {client_id}. Using a safe fallback.")
             system_prompt = "Ты — полезный ассистент. Отвечай на вопросы кратко и по делу."
 
-        history = self.repo.get_recent_messages(user_id, client_id)
-        
-        quiz_completed, quiz_results = self.repo.get_user_quiz_status(user_id, client_id)
-        quiz_context = None
-        if quiz_completed and isinstance(quiz_results, dict):
+        quiz_completed = turn.quiz_completed
+        quiz_context = turn.quiz_context
+        if quiz_context:
             logger.info(f"User {user_id} (client {client_id}) has quiz data. Adding it to context.")
-            quiz_context = "\n".join([f"- {q}: {a}" for q, a in quiz_results.items()])
+
+        # В промпт, как и раньше, идет история вместе с текущим вопросом
+        prior_history = turn.history
+        history = prior_history + [Message(role='user', content=user_question)]
 
         rag_chunks = []
-        
-        messages_to_send = self._build_rag_prompt(system_prompt, user_question, history, rag_chunks, quiz_context)
-        raw_response_text = self.or_client.get_chat_completion(messages_to_send)
+        if self.faq_index:
+            faq_matches = self.faq_index.search(user_question, top_k=3)
+            if faq_matches and not prior_history and not turn.summary and not quiz_context:
+                top = pick_direct_answer(faq_matches, FAQ_DIRECT_ANSWER_CONFIDENCE, FAQ_DIRECT_ANSWER_MIN_LEMMAS)
+                if top:
+                    end_time = time.time()
+                    answer = format_faq_answer(top.entry.answer)
+                    debug_info = { "user_question": user_question, "llm_response": answer, "final_prompt": [], "rag_chunks": [], "conversation_history": [msg.to_dict() for msg in history], "processing_time": f"{end_time - start_time:.2f}s", "faq_match": {"question": top.entry.question, "confidence": round(top.confidence, 3)} }
+                    metrics.incr("faq.direct_answers", client_id=client_id)
+                    logger.info(f"Answered from FAQ for client {client_id} (confidence {top.confidence:.2f}). Time: {debug_info['processing_time']}.")
+                    return answer, debug_info
+            rag_chunks = [
+                {"content": f"Вопрос: {m.entry.question}\nОтвет: {format_faq_answer(m.entry.answer)}", "source": "faq.json", "similarity": round(m.coverage, 3)}
+                for m in faq_matches[:2] if m.coverage >= FAQ_GROUNDING_CONFIDENCE
+            ]
+            if rag_chunks:
+                metrics.incr("faq.grounded_prompts", client_id=client_id)
+
+        cache_key, prompt_fingerprint = None, None
+        if self.response_cache and not prior_history and not turn.summary and not quiz_context:
+            cache_key = self.response_cache.make_key(user_question)
+            prompt_fingerprint = self.response_cache.prompt_fingerprint(system_prompt)
+        if cache_key:
+            cached_response = self.response_cache.get(client_id, prompt_fingerprint, cache_key)
+            if cached_response is not None:
+                end_time = time.time()
+                debug_info = { "user_question": user_question, "llm_response": cached_response, "final_prompt": [], "rag_chunks": [], "conversation_history": [msg.to_dict() for msg in history], "processing_time": f"{end_time - start_time:.2f}s", "cache_hit": True, "cache_key": cache_key }
+                logger.info(f"Response cache hit for client {client_id} (key: '{cache_key}'). Time: {debug_info['processing_time']}.")
+                return cached_response, debug_info
+
+        if self.rag_enabled:
+            known = {chunk['content'] for chunk in rag_chunks}
+            rag_chunks += [chunk for chunk in await self._retrieve_chunks(user_question, client_id) if chunk['content'] not in known]
+
+        prompt = self.prompt_compiler.compile(system_prompt, user_question, prior_history, rag_chunks, quiz_context, turn.summary)
+        messages_to_send, rag_chunks = prompt.messages, prompt.rag_chunks
+        history = prompt.history + [Message(role='user', content=user_question)]
+        metrics.observe("llm.prompt_tokens", prompt.total_tokens, client_id=client_id)
+        for section, count in prompt.dropped.items():
+            metrics.incr(f"prompt.dropped_{section}", count, client_id=client_id)
+
+        # Маршрут выбирается только локальной моделью: лишний запрос к LLM ради выбора модели не окупается
+        category = await self.classify_text(user_question, allow_llm=False)
+        route = self.model_router.route(client_id, category, turn.model_routes)
+        usage: Dict[str, Any] = {}
+        llm_started = time.perf_counter()
+        if on_partial is None:
+            raw_response_text = await self.or_client.get_chat_completion(
+                messages_to_send, timeout=route.timeout, model=route.model,
+                max_tokens=route.max_tokens, temperature=route.temperature, stats=usage
+            )
+        else:
+            raw_response_text = await self._stream_response(messages_to_send, on_partial, route, usage)
+        self._observe_route(route, client_id, (time.perf_counter() - llm_started) * 1000, usage, prompt.total_tokens)
         
         end_time = time.time()
         
@@ -120,13 +301,95 @@ class AIService:
             return None, debug_info
 
         response_text = strip_all_html_tags(raw_response_text)
+        # Оборванный ответ (сбой потока, лимит токенов) нельзя отдавать другим пользователям из кэша
+        incomplete = usage.get('finish_reason') in INCOMPLETE_FINISH_REASONS
+        if incomplete and raw_response_text != LLM_ERROR_MESSAGE:
+            metrics.incr("llm.incomplete_answers", client_id=client_id)
+            logger.warning(f"Incomplete LLM answer for client {client_id} (finish reason: {usage['finish_reason']}, route: {route.name}).")
+        if cache_key and response_text and not incomplete:
+            self.response_cache.put(client_id, prompt_fingerprint, cache_key, response_text)
 
-        debug_info = { "user_question": user_question, "llm_response": response_text, "final_prompt": messages_to_send, "rag_chunks": rag_chunks, "conversation_history": [msg.to_dict() for msg in history], "processing_time": f"{end_time - start_time:.2f}s" }
+        debug_info = { "user_question": user_question, "llm_response": response_text, "incomplete": usage['finish_reason'] if incomplete else None, "final_prompt": messages_to_send, "rag_chunks": rag_chunks, "conversation_history": [msg.to_dict() for msg in history], "conversation_summary": turn.summary, "prompt_tokens": prompt.to_debug(), "model_route": {"name": route.name, "category": category, "model": route.model, **usage}, "processing_time": f"{end_time - start_time:.2f}s" }
         
-        logger.info(f"Response generated for client {client_id} (Quiz context: {quiz_completed}, RAG chunks: {len(rag_chunks)}). Time: {debug_info['processing_time']}.")
+        logger.info(f"Response generated for client {client_id} (Quiz context: {quiz_completed}, RAG chunks: {len(rag_chunks)}, summary: {bool(turn.summary)}, ~{prompt.total_tokens}/{prompt.budget} prompt tokens, route: {route.name}). Time: {debug_info['processing_time']}.")
         
         return response_text, debug_info
 
+    async def _retrieve_chunks(self, question: str, client_id: int) -> List[Dict[str, Any]]:
+        """Ищет релевантные чанки базы знаний клиента локально (векторный поиск + BM25)."""
+        started = time.perf_counter()
+        query_vector = None
+        if self.retriever.fusion != 'bm25':
+            query_vector = await self.embedding_client.embed_query(question)
+        try:
+            chunks = await asyncio.to_thread(self.retriever.search, client_id, question, query_vector, RAG_TOP_K, RAG_MATCH_THRESHOLD)
+        except Exception as e:
+            logger.error(f"Vector search failed for client {client_id}: {e}", exc_info=True)
+            return []
+        metrics.observe("rag.retrieval_ms", (time.perf_counter() - started) * 1000, client_id=client_id)
+        return chunks
+
+    async def _stream_response(
+        self,
+        messages: List[Dict[str, str]],
+        on_partial: Callable[[str], Awaitable[None]],
+        route: ModelRoute,
+        usage: Dict[str, Any]
+    ) -> Optional[str]:
+        """Собирает потоковый ответ, передавая промежуточный текст (без HTML-тегов) в on_partial."""
+        parts = []
+        stream = self.or_client.stream_chat_completion(
+            messages, timeout=route.timeout, model=route.model,
+            max_tokens=route.max_tokens, temperature=route.temperature, stats=usage
+        )
+        async for piece in stream:
+            parts.append(piece)
+            partial_text = strip_all_html_tags("".join(parts).lstrip())
+            if partial_text:
+                await on_partial(partial_text)
+        return "".join(parts).strip() or None
+
+    @staticmethod
+    def _observe_route(route: ModelRoute, client_id: int, latency_ms: float, usage: Dict[str, Any], estimated_prompt_tokens: int):
+        """Статистика маршрута: число запросов, задержка и токены (от провайдера, если он их вернул)."""
+        prefix = f"llm.route.{route.name}"
+        metrics.incr(f"{prefix}.requests", client_id=client_id)
+        metrics.observe(f"{prefix}.latency_ms", latency_ms, client_id=client_id)
+        metrics.observe(f"{prefix}.prompt_tokens", usage.get('prompt_tokens', estimated_prompt_tokens), client_id=client_id)
+        if 'completion_tokens' in usage:
+            metrics.observe(f"{prefix}.completion_tokens", usage['completion_tokens'], client_id=client_id)
+
+    async def _load_prompt_settings(self, client_id: int) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Системный промпт и переопределения маршрутов моделей клиента."""
+        if self.tenant_configs is None:
+            return await self.get_system_prompt(client_id), None
+        try:
+            config = await self.tenant_configs.get(client_id)
+        except Exception as e:
+            logger.error(f"Failed to load config for client {client_id}: {e}", exc_info=True)
+            return None, None
+        return config.system_prompt, config.model_routes
+
+    async def get_system_prompt(self, client_id: int) -> Optional[str]:
+        """Системный промпт клиента: из кэша настроек, без него — напрямую из БД."""
+        if self.tenant_configs is None:
+            return await asyncio.to_thread(self.repo.get_client_system_prompt, client_id)
+        try:
+            return (await self.tenant_configs.get(client_id)).system_prompt
+        except Exception as e:
+            logger.error(f"Failed to load config for client {client_id}: {e}", exc_info=True)
+            return None
+
+    def update_system_prompt(self, client_id: int, new_prompt: str) -> bool:
+        """Обновляет системный промпт клиента и сбрасывает его кэш ответов."""
+        if self.tenant_configs is not None:
+            success = self.tenant_configs.update_system_prompt(client_id, new_prompt)
+        else:
+            success = self.repo.update_client_system_prompt(client_id, new_prompt)
+        if success and self.response_cache:
+            self.response_cache.invalidate_client(client_id)
+        return success
+
     def transcribe_voice(self, audio_data: bytes) -> Optional[str]:
         """Транскрибирует аудиоданные в текст."""
         return self.whisper_client.transcribe(audio_data)
@@ -0,0 +1,145 @@
+# START OF FILE: src/app/services/intent_classifier.py
+
+import json
+import math
+import os
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Optional, Tuple
+
+from src.infra.clients.openrouter_client import OpenRouterClient, LLM_ERROR_MESSAGE
+from src.shared.logger import logger
+from src.shared.morphology import lemmas
+
+INTENT_CATEGORIES = (
+    "Вопрос о стоимости",
+    "Условия и процесс банкротства",
+    "Последствия банкротства",
+    "Общая консультация",
+    "Нецелевой запрос",
+)
+DEFAULT_CATEGORY = "Общая консультация"
+
+_MODEL_FORMAT = 1
+
+def features(text: str) -> Counter:
+    """Признаки текста: леммы без стоп-слов и пары соседних лемм."""
+    words = lemmas(text)
+    return Counter(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+class IntentClassifier:
+    """
+    Мультиномиальный наивный Байес над TF-IDF-взвешенными леммами (униграммы и биграммы).
+
+    Модель — словари логарифмов вероятностей, поэтому предсказание — один проход по
+    признакам короткого сообщения без numpy и без сети. При низкой уверенности (см. predict)
+    вызывающий код обращается к LLM.
+    Обучается скриптом scripts/train_intent_classifier.py и хранится в JSON.
+    """
+    def __init__(self, priors: Dict[str, float], weights: Dict[str, Dict[str, float]], unknown: Dict[str, float], idf: Dict[str, float]):
+        self.priors = priors
+        self.weights = weights  # признак -> {категория: log P(признак | категория)}
+        self.unknown = unknown  # log P(признак | категория) для признаков, не встречавшихся в категории
+        self.idf = idf
+
+    @classmethod
+    def train(cls, examples: Iterable[Tuple[str, str]], alpha: float = 0.1) -> "IntentClassifier":
+        docs = [(features(text), label) for text, label in examples if label in INTENT_CATEGORIES]
+        if not docs:
+            raise ValueError("No labeled examples to train the intent classifier on.")
+        doc_freq = Counter(feature for counts, _ in docs for feature in counts)
+        idf = {feature: math.log((1 + len(docs)) / (1 + df)) + 1 for feature, df in doc_freq.items()}
+
+        class_docs = Counter(label for _, label in docs)
+        mass: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        for counts, label in docs:
+            # TF-IDF документа, нормированный по L2: длинные сообщения не перевешивают короткие
+            tfidf = {feature: (1 + math.log(count)) * idf[feature] for feature, count in counts.items()}
+            norm = math.sqrt(sum(value * value for value in tfidf.values())) or 1.0
+            for feature, value in tfidf.items():
+                mass[label][feature] += value / norm
+
+        labels = sorted(class_docs)
+        vocabulary = len(idf)
+        priors = {label: math.log(class_docs[label] / len(docs)) for label in labels}
+        totals = {label: sum(mass[label].values()) + alpha * vocabulary for label in labels}
+        unknown = {label: math.log(alpha / totals[label]) for label in labels}
+        weights = {
+            feature: {label: math.log((mass[label][feature] + alpha) / totals[label]) for label in labels if feature in mass[label]}
+            for feature in idf
+        }
+        return cls(priors, weights, unknown, idf)
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """
+        Категория и уверенность: апостериорная вероятность, умноженная на долю знакомых
+        модели признаков (текст из незнакомых слов не должен получать высокую уверенность).
+        Для текста без известных признаков — (DEFAULT_CATEGORY, 0.0).
+        """
+        all_counts = features(text)
+        counts = {feature: count for feature, count in all_counts.items() if feature in self.weights}
+        if not counts:
+            return DEFAULT_CATEGORY, 0.0
+        tfidf = {feature: (1 + math.log(count)) * self.idf[feature] for feature, count in counts.items()}
+        norm = math.sqrt(sum(value * value for value in tfidf.values()))
+        scores = dict(self.priors)
+        for feature, value in tfidf.items():
+            known = self.weights[feature]
+            for label in scores:
+                scores[label] += value / norm * known.get(label, self.unknown[label])
+        best = max(scores, key=scores.get)
+        total = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, len(counts) / len(all_counts) / total
+
+    # --- Хранение ---
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "format": _MODEL_FORMAT, "priors": self.priors, "weights": self.weights,
+                "unknown": self.unknown, "idf": self.idf
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IntentClassifier"]:
+        """Загружает модель; None, если файла нет или он в другом формате."""
+        if not os.path.exists(path):
+            logger.warning(f"Intent model {path} not found. Text classification will use the LLM.")
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("format") != _MODEL_FORMAT:
+                logger.warning(f"Intent model {path} has an unsupported format. Retrain it with scripts/train_intent_classifier.py.")
+                return None
+            model = cls(data["priors"], data["weights"], data["unknown"], data["idf"])
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Failed to load intent model {path}: {e}", exc_info=True)
+            return None
+        logger.info(f"Intent model loaded from {path} ({len(model.idf)} features, {len(model.priors)} categories).")
+        return model
+
+async def classify_with_llm(or_client: OpenRouterClient, text: str) -> Optional[str]:
+    """Категория от LLM или None, если ответ не удалось получить или распознать."""
+    classifier_prompt = (
+        "Твоя задача - классифицировать запрос пользователя. "
+        "Проанализируй следующий текст и определи, к какой из этих категорий он относится:\n"
+        f"- {', '.join(INTENT_CATEGORIES)}\n\n"
+        "В своем ответе напиши ТОЛЬКО название одной категории и ничего больше. Будь точен."
+    )
+    messages = [
+        {"role": "system", "content": classifier_prompt},
+        {"role": "user", "content": text}
+    ]
+    category = await or_client.get_chat_completion(messages)
+    if not category or category == LLM_ERROR_MESSAGE:
+        return None
+    clean_category = category.strip().replace('.', '')
+    if clean_category not in INTENT_CATEGORIES:
+        logger.warning(f"LLM returned an unknown category: '{category}'.")
+        return None
+    return clean_category
+
+# END OF FILE: src/app/services/intent_classifier.py
@@ -0,0 +1,107 @@
+# START OF FILE: src/app/services/model_router.py
+
+import json
+from dataclasses import fields, replace
+from typing import Any, Dict, Optional
+
+from src.domain.models import ModelRoute
+from src.shared.logger import logger
+from src.shared.config import (
+    LLM_MODEL_NAME, LLM_FAST_MODEL_NAME, LLM_REQUEST_TIMEOUT, LLM_FAST_TIMEOUT, LLM_ROUTES
+)
+
+# Категория запроса (classify_text) -> имя маршрута; имя идет и в названия метрик
+CATEGORY_ROUTES = {
+    "Вопрос о стоимости": "cost",
+    "Условия и процесс банкротства": "process",
+    "Последствия банкротства": "consequences",
+    "Общая консультация": "general",
+    "Нецелевой запрос": "offtopic",
+}
+DEFAULT_ROUTE = "general"
+
+_ROUTE_FIELDS = {f.name for f in fields(ModelRoute)} - {'name'}
+
+def _default_routes() -> Dict[str, ModelRoute]:
+    # Урезанные лимиты — только для отдельной быстрой модели: рассуждающей основной модели
+    # 256 токенов и 20 секунд не хватает даже на короткий ответ
+    if LLM_FAST_MODEL_NAME != LLM_MODEL_NAME:
+        offtopic = ModelRoute("offtopic", LLM_FAST_MODEL_NAME, max_tokens=256, timeout=LLM_FAST_TIMEOUT)
+        cost = ModelRoute("cost", LLM_FAST_MODEL_NAME, max_tokens=512, timeout=LLM_FAST_TIMEOUT)
+    else:
+        offtopic = ModelRoute("offtopic", LLM_MODEL_NAME, max_tokens=1024, timeout=LLM_REQUEST_TIMEOUT)
+        cost = ModelRoute("cost", LLM_MODEL_NAME, max_tokens=1024, timeout=LLM_REQUEST_TIMEOUT)
+    return {
+        "offtopic": offtopic,
+        "cost": cost,
+        "process": ModelRoute("process", LLM_MODEL_NAME, max_tokens=1024, timeout=LLM_REQUEST_TIMEOUT),
+        "consequences": ModelRoute("consequences", LLM_MODEL_NAME, max_tokens=1024, timeout=LLM_REQUEST_TIMEOUT),
+        "general": ModelRoute("general", LLM_MODEL_NAME, max_tokens=1024, timeout=LLM_REQUEST_TIMEOUT),
+    }
+
+def _apply(routes: Dict[str, ModelRoute], overrides: Optional[Dict[str, Any]], source: str) -> Dict[str, ModelRoute]:
+    """
+    Накладывает переопределения вида {"cost": {"model": "...", "max_tokens": 300}}.
+    Ключом может быть имя маршрута или категория; неизвестные поля пропускаются.
+    """
+    if not overrides:
+        return routes
+    if not isinstance(overrides, dict):
+        logger.error(f"Model routes in {source} must be a JSON object, got {type(overrides).__name__}; ignoring them.")
+        return routes
+    routes = dict(routes)
+    for key, values in overrides.items():
+        name = CATEGORY_ROUTES.get(key, key)
+        if name not in routes or not isinstance(values, dict):
+            logger.warning(f"Ignoring unknown model route '{key}' in {source}.")
+            continue
+        unknown = set(values) - _ROUTE_FIELDS
+        if unknown:
+            logger.warning(f"Ignoring unknown fields {sorted(unknown)} of model route '{key}' in {source}.")
+        routes[name] = replace(routes[name], **{k: v for k, v in values.items() if k in _ROUTE_FIELDS})
+    return routes
+
+class ModelRouter:
+    """
+    Таблица маршрутов: категория запроса -> модель, max_tokens, таймаут и температура.
+
+    Базовая таблица — встроенные значения с переопределениями из LLM_ROUTES (JSON).
+    Клиент может переопределить ее в clients.model_routes; разобранная таблица клиента
+    запоминается по объекту переопределений, поэтому разбор идет только после смены
+    версии настроек.
+    """
+    def __init__(self, overrides: Optional[Dict[str, Any]] = None):
+        self.routes = _apply(_default_routes(), overrides, "LLM_ROUTES")
+        self._tenant_routes: Dict[int, tuple] = {}  # client_id -> (переопределения, таблица)
+
+    @classmethod
+    def from_config(cls) -> "ModelRouter":
+        try:
+            overrides = json.loads(LLM_ROUTES) if LLM_ROUTES else None
+        except ValueError as e:
+            logger.error(f"LLM_ROUTES is not valid JSON, using the built-in routes: {e}")
+            overrides = None
+        return cls(overrides)
+
+    def _routes_for(self, client_id: int, overrides: Optional[Dict[str, Any]]) -> Dict[str, ModelRoute]:
+        if not overrides:
+            return self.routes
+        cached = self._tenant_routes.get(client_id)
+        if cached is None or cached[0] is not overrides:
+            parsed = overrides
+            if isinstance(overrides, str):
+                try:
+                    parsed = json.loads(overrides)
+                except ValueError:
+                    logger.error(f"model_routes of client {client_id} is not valid JSON, using the default routes.")
+                    parsed = None
+            cached = (overrides, _apply(self.routes, parsed, f"model_routes of client {client_id}"))
+            self._tenant_routes[client_id] = cached
+        return cached[1]
+
+    def route(self, client_id: int, category: Optional[str], overrides: Optional[Dict[str, Any]] = None) -> ModelRoute:
+        """Маршрут для категории; для неизвестной категории — маршрут по умолчанию."""
+        routes = self._routes_for(client_id, overrides)
+        return routes[CATEGORY_ROUTES.get(category, DEFAULT_ROUTE)]
+
+# END OF FILE: src/app/services/model_router.py
@@ -0,0 +1,67 @@
+# START OF FILE: src/app/services/response_cache.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from src.shared.metrics import metrics
+from src.shared.morphology import normalize_question
+
+class ResponseCache:
+    """
+    Кэш готовых ответов LLM на типовые вопросы, отдельный для каждого клиента.
+    Ключ — нормализованный вопрос (леммы без стоп-слов) плюс отпечаток системного
+    промпта, поэтому смена промпта в любом воркере автоматически делает старые
+    записи недоступными. Вытеснение — LRU с ограничением по времени жизни.
+    """
+    def __init__(self, max_entries_per_client: int = 500, ttl_seconds: int = 86400):
+        self.max_entries_per_client = max_entries_per_client
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[int, "OrderedDict[Tuple[str, str], Tuple[str, float]]"] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def prompt_fingerprint(system_prompt: str) -> str:
+        return hashlib.sha1(system_prompt.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def make_key(question: str) -> Optional[str]:
+        """Ключ кэша для вопроса или None, если после нормализации ничего не осталось."""
+        return normalize_question(question) or None
+
+    def get(self, client_id: int, prompt_fingerprint: str, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entries = self._entries.get(client_id)
+            entry = entries.get((prompt_fingerprint, key)) if entries else None
+            if entry is not None and now - entry[1] > self.ttl_seconds:
+                del entries[(prompt_fingerprint, key)]
+                entry = None
+            if entry is not None:
+                entries.move_to_end((prompt_fingerprint, key))
+        self._record(client_id, hit=entry is not None)
+        return entry[0] if entry else None
+
+    def put(self, client_id: int, prompt_fingerprint: str, key: str, response: str):
+        with self._lock:
+            entries = self._entries.setdefault(client_id, OrderedDict())
+            entries[(prompt_fingerprint, key)] = (response, time.time())
+            entries.move_to_end((prompt_fingerprint, key))
+            while len(entries) > self.max_entries_per_client:
+                entries.popitem(last=False)
+            metrics.set_gauge("response_cache.entries", len(entries), client_id=client_id)
+
+    def invalidate_client(self, client_id: int):
+        with self._lock:
+            self._entries.pop(client_id, None)
+        metrics.set_gauge("response_cache.entries", 0, client_id=client_id)
+
+    def _record(self, client_id: int, hit: bool):
+        metrics.incr("response_cache.hits" if hit else "response_cache.misses", client_id=client_id)
+        hits = metrics.get_counter("response_cache.hits", client_id)
+        total = hits + metrics.get_counter("response_cache.misses", client_id)
+        metrics.set_gauge("response_cache.hit_rate", round(hits / total, 3), client_id=client_id)
+
+# END OF FILE: src/app/services/response_cache.py
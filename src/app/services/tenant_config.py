@@ -0,0 +1,145 @@
+# START OF FILE: src/app/services/tenant_config.py
+
+import asyncio
+import threading
+import time
+from dataclasses import fields, replace
+from typing import Any, Dict, Optional, Tuple
+
+from src.domain.models import TenantConfig
+from src.infra.clients.supabase_repo import SupabaseRepo
+from src.infra.storage.sqlite_db import SQLiteDB
+from src.shared.logger import logger
+from src.shared.metrics import metrics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tenant_config_versions (
+    client_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+# Через сколько секунд повторить загрузку, если БД была недоступна
+_RETRY_AFTER = 30
+
+# Поля TenantConfig, которые копируются в bot_data приложения клиента
+BOT_DATA_FIELDS = (
+    'manager_contact', 'checklist_data', 'quiz_data', 'google_sheet_id',
+    'lead_magnet_enabled', 'lead_magnet_file_id'
+)
+
+class TenantConfigCache:
+    """
+    Кэш настроек клиентов (промпт, чек-лист, лид-магнит, таблица) в памяти воркера.
+
+    Запись считается актуальной, пока не истек ttl_seconds и пока номер версии клиента
+    в общей для воркеров SQLite совпадает с тем, с которым она загружена. Изменения
+    через update_system_prompt/update_checklist увеличивают версию, поэтому остальные
+    воркеры перечитывают настройки на следующем же апдейте, а не через ttl.
+    Проверка версии — одно чтение по первичному ключу из локального файла, без сети.
+    """
+    def __init__(self, repo: SupabaseRepo, db_path: str, ttl_seconds: int = 300):
+        self.repo = repo
+        self.db = SQLiteDB(db_path, _SCHEMA)
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[int, Tuple[TenantConfig, float]] = {}
+        self._locks: Dict[int, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def current_version(self, client_id: int) -> int:
+        row = self.db.execute("SELECT version FROM tenant_config_versions WHERE client_id = ?", (client_id,)).fetchone()
+        return row[0] if row else 0
+
+    def _make_config(self, row: Dict[str, Any], version: int) -> TenantConfig:
+        names = {f.name for f in fields(TenantConfig)} - {'client_id', 'version'}
+        return TenantConfig(client_id=row['id'], version=version, **{k: v for k, v in row.items() if k in names})
+
+    def prime(self, row: Dict[str, Any]):
+        """Кладет в кэш настройки, уже загруженные вместе со списком клиентов при старте."""
+        self._entries[row['id']] = (self._make_config(row, self.current_version(row['id'])), time.time())
+
+    def get_cached(self, client_id: int) -> Optional[TenantConfig]:
+        """Настройки из памяти, если они не устарели; иначе None."""
+        entry = self._entries.get(client_id)
+        if entry is None:
+            return None
+        config, loaded_at = entry
+        if time.time() - loaded_at >= self.ttl_seconds or self.current_version(client_id) != config.version:
+            return None
+        return config
+
+    def _lock_for(self, client_id: int) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(client_id, threading.Lock())
+
+    def load(self, client_id: int) -> TenantConfig:
+        """
+        Загружает настройки из БД. Одновременные промахи по одному клиенту ждут одну загрузку.
+        Если БД недоступна, продолжаем отдавать последнюю известную версию.
+        """
+        with self._lock_for(client_id):
+            config = self.get_cached(client_id)
+            if config is not None:
+                return config
+            metrics.incr("tenant_config.loads", client_id=client_id)
+            version = self.current_version(client_id)
+            try:
+                row = self.repo.get_client_config(client_id)
+            except Exception:
+                stale = self._entries.get(client_id)
+                if stale is None:
+                    raise
+                logger.warning(f"Serving stale config (version {stale[0].version}) for client {client_id}.")
+                # Старые данные под текущей версией: следующая попытка загрузки — через _RETRY_AFTER
+                config = replace(stale[0], version=version)
+                self._entries[client_id] = (config, time.time() - self.ttl_seconds + _RETRY_AFTER)
+                return config
+            config = self._make_config(row, version) if row else TenantConfig(client_id=client_id, version=version)
+            self._entries[client_id] = (config, time.time())
+            return config
+
+    async def get(self, client_id: int) -> TenantConfig:
+        config = self.get_cached(client_id)
+        if config is not None:
+            metrics.incr("tenant_config.hits", client_id=client_id)
+            return config
+        return await asyncio.to_thread(self.load, client_id)
+
+    def bump(self, client_id: int) -> int:
+        """Увеличивает версию настроек клиента: все воркеры перечитают их из БД."""
+        with self.db.transaction() as conn:
+            version = conn.execute(
+                "INSERT INTO tenant_config_versions (client_id, version, updated_at) VALUES (?, 1, ?) "
+                "ON CONFLICT (client_id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at "
+                "RETURNING version",
+                (client_id, time.time())
+            ).fetchone()[0]
+        self._entries.pop(client_id, None)
+        logger.info(f"Config of client {client_id} bumped to version {version}.")
+        return version
+
+    # --- Запись через кэш ---
+
+    def update_system_prompt(self, client_id: int, new_prompt: str) -> bool:
+        success = self.repo.update_client_system_prompt(client_id, new_prompt)
+        if success:
+            self.bump(client_id)
+        return success
+
+    def update_checklist(self, client_id: int, checklist_data: Optional[Any]) -> bool:
+        success = self.repo.update_client_checklist(client_id, checklist_data)
+        if success:
+            self.bump(client_id)
+        return success
+
+    async def sync_bot_data(self, bot_data: Dict[str, Any], client_id: int) -> TenantConfig:
+        """Обновляет поля настроек в bot_data, если у клиента появилась новая версия."""
+        config = await self.get(client_id)
+        if bot_data.get('tenant_config') is not config:
+            for name in BOT_DATA_FIELDS:
+                bot_data[name] = getattr(config, name)
+            bot_data['tenant_config'] = config
+        return config
+
+# END OF FILE: src/app/services/tenant_config.py
@@ -1,7 +1,7 @@
 # START OF FILE: src/domain/models.py
 
 from dataclasses import dataclass, asdict
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 @dataclass
 class User:
@@ -27,4 +27,45 @@ class Message:
     def to_dict(self):
         return asdict(self)
 
+@dataclass
+class TurnContext:
+    """Снимок данных для одного хода диалога, загруженный одним параллельным батчем."""
+    user_id: int
+    client_id: int
+    system_prompt: Optional[str]
+    history: List[Message]  # предыдущие сообщения, без текущего вопроса
+    quiz_completed: bool = False
+    quiz_results: Optional[Dict[str, Any]] = None
+    summary: Optional[str] = None  # сводка более ранней части диалога
+    model_routes: Optional[Dict[str, Any]] = None  # переопределения маршрутов моделей клиента
+
+    @property
+    def quiz_context(self) -> Optional[str]:
+        if self.quiz_completed and isinstance(self.quiz_results, dict):
+            return "\n".join([f"- {q}: {a}" for q, a in self.quiz_results.items()])
+        return None
+
+@dataclass
+class TenantConfig:
+    """Настройки клиента (бота) из таблицы clients."""
+    client_id: int
+    system_prompt: Optional[str] = None
+    manager_contact: Optional[str] = None
+    checklist_data: Optional[List[Dict[str, Any]]] = None
+    quiz_data: Optional[Any] = None
+    google_sheet_id: Optional[str] = None
+    lead_magnet_enabled: Optional[bool] = None
+    lead_magnet_file_id: Optional[str] = None
+    model_routes: Optional[Dict[str, Any]] = None  # переопределения маршрутов моделей (ModelRouter)
+    version: int = 0
+
+@dataclass(frozen=True)
+class ModelRoute:
+    """Параметры запроса к модели для категории вопросов."""
+    name: str
+    model: str
+    max_tokens: int = 1024
+    timeout: float = 60
+    temperature: float = 0.7
+
 # END OF FILE: src/domain/models.py
\ No newline at end of file
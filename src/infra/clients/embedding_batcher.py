@@ -0,0 +1,126 @@
+# START OF FILE: src/infra/clients/embedding_batcher.py
+
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from src.infra.clients.embedding_client import EmbeddingClient
+from src.shared.logger import logger
+from src.shared.metrics import metrics
+
+# Окно (в секундах) для расчета пропускной способности
+_THROUGHPUT_WINDOW = 60
+
+class EmbeddingBatcher:
+    """
+    Микробатчинг эмбеддингов вопросов. Обработчики кладут текст в очередь и ждут
+    свой future; отдельный поток забирает первый запрос, в течение max_wait_ms
+    добирает остальные (не больше max_batch_size) и кодирует их одним вызовом модели.
+    Event loop при этом не блокируется: ожидание идет через asyncio.wrap_future.
+
+    Интерфейс embed_query совпадает с EmbeddingClient, поэтому батчер подставляется
+    в AIService вместо клиента без изменений.
+    """
+    def __init__(self, embedding_client: EmbeddingClient, max_batch_size: int = 32, max_wait_ms: float = 5):
+        self.embedding_client = embedding_client
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[Optional[Tuple[str, Future, float]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._encoded: deque = deque()  # (время, число текстов) для расчета пропускной способности
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._thread.start()
+            logger.info(f"Embedding batcher started (max batch {self.max_batch_size}, wait {self.max_wait * 1000:.0f}ms).")
+
+    def stop(self, timeout: float = 10):
+        """Дорабатывает уже поставленные в очередь запросы и останавливает поток."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info("Embedding batcher stopped.")
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        self._queue.put((text, future, time.monotonic()))
+        return future
+
+    async def embed_query(self, text: str) -> Optional[np.ndarray]:
+        """Эмбеддинг одного вопроса в составе ближайшего батча. None при ошибке."""
+        if self._thread is None:
+            return await self.embedding_client.embed_query(text)
+        try:
+            return await asyncio.wrap_future(self.submit(text))
+        except Exception as e:
+            logger.error(f"Failed to embed query: {e}", exc_info=True)
+            return None
+
+    # --- Поток батчера ---
+
+    def _collect(self, first: Tuple[str, Future, float]) -> Tuple[List[Tuple[str, Future, float]], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            # Запросы, которые отменили, пока они стояли в очереди, не кодируем
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if batch:
+                self._encode(batch)
+        # Остаток очереди после сигнала остановки обрабатываем напрямую
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and item[1].set_running_or_notify_cancel():
+                self._encode([item])
+
+    def _encode(self, batch: List[Tuple[str, Future, float]]):
+        started = time.monotonic()
+        metrics.observe("embedding.batch_size", len(batch))
+        metrics.observe("embedding.batch_wait_ms", (started - batch[0][2]) * 1000)
+        try:
+            vectors = self.embedding_client.encode([text for text, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        for (_, future, _), vector in zip(batch, vectors):
+            future.set_result(vector)
+        finished = time.monotonic()
+        metrics.observe("embedding.encode_ms", (finished - started) * 1000)
+        metrics.incr("embedding.queries", len(batch))
+
+        self._encoded.append((finished, len(batch)))
+        while self._encoded and finished - self._encoded[0][0] > _THROUGHPUT_WINDOW:
+            self._encoded.popleft()
+        span = max(finished - self._encoded[0][0], 1.0)
+        metrics.set_gauge("embedding.throughput_qps", round(sum(n for _, n in self._encoded) / span, 2))
+
+# END OF FILE: src/infra/clients/embedding_batcher.py
@@ -0,0 +1,65 @@
+# START OF FILE: src/infra/clients/embedding_client.py
+
+import asyncio
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from src.infra.knowledge.embedding_cache import EmbeddingCache
+from src.shared.logger import logger
+from src.shared.config import EMBEDDING_MODEL_NAME
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # пакет тяжелый (torch), на части окружений его нет
+    SentenceTransformer = None
+
+class EmbeddingClient:
+    """
+    Локальная модель эмбеддингов (та же, что в scripts/vectorize_knowledge_base.py).
+    Модель загружается лениво при первом запросе; векторы возвращаются нормированными,
+    так что косинусная близость сводится к скалярному произведению.
+    Если передан cache, модель вызывается только для текстов, которых в нем нет.
+    """
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, cache: Optional[EmbeddingCache] = None):
+        self.model_name = model_name
+        self.cache = cache
+        self._model = None
+        self._lock = threading.Lock()
+        logger.info(f"EmbeddingClient initialized (model: {model_name}, available: {self.is_available()}).")
+
+    @staticmethod
+    def is_available() -> bool:
+        return SentenceTransformer is not None
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    logger.info(f"Loading SentenceTransformer model {self.model_name}...")
+                    self._model = SentenceTransformer(self.model_name, device='cpu')
+        return self._model
+
+    def _encode_raw(self, texts: List[str]) -> np.ndarray:
+        return self._get_model().encode(texts, convert_to_numpy=True, show_progress_bar=False)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Кодирует тексты в матрицу float32 (по строке на текст) с L2-нормировкой."""
+        if self.cache is not None:
+            vectors = self.cache.encode(texts, self._encode_raw)
+        else:
+            vectors = np.asarray(self._encode_raw(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    async def embed_query(self, text: str) -> Optional[np.ndarray]:
+        """Эмбеддинг одного вопроса без блокировки event loop. None при ошибке."""
+        try:
+            return (await asyncio.to_thread(self.encode, [text]))[0]
+        except Exception as e:
+            logger.error(f"Failed to embed query: {e}", exc_info=True)
+            return None
+
+# END OF FILE: src/infra/clients/embedding_client.py
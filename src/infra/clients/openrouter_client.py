@@ -1,36 +1,185 @@
 # START OF FILE: src/infra/clients/openrouter_client.py
 
-from openai import OpenAI
-from typing import List, Dict
+import asyncio
+from typing import Any, AsyncIterator, List, Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI
 
 from src.shared.logger import logger
-from src.shared.config import OPENROUTER_API_URL, OPENROUTER_API_KEY, PUBLIC_APP_URL, LLM_MODEL_NAME
+from src.shared.config import (
+    OPENROUTER_API_URL, OPENROUTER_API_KEY, PUBLIC_APP_URL, LLM_MODEL_NAME,
+    LLM_REQUEST_TIMEOUT, LLM_CONNECT_TIMEOUT, LLM_MAX_CONCURRENCY,
+    LLM_MAX_CONNECTIONS, LLM_MAX_RETRIES
+)
 from src.domain.models import Message
 
+# Текст, который получает пользователь при сбое запроса к модели
+LLM_ERROR_MESSAGE = "К сожалению, произошла техническая ошибка при обработке вашего вопроса. Пожалуйста, попробуйте позже."
+# finish_reason, при которых ответ оборван: length — уперся в max_tokens, error — сбой запроса или потока
+INCOMPLETE_FINISH_REASONS = ('length', 'error')
+
+_THINK_OPEN = "<think>"
+_THINK_CLOSE = "</think>"
+
+class ThinkTagFilter:
+    """
+    Вырезает из потока токенов блоки рассуждений <think>...</think>, даже если
+    теги разрезаны между чанками.
+    """
+    def __init__(self):
+        self._buffer = ""
+        self._inside = False
+
+    def feed(self, chunk: str) -> str:
+        self._buffer += chunk
+        output = []
+        while self._buffer:
+            tag = _THINK_CLOSE if self._inside else _THINK_OPEN
+            idx = self._buffer.find(tag)
+            if idx != -1:
+                if not self._inside:
+                    output.append(self._buffer[:idx])
+                self._buffer = self._buffer[idx + len(tag):]
+                self._inside = not self._inside
+                continue
+            # Хвост может оказаться началом тега — придерживаем его до следующего чанка
+            keep = _partial_tag_suffix(self._buffer, tag)
+            if not self._inside:
+                output.append(self._buffer[:len(self._buffer) - keep])
+            self._buffer = self._buffer[len(self._buffer) - keep:]
+            break
+        return "".join(output)
+
+    def flush(self) -> str:
+        rest, self._buffer = ("" if self._inside else self._buffer), ""
+        return rest
+
+def _partial_tag_suffix(text: str, tag: str) -> int:
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:size]):
+            return size
+    return 0
+
 class OpenRouterClient:
     def __init__(self, app_title="Vyacheslav Kurilin AI Assistant"):
-        self.client = OpenAI(base_url=OPENROUTER_API_URL, api_key=OPENROUTER_API_KEY)
+        # Один пул соединений на воркер: keep-alive к OpenRouter переиспользуется всеми ботами.
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONCURRENCY),
+            timeout=httpx.Timeout(LLM_REQUEST_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        )
+        self.client = AsyncOpenAI(
+            base_url=OPENROUTER_API_URL,
+            api_key=OPENROUTER_API_KEY,
+            http_client=self.http_client,
+            max_retries=LLM_MAX_RETRIES,
+        )
         self.headers = {
             "HTTP-Referer": PUBLIC_APP_URL,
             "X-Title": app_title,
         }
-        logger.info("OpenRouter client initialized.")
+        self._semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        logger.info(f"OpenRouter async client initialized (max concurrency: {LLM_MAX_CONCURRENCY}, timeout: {LLM_REQUEST_TIMEOUT}s).")
 
-    def get_chat_completion(self, messages: List[Dict]) -> str:
+    @staticmethod
+    def _record_usage(usage: Any, stats: Optional[Dict[str, Any]]):
+        if stats is not None and usage is not None:
+            stats['prompt_tokens'] = usage.prompt_tokens
+            stats['completion_tokens'] = usage.completion_tokens
+
+    @staticmethod
+    def _record_finish(reason: Optional[str], stats: Optional[Dict[str, Any]]):
+        if stats is not None and reason:
+            stats['finish_reason'] = reason
+
+    async def get_chat_completion(
+        self,
+        messages: List[Dict],
+        timeout: Optional[float] = None,
+        model: Optional[str] = None,
+        max_tokens: int = 1024,
+        temperature: float = 0.7,
+        stats: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        Ответ модели целиком. Если передан stats, в него записываются расход токенов от провайдера
+        и finish_reason ('error', если запрос не удался и вернулся LLM_ERROR_MESSAGE).
+        """
+        model = model or LLM_MODEL_NAME
         try:
-            logger.info(f"Requesting chat completion with model {LLM_MODEL_NAME}...")
-            completion = self.client.chat.completions.create(
-                extra_headers=self.headers,
-                model=LLM_MODEL_NAME,
-                messages=messages,
-                max_tokens=1024,
-                temperature=0.7
-            )
+            async with self._semaphore:
+                logger.info(f"Requesting chat completion with model {model}...")
+                completion = await self.client.chat.completions.create(
+                    extra_headers=self.headers,
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    timeout=timeout or LLM_REQUEST_TIMEOUT
+                )
+            self._record_usage(completion.usage, stats)
+            self._record_finish(completion.choices[0].finish_reason, stats)
             response_text = completion.choices[0].message.content
             logger.info("Chat completion received successfully.")
             return response_text
         except Exception as e:
             logger.error(f"Error getting chat completion from OpenRouter: {e}")
-            return "К сожалению, произошла техническая ошибка при обработке вашего вопроса. Пожалуйста, попробуйте позже."
+            self._record_finish('error', stats)
+            return LLM_ERROR_MESSAGE
+
+    async def stream_chat_completion(
+        self,
+        messages: List[Dict],
+        timeout: Optional[float] = None,
+        model: Optional[str] = None,
+        max_tokens: int = 1024,
+        temperature: float = 0.7,
+        stats: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Отдает ответ модели по частям. Рассуждения (поле reasoning и блоки <think>)
+        в поток не попадают. Расход токенов приходит последним чанком и пишется в stats.
+        finish_reason тоже пишется в stats: если поток оборвался после первых токенов,
+        там будет 'error', а уже отданный текст — лишь начало ответа.
+        """
+        model = model or LLM_MODEL_NAME
+        think_filter = ThinkTagFilter()
+        received_any = False
+        try:
+            async with self._semaphore:
+                logger.info(f"Requesting streaming chat completion with model {model}...")
+                stream = await self.client.chat.completions.create(
+                    extra_headers=self.headers,
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    timeout=timeout or LLM_REQUEST_TIMEOUT,
+                    stream=True,
+                    **({"stream_options": {"include_usage": True}} if stats is not None else {})
+                )
+                async for chunk in stream:
+                    self._record_usage(getattr(chunk, 'usage', None), stats)
+                    if not chunk.choices:
+                        continue
+                    self._record_finish(chunk.choices[0].finish_reason, stats)
+                    piece = think_filter.feed(chunk.choices[0].delta.content or "")
+                    if piece:
+                        received_any = True
+                        yield piece
+                tail = think_filter.flush()
+                if tail:
+                    received_any = True
+                    yield tail
+            logger.info("Streaming chat completion finished.")
+        except Exception as e:
+            logger.error(f"Error streaming chat completion from OpenRouter: {e}")
+            self._record_finish('error', stats)
+            if not received_any:
+                yield LLM_ERROR_MESSAGE
+
+    async def close(self):
+        """Закрывает пул соединений при остановке воркера."""
+        await self.client.close()
 
-# END OF FILE: src/infra/clients/openrouter_client.py
\ No newline at end of file
+# END OF FILE: src/infra/clients/openrouter_client.py
@@ -1,12 +1,39 @@
 # path: src/infra/clients/supabase_repo.py
 from supabase import create_client, Client
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Iterator, Tuple, Optional
 import json
 
 from src.shared.logger import logger
 from src.shared.config import SUPABASE_URL, SUPABASE_KEY
 from src.domain.models import User, Lead, Message
 
+# Колонки, которых нет в исходной схеме Supabase (применить миграцией до выкладки):
+#
+#   -- хэш текста чанка: инкрементальная векторизация и инкрементальный кэш VectorStore
+#   ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS content_hash text;
+#   CREATE INDEX IF NOT EXISTS knowledge_base_client_hash_idx ON knowledge_base (client_id, content_hash);
+#
+# Записи, загруженные до появления колонки, остаются с content_hash = NULL: кэш векторов
+# их перечитывает при каждом обновлении, а следующий запуск vectorize_knowledge_base.py заменяет.
+#
+#   -- сводка диалога (ConversationSummarizer): текст и created_at последнего свернутого сообщения
+#   ALTER TABLE users ADD COLUMN IF NOT EXISTS conversation_summary text;
+#   ALTER TABLE users ADD COLUMN IF NOT EXISTS conversation_summary_through timestamptz;
+#   CREATE INDEX IF NOT EXISTS messages_user_client_created_idx ON messages (user_id, client_id, created_at);
+#
+# Без колонок сводки get_user_turn_state читает статус квиза отдельным запросом, а сводки
+# просто не сохраняются (ошибки в логе).
+#
+#   -- переопределения маршрутов моделей клиента (ModelRouter), например {"cost": {"max_tokens": 300}}
+#   ALTER TABLE clients ADD COLUMN IF NOT EXISTS model_routes jsonb;
+#
+# Без колонки model_routes запрос CLIENT_OPTIONAL_FIELDS не удается, и клиенты работают на общей таблице маршрутов.
+
+# Поля clients, из которых собирается TenantConfig
+CLIENT_CONFIG_FIELDS = 'id, system_prompt, manager_contact, checklist_data, quiz_data, google_sheet_id, lead_magnet_enabled, lead_magnet_file_id'
+# Необязательные поля (миграция — в начале файла): читаются отдельным запросом, чтобы без колонки в БД боты все равно запускались
+CLIENT_OPTIONAL_FIELDS = 'id, model_routes'
+
 class SupabaseRepo:
     def __init__(self):
         self.client: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
@@ -15,22 +42,31 @@ class SupabaseRepo:
     def get_active_clients(self) -> List[Dict[str, Any]]:
         try:
             # ИЗМЕНЕНИЕ: Добавляем новые поля в запрос
-            select_query = 'id, client_name, bot_token, manager_contact, checklist_data, quiz_data, google_sheet_id, lead_magnet_enabled, lead_magnet_file_id'
+            select_query = f'client_name, bot_token, {CLIENT_CONFIG_FIELDS}'
             response = self.client.table('clients').select(select_query).eq('status', 'active').execute()
             logger.info(f"Loaded {len(response.data)} active client(s).")
-            return response.data
         except Exception as e:
             logger.error(f"FATAL: Could not load clients from Supabase. Error: {e}", exc_info=True)
             return []
+        try:
+            optional = self.client.table('clients').select(CLIENT_OPTIONAL_FIELDS).eq('status', 'active').execute()
+            extra = {row['id']: row for row in optional.data}
+            for row in response.data:
+                row.update(extra.get(row['id'], {}))
+        except Exception as e:
+            logger.warning(f"Could not load optional client settings ({CLIENT_OPTIONAL_FIELDS}), using defaults: {e}")
+        return response.data
 
     # --- Методы для RAG ---
-    def insert_into_knowledge_base(self, records: List[Dict[str, Any]]):
+    def insert_into_knowledge_base(self, records: List[Dict[str, Any]]) -> bool:
         """Массово вставляет записи в таблицу knowledge_base."""
         try:
             self.client.table('knowledge_base').insert(records).execute()
             logger.info(f"Successfully inserted {len(records)} records into knowledge_base.")
+            return True
         except Exception as e:
             logger.error(f"Error inserting records into knowledge_base: {e}", exc_info=True)
+            return False
 
     def clear_knowledge_base_for_client(self, client_id: int):
         """Удаляет все записи из knowledge_base для конкретного клиента."""
@@ -39,6 +75,64 @@ class SupabaseRepo:
             logger.info(f"Knowledge base cleared for client {client_id}.")
         except Exception as e:
             logger.error(f"Error clearing knowledge base for client {client_id}: {e}", exc_info=True)
+
+    def get_knowledge_base_hashes(self, client_id: int, source: Optional[str] = None, page_size: int = 1000) -> Dict[Optional[str], List[int]]:
+        """
+        Возвращает content_hash -> id записей knowledge_base клиента (опционально только
+        для одного source). Записи без хэша (загруженные до его появления) идут под ключом None.
+        Ошибку пробрасывает дальше, чтобы сбой не приняли за пустую базу.
+        """
+        hashes: Dict[Optional[str], List[int]] = {}
+        try:
+            start = 0
+            while True:
+                query = self.client.table('knowledge_base').select('id, content_hash').eq('client_id', client_id)
+                if source is not None:
+                    query = query.eq('source', source)
+                response = query.order('id').range(start, start + page_size - 1).execute()
+                for row in response.data:
+                    hashes.setdefault(row.get('content_hash'), []).append(row['id'])
+                if len(response.data) < page_size:
+                    break
+                start += page_size
+        except Exception as e:
+            logger.error(f"Error loading knowledge base hashes for client {client_id}: {e}", exc_info=True)
+            raise
+        return hashes
+
+    def delete_knowledge_base_records(self, record_ids: List[int], batch_size: int = 500) -> bool:
+        """Удаляет записи knowledge_base по id (пачками)."""
+        try:
+            for start in range(0, len(record_ids), batch_size):
+                self.client.table('knowledge_base').delete().in_('id', record_ids[start:start + batch_size]).execute()
+            logger.info(f"Deleted {len(record_ids)} records from knowledge_base.")
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting records from knowledge_base: {e}", exc_info=True)
+            return False
+
+    def iter_knowledge_base_records(self, client_id: int, record_ids: List[int], page_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Выдает записи knowledge_base клиента с указанными id вместе с эмбеддингами,
+        по странице за раз, чтобы вызывающий не держал всю базу в памяти.
+        Ошибку пробрасывает дальше, чтобы вызывающий не принял сбой за пустую базу.
+        """
+        loaded = 0
+        try:
+            for start in range(0, len(record_ids), page_size):
+                response = (
+                    self.client.table('knowledge_base')
+                    .select('id, content, source, content_hash, embedding')
+                    .eq('client_id', client_id)
+                    .in_('id', record_ids[start:start + page_size])
+                    .execute()
+                )
+                loaded += len(response.data)
+                yield response.data
+        except Exception as e:
+            logger.error(f"Error loading knowledge base records for client {client_id}: {e}", exc_info=True)
+            raise
+        logger.info(f"Loaded {loaded} knowledge base records for client {client_id}.")
     # --------------------------------
 
     def get_leads_for_export(self, client_id: int, start_date: str, end_date: str) -> List[Dict[str, Any]]:
@@ -75,6 +169,27 @@ class SupabaseRepo:
             logger.error(f"Error fetching lead user IDs for client {client_id}: {e}", exc_info=True)
             return []
 
+    def get_client_config(self, client_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает настройки клиента (см. CLIENT_CONFIG_FIELDS и CLIENT_OPTIONAL_FIELDS) или None, если клиента нет.
+        Ошибку пробрасывает дальше, чтобы кэш мог продолжить отдавать прежние настройки.
+        """
+        try:
+            response = self.client.table('clients').select(CLIENT_CONFIG_FIELDS).eq('id', client_id).limit(1).execute()
+        except Exception as e:
+            logger.error(f"Error fetching config for client {client_id}: {e}", exc_info=True)
+            raise
+        if not response.data:
+            return None
+        row = response.data[0]
+        try:
+            optional = self.client.table('clients').select(CLIENT_OPTIONAL_FIELDS).eq('id', client_id).limit(1).execute()
+            if optional.data:
+                row.update(optional.data[0])
+        except Exception as e:
+            logger.warning(f"Could not load optional settings of client {client_id}, using defaults: {e}")
+        return row
+
     def get_client_system_prompt(self, client_id: int) -> str | None:
         try:
             response = self.client.table('clients').select('system_prompt').eq('id', client_id).single().execute()
@@ -136,6 +251,51 @@ class SupabaseRepo:
             pass
         return False, None
 
+    def get_user_turn_state(self, user_id: int, client_id: int) -> Tuple[bool, Dict | None, str | None]:
+        """
+        Статус квиза и сводка диалога пользователя одним запросом: (пройден, результаты, сводка).
+        Колонка users.conversation_summary — см. миграцию в начале файла.
+        Если запрос со сводкой не удался (например, нет колонки), статус квиза читается
+        отдельно — без сводки, но не теряя его.
+        """
+        try:
+            response = self.client.table('users').select('quiz_completed_at, quiz_results, conversation_summary').eq('user_id', user_id).eq('client_id', client_id).single().execute()
+        except Exception as e:
+            if "JSON object requested" in str(e):
+                return False, None, None  # пользователя еще нет
+            logger.warning(f"Could not load the turn state of user {user_id} (client {client_id}), continuing without the summary: {e}")
+            return (*self.get_user_quiz_status(user_id, client_id), None)
+        data = response.data or {}
+        quiz_results = None
+        if data.get('quiz_completed_at') and data.get('quiz_results'):
+            try:
+                quiz_results = json.loads(data['quiz_results'])
+            except (TypeError, ValueError) as e:
+                logger.error(f"Invalid quiz results of user {user_id} (client {client_id}): {e}")
+        return bool(data.get('quiz_completed_at')), quiz_results, data.get('conversation_summary')
+
+    def get_conversation_summary(self, user_id: int, client_id: int) -> Tuple[str | None, str | None]:
+        """Сводка диалога и created_at последнего свернутого в нее сообщения (колонки — см. начало файла)."""
+        try:
+            response = self.client.table('users').select('conversation_summary, conversation_summary_through').eq('user_id', user_id).eq('client_id', client_id).single().execute()
+            data = response.data or {}
+            return data.get('conversation_summary'), data.get('conversation_summary_through')
+        except Exception as e:
+            if "JSON object requested" not in str(e):
+                logger.error(f"Error getting conversation summary for user {user_id} (client {client_id}): {e}")
+            return None, None
+
+    def update_conversation_summary(self, user_id: int, client_id: int, summary: str, through: str) -> bool:
+        try:
+            self.client.table('users').update({
+                'conversation_summary': summary,
+                'conversation_summary_through': through
+            }).eq('user_id', user_id).eq('client_id', client_id).execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error updating conversation summary for user {user_id} (client {client_id}): {e}", exc_info=True)
+            return False
+
     def update_user_category(self, user_id: int, category: str, client_id: int):
         try:
             self.client.table('users').update({'initial_request_category': category}).eq('user_id', user_id).eq('client_id', client_id).execute()
@@ -173,6 +333,15 @@ class SupabaseRepo:
             logger.info(f"Message from '{message.role}' for user {user_id} (client {client_id}) saved.")
         except Exception as e: logger.error(f"Error saving message for user {user_id} (client {client_id}): {e}", exc_info=True)
 
+    def save_messages_batch(self, rows: List[Dict[str, Any]]) -> bool:
+        """Вставляет пачку сообщений (user_id, role, content, client_id, created_at) одним запросом."""
+        try:
+            self.client.table('messages').insert(rows).execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error saving a batch of {len(rows)} messages: {e}", exc_info=True)
+            return False
+
     def get_recent_messages(self, user_id: int, client_id: int, limit: int = 4) -> List[Message]:
         try:
             response = self.client.table('messages').select('role, content').eq('user_id', user_id).eq('client_id', client_id).order('created_at', desc=True).limit(limit).execute()
@@ -182,6 +351,34 @@ class SupabaseRepo:
             logger.error(f"Error fetching messages for user {user_id} (client {client_id}): {e}", exc_info=True)
             return []
             
+    def get_messages_after(self, user_id: int, client_id: int, after: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        """Первые limit сообщений (role, content, created_at) после метки after, по возрастанию времени."""
+        try:
+            query = self.client.table('messages').select('role, content, created_at').eq('user_id', user_id).eq('client_id', client_id)
+            if after:
+                query = query.gt('created_at', after)
+            return query.order('created_at').limit(limit).execute().data
+        except Exception as e:
+            logger.error(f"Error fetching messages after {after} for user {user_id} (client {client_id}): {e}", exc_info=True)
+            return []
+
+    def get_user_message_texts(self, limit: int, client_id: Optional[int] = None, page_size: int = 1000) -> List[str]:
+        """Тексты последних limit сообщений пользователей (для обучения классификатора запросов)."""
+        texts = []
+        try:
+            while len(texts) < limit:
+                query = self.client.table('messages').select('content').eq('role', 'user')
+                if client_id is not None:
+                    query = query.eq('client_id', client_id)
+                size = min(page_size, limit - len(texts))
+                rows = query.order('created_at', desc=True).range(len(texts), len(texts) + size - 1).execute().data
+                texts.extend(row['content'] for row in rows)
+                if len(rows) < size:
+                    break
+        except Exception as e:
+            logger.error(f"Error fetching user messages for classifier training: {e}", exc_info=True)
+        return texts
+
     def find_similar_chunks(self, embedding: List[float], client_id: int, match_threshold: float = 0.5, match_count: int = 3) -> List[Dict[str, Any]]:
         try:
             params = {
@@ -0,0 +1,143 @@
+# START OF FILE: src/infra/knowledge/bm25_index.py
+
+import math
+import os
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.shared.morphology import lemmas
+
+_ARRAYS = ("docs", "tfs", "offsets", "idf", "norm")
+
+class BM25Index:
+    """
+    Инвертированный индекс Okapi BM25 по леммам (pymorphy3) для набора текстов.
+    Числа сохраняются как отдельные термы, поэтому запрос "статья 446" находит
+    чанки с точным номером статьи, который эмбеддинги обычно размывают.
+
+    Индекс строится один раз и дальше только читается: постинги всех термов лежат
+    подряд в неизменяемых массивах numpy (docs/tfs, границы терма — offsets), так что
+    его можно делить между потоками без блокировок, а сохраненный через save —
+    открывать в других процессах через mmap, не лемматизируя тексты заново.
+    """
+    def __init__(
+        self,
+        terms: Dict[str, int],
+        docs: np.ndarray,
+        tfs: np.ndarray,
+        offsets: np.ndarray,
+        idf: np.ndarray,
+        length_norm: np.ndarray,
+        k1: float = 1.5
+    ):
+        self.k1 = k1
+        self.size = len(length_norm)
+        self._terms = terms  # терм -> номер; постинги терма i — docs[offsets[i]:offsets[i + 1]]
+        self._docs = docs
+        self._tfs = tfs
+        self._offsets = offsets
+        self._idf = idf
+        # Нормировка длины документа считается заранее: K = k1 * (1 - b + b * dl / avgdl)
+        self._length_norm = length_norm
+
+    @classmethod
+    def build(cls, texts: Sequence[str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        size = len(texts)
+        doc_lengths = np.zeros(size, dtype=np.float32)
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for doc_id, text in enumerate(texts):
+            counts = Counter(lemmas(text))
+            doc_lengths[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                postings[term].append((doc_id, tf))
+
+        avgdl = float(doc_lengths.mean()) if size else 0.0
+        length_norm = (k1 * (1 - b + b * doc_lengths / avgdl)).astype(np.float32) if avgdl else np.full(size, k1, dtype=np.float32)
+        terms = {term: slot for slot, term in enumerate(postings)}
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(entries) for entries in postings.values()])
+        total = int(offsets[-1])
+        docs = np.fromiter((d for entries in postings.values() for d, _ in entries), dtype=np.int32, count=total)
+        tfs = np.fromiter((tf for entries in postings.values() for _, tf in entries), dtype=np.float32, count=total)
+        df = np.diff(offsets).astype(np.float64)
+        idf = np.log(1 + (size - df + 0.5) / (df + 0.5)).astype(np.float32)
+        return cls(terms, docs, tfs, offsets, idf, length_norm, k1)
+
+    def __len__(self) -> int:
+        return self.size
+
+    # --- Хранение ---
+
+    def save(self, prefix: str):
+        """Пишет массивы в <prefix>.bm25_*.npy; словарь термов — последним, он же признак целостности."""
+        for kind, array in zip(_ARRAYS, (self._docs, self._tfs, self._offsets, self._idf, self._length_norm)):
+            with open(f"{prefix}.bm25_{kind}.npy", 'wb') as f:
+                np.save(f, array)
+        vocabulary = np.frombuffer("\n".join(self._terms).encode('utf-8'), dtype=np.uint8)
+        with open(f"{prefix}.bm25_terms.npy.tmp", 'wb') as f:
+            np.save(f, np.array([self.k1], dtype=np.float32))
+            np.save(f, vocabulary)
+        os.replace(f"{prefix}.bm25_terms.npy.tmp", f"{prefix}.bm25_terms.npy")
+
+    @classmethod
+    def load(cls, prefix: str) -> Optional["BM25Index"]:
+        """Открывает сохраненный индекс (постинги — через mmap); None, если его нет или он неполный."""
+        try:
+            with open(f"{prefix}.bm25_terms.npy", 'rb') as f:
+                k1 = float(np.load(f)[0])
+                vocabulary = np.load(f).tobytes().decode('utf-8')
+            docs, tfs, offsets, idf, length_norm = (np.load(f"{prefix}.bm25_{kind}.npy", mmap_mode='r') for kind in _ARRAYS)
+        except (OSError, ValueError, IndexError):
+            return None
+        terms = {term: slot for slot, term in enumerate(vocabulary.split("\n"))} if vocabulary else {}
+        if len(terms) + 1 != len(offsets) or len(docs) != offsets[-1]:
+            return None
+        return cls(terms, docs, tfs, np.asarray(offsets), np.asarray(idf), np.asarray(length_norm), k1)
+
+    # --- Поиск ---
+
+    def _query_terms(self, query: str) -> List[Tuple[Optional[int], float]]:
+        """(номер терма или None, idf) для лемм запроса; у незнакомого корпусу терма idf максимальный."""
+        unseen = math.log(1 + (self.size + 0.5) / 0.5)
+        result = []
+        for term in set(lemmas(query)):
+            slot = self._terms.get(term)
+            result.append((slot, float(self._idf[slot]) if slot is not None else unseen))
+        return result
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25-оценки всех документов для запроса (нули там, где нет совпадений)."""
+        result = np.zeros(self.size, dtype=np.float32)
+        for slot, idf in self._query_terms(query):
+            if slot is None:
+                continue
+            start, end = self._offsets[slot], self._offsets[slot + 1]
+            doc_ids, tfs = self._docs[start:end], self._tfs[start:end]
+            result[doc_ids] += idf * tfs * (self.k1 + 1) / (tfs + self._length_norm[doc_ids])
+        return result
+
+    def max_score(self, query: str) -> float:
+        """
+        Верхняя граница оценки для запроса: каждый терм (включая незнакомые корпусу)
+        дает не больше idf * (k1 + 1). Оценка / max_score — доля веса запроса, найденная в документе.
+        """
+        return sum(idf for _, idf in self._query_terms(query)) * (self.k1 + 1)
+
+    def search(self, query: str, top_k: int = 10, min_relevance: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        Топ-k документов (номер, оценка) с ненулевой оценкой, по убыванию. С min_relevance
+        отбрасываются документы, чья оценка меньше этой доли от max_score (случайные
+        совпадения одного частого слова).
+        """
+        if not self.size:
+            return []
+        scores = self.scores(query)
+        floor = min_relevance * self.max_score(query)
+        k = min(top_k, self.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0 and scores[i] >= floor]
+
+# END OF FILE: src/infra/knowledge/bm25_index.py
@@ -0,0 +1,276 @@
+# START OF FILE: src/infra/knowledge/embedding_cache.py
+
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.infra.storage.sqlite_db import SQLiteDB
+from src.shared.logger import logger
+from src.shared.metrics import metrics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embedding_models (
+    model TEXT PRIMARY KEY,
+    dim INTEGER NOT NULL,
+    generation INTEGER NOT NULL DEFAULT 0,
+    next_row INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS embedding_entries (
+    model TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (model, hash)
+);
+CREATE INDEX IF NOT EXISTS idx_embedding_entries_lru ON embedding_entries (model, last_used);
+"""
+
+# Ограничение SQLite на число параметров в одном запросе
+_SQL_BATCH = 500
+# Компактификация запускается, когда "мертвых" строк в файле больше живых и больше этого порога
+_COMPACT_MIN_DEAD_ROWS = 1024
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class EmbeddingCache:
+    """
+    Дисковый кэш эмбеддингов с ключом (model_name, sha256(текста)).
+
+    Векторы лежат в плоском float32-файле, открываемом через np.memmap; индекс
+    hash -> строка и время последнего использования — в локальной SQLite, общей для
+    воркеров и скриптов. Строки файла в пределах одного поколения никогда не
+    перезаписываются: вытесненные (LRU, max_entries) записи лишь удаляются из индекса,
+    а место возвращается компактификацией, которая пишет живые строки в файл
+    следующего поколения. Поэтому читатели без блокировок не могут получить чужой вектор.
+    """
+    def __init__(self, cache_dir: str, model_name: str, max_entries: int = 200_000):
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.db = SQLiteDB(os.path.join(cache_dir, 'embedding_cache.sqlite3'), _SCHEMA)
+        self._slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+        self._reader: Optional[Tuple[int, np.memmap]] = None
+        self._reader_lock = threading.Lock()
+
+    # --- Файлы ---
+
+    def _vectors_path(self, generation: int) -> str:
+        return os.path.join(self.cache_dir, f"{self._slug}.{generation}.f32")
+
+    def _model_state(self, conn) -> Optional[Tuple[int, int, int]]:
+        row = conn.execute(
+            "SELECT dim, generation, next_row FROM embedding_models WHERE model = ?", (self.model_name,)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def _open_reader(self, generation: int, dim: int, min_rows: int) -> Optional[np.memmap]:
+        with self._reader_lock:
+            if self._reader is not None:
+                cached_generation, mapping = self._reader
+                if cached_generation == generation and mapping.shape[0] >= min_rows:
+                    return mapping
+            path = self._vectors_path(generation)
+            try:
+                rows = os.path.getsize(path) // (dim * 4)
+                if rows < min_rows:
+                    return None
+                mapping = np.memmap(path, dtype=np.float32, mode='r', shape=(rows, dim))
+            except (OSError, ValueError):
+                return None
+            self._reader = (generation, mapping)
+            return mapping
+
+    # --- Чтение ---
+
+    def get_many(self, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Возвращает найденные в кэше векторы (копии) по хэшам текстов."""
+        if not hashes:
+            return {}
+        conn = self.db.connection()
+        # Индекс и поколение читаются из одного снимка БД
+        conn.execute("BEGIN")
+        try:
+            state = self._model_state(conn)
+            rows: Dict[str, int] = {}
+            if state is not None:
+                unique = list(dict.fromkeys(hashes))
+                for start in range(0, len(unique), _SQL_BATCH):
+                    part = unique[start:start + _SQL_BATCH]
+                    placeholders = ",".join("?" * len(part))
+                    rows.update(conn.execute(
+                        f"SELECT hash, row FROM embedding_entries WHERE model = ? AND hash IN ({placeholders})",
+                        (self.model_name, *part)
+                    ).fetchall())
+        finally:
+            conn.execute("COMMIT")
+
+        found: Dict[str, np.ndarray] = {}
+        if rows:
+            dim, generation, _ = state
+            mapping = self._open_reader(generation, dim, max(rows.values()) + 1)
+            if mapping is not None:
+                found = {h: np.array(mapping[row]) for h, row in rows.items()}
+                self._touch(list(found))
+
+        metrics.incr("embedding_cache.hits", len(found))
+        metrics.incr("embedding_cache.misses", len(set(hashes)) - len(found))
+        return found
+
+    def _touch(self, hashes: List[str]):
+        now = time.time()
+        try:
+            for start in range(0, len(hashes), _SQL_BATCH):
+                part = hashes[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(part))
+                self.db.execute(
+                    f"UPDATE embedding_entries SET last_used = ? WHERE model = ? AND hash IN ({placeholders})",
+                    (now, self.model_name, *part)
+                )
+        except Exception as e:
+            logger.warning(f"Failed to update embedding cache LRU: {e}")
+
+    # --- Запись ---
+
+    def put_many(self, vectors: Dict[str, np.ndarray]):
+        """Сохраняет векторы; уже закэшированные хэши пропускаются."""
+        if not vectors:
+            return
+        dim = len(next(iter(vectors.values())))
+        now = time.time()
+        compact_needed = False
+        with self.db.transaction() as conn:
+            state = self._model_state(conn)
+            if state is None:
+                conn.execute("INSERT INTO embedding_models (model, dim) VALUES (?, ?)", (self.model_name, dim))
+                state = (dim, 0, 0)
+            model_dim, generation, next_row = state
+            if model_dim != dim:
+                logger.error(f"Embedding size {dim} does not match cached size {model_dim} for model {self.model_name}. Not caching.")
+                return
+
+            existing = set()
+            keys = list(vectors)
+            for start in range(0, len(keys), _SQL_BATCH):
+                part = keys[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(part))
+                existing.update(h for (h,) in conn.execute(
+                    f"SELECT hash FROM embedding_entries WHERE model = ? AND hash IN ({placeholders})",
+                    (self.model_name, *part)
+                ))
+            new_keys = [h for h in keys if h not in existing]
+            if not new_keys:
+                return
+
+            # Векторы пишутся в файл до коммита индекса: читатель не увидит строку без данных
+            self._append_rows(generation, dim, next_row, np.stack([vectors[h] for h in new_keys]).astype(np.float32))
+            conn.executemany(
+                "INSERT INTO embedding_entries (model, hash, row, last_used) VALUES (?, ?, ?, ?)",
+                [(self.model_name, h, next_row + i, now) for i, h in enumerate(new_keys)]
+            )
+            next_row += len(new_keys)
+            conn.execute("UPDATE embedding_models SET next_row = ? WHERE model = ?", (next_row, self.model_name))
+
+            live = self._evict(conn)
+            dead = next_row - live
+            compact_needed = dead > live and dead > _COMPACT_MIN_DEAD_ROWS
+            metrics.set_gauge("embedding_cache.entries", live)
+        if compact_needed:
+            self.compact()
+
+    def _append_rows(self, generation: int, dim: int, start_row: int, matrix: np.ndarray):
+        path = self._vectors_path(generation)
+        row_bytes = dim * 4
+        needed = (start_row + len(matrix)) * row_bytes
+        with open(path, 'ab'):
+            pass
+        size = os.path.getsize(path)
+        if size < needed:
+            # Файл растет с запасом, чтобы не переоткрывать отображение на каждую вставку
+            with open(path, 'r+b') as f:
+                f.truncate(max(needed, size * 2, 1024 * row_bytes))
+        with open(path, 'r+b') as f:
+            f.seek(start_row * row_bytes)
+            f.write(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+            f.flush()
+
+    def _evict(self, conn) -> int:
+        """Удаляет из индекса самые давно использованные записи сверх max_entries. Возвращает число живых."""
+        (live,) = conn.execute("SELECT COUNT(*) FROM embedding_entries WHERE model = ?", (self.model_name,)).fetchone()
+        excess = live - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM embedding_entries WHERE rowid IN ("
+                "SELECT rowid FROM embedding_entries WHERE model = ? ORDER BY last_used LIMIT ?)",
+                (self.model_name, excess)
+            )
+            metrics.incr("embedding_cache.evictions", excess)
+            live -= excess
+        return live
+
+    def compact(self):
+        """Переписывает живые строки в файл нового поколения и удаляет старый файл."""
+        started = time.monotonic()
+        with self.db.transaction() as conn:
+            state = self._model_state(conn)
+            if state is None:
+                return
+            dim, generation, next_row = state
+            entries = conn.execute(
+                "SELECT hash, row FROM embedding_entries WHERE model = ? ORDER BY row", (self.model_name,)
+            ).fetchall()
+            old_path, new_path = self._vectors_path(generation), self._vectors_path(generation + 1)
+            with open(new_path, 'wb') as out:
+                if entries:
+                    source = np.memmap(old_path, dtype=np.float32, mode='r', shape=(next_row, dim))
+                    rows = np.fromiter((row for _, row in entries), dtype=np.int64, count=len(entries))
+                    for start in range(0, len(rows), 4096):
+                        out.write(np.ascontiguousarray(source[rows[start:start + 4096]]).tobytes())
+                    del source
+            conn.executemany(
+                "UPDATE embedding_entries SET row = ? WHERE model = ? AND hash = ?",
+                [(i, self.model_name, h) for i, (h, _) in enumerate(entries)]
+            )
+            conn.execute(
+                "UPDATE embedding_models SET generation = ?, next_row = ? WHERE model = ?",
+                (generation + 1, len(entries), self.model_name)
+            )
+        # Уже открытые отображения старого файла остаются валидными до закрытия
+        try:
+            os.remove(old_path)
+        except FileNotFoundError:
+            pass
+        logger.info(
+            f"Embedding cache for {self.model_name} compacted: {next_row} -> {len(entries)} rows "
+            f"in {time.monotonic() - started:.2f}s."
+        )
+
+    # --- Высокоуровневый интерфейс ---
+
+    def encode(self, texts: Sequence[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Возвращает эмбеддинги текстов (в исходном порядке), считая через encode_fn
+        только те, которых нет в кэше.
+        """
+        hashes = [text_hash(text) for text in texts]
+        found = self.get_many(hashes)
+        missing = list(dict.fromkeys(h for h in hashes if h not in found))
+        if missing:
+            first_text = {}
+            for text, h in zip(texts, hashes):
+                first_text.setdefault(h, text)
+            computed = np.asarray(encode_fn([first_text[h] for h in missing]), dtype=np.float32)
+            fresh = dict(zip(missing, computed))
+            try:
+                self.put_many(fresh)
+            except Exception as e:
+                logger.warning(f"Failed to store embeddings in cache: {e}")
+            found.update(fresh)
+        return np.stack([found[h] for h in hashes]) if hashes else np.zeros((0, 0), dtype=np.float32)
+
+# END OF FILE: src/infra/knowledge/embedding_cache.py
@@ -0,0 +1,195 @@
+# START OF FILE: src/infra/knowledge/faq_index.py
+
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Set
+
+from src.shared.logger import logger
+from src.shared.morphology import lemmas
+
+@dataclass
+class FaqEntry:
+    id: str
+    question: str
+    answer: str
+    phrases: List[FrozenSet[str]]
+    lemma_set: FrozenSet[str]
+    question_lemmas: FrozenSet[str]
+
+@dataclass
+class FaqMatch:
+    entry: FaqEntry
+    score: float
+    coverage: float  # доля веса лемм вопроса пользователя, покрытых ключами записи
+    entry_coverage: float  # доля веса лемм вопроса записи, которые есть в вопросе пользователя
+    matched: int  # сколько лемм вопроса пользователя совпало с ключами записи
+
+    @property
+    def confidence(self) -> float:
+        """Двустороннее совпадение (среднее гармоническое покрытий): высокое, только если оба вопроса почти совпадают."""
+        if not self.coverage or not self.entry_coverage:
+            return 0.0
+        return 2 * self.coverage * self.entry_coverage / (self.coverage + self.entry_coverage)
+
+def pick_direct_answer(matches: List[FaqMatch], min_confidence: float, min_lemmas: int, min_margin: float = 0.1) -> Optional[FaqMatch]:
+    """
+    Запись, которой можно ответить без LLM: двусторонняя уверенность не ниже порога,
+    совпало не меньше min_lemmas лемм и отрыв от следующей записи не меньше min_margin.
+    """
+    if not matches:
+        return None
+    ranked = sorted(matches, key=lambda m: m.confidence, reverse=True)
+    top = ranked[0]
+    margin = top.confidence - (ranked[1].confidence if len(ranked) > 1 else 0.0)
+    if top.confidence >= min_confidence and top.matched >= min_lemmas and margin >= min_margin:
+        return top
+    return None
+
+class FaqIndex:
+    """
+    Инвертированный индекс по лемматизированным ключевым словам data/faq.json.
+    Фраза-ключ ("единственное жильё") срабатывает, только если в вопросе есть все ее леммы.
+    coverage — доля веса (idf) лемм вопроса, покрытых ключами записи: по ней отбираются
+    записи для контекста промпта. confidence учитывает и обратную сторону — какая доля
+    вопроса записи есть в вопросе пользователя, — поэтому короткий запрос ("ипотека")
+    не получает полной уверенности только потому, что все его слова нашлись в ключах.
+
+    Индекс строится один раз при старте и обновляется инкрементально: при изменении
+    файла переиндексируются только добавленные/измененные записи.
+    """
+    def __init__(self, file_path: str, reload_check_interval: float = 30):
+        self.file_path = file_path
+        self.reload_check_interval = reload_check_interval
+        self._entries: Dict[str, FaqEntry] = {}
+        # лемма -> фразы, в которые она входит; фраза -> записи, где она встречается
+        self._postings: Dict[str, Set[FrozenSet[str]]] = defaultdict(set)
+        self._phrase_entries: Dict[FrozenSet[str], Set[str]] = defaultdict(set)
+        self._lemma_df: Counter = Counter()
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # --- Построение индекса ---
+
+    @staticmethod
+    def _entry_id(item: Dict) -> str:
+        raw = json.dumps(item, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _build_entry(entry_id: str, item: Dict) -> FaqEntry:
+        phrases = {frozenset(lemmas(keyword)) for keyword in item.get('keywords', [])}
+        # Леммы самого вопроса тоже работают как однословные ключи
+        phrases.update(frozenset([lemma]) for lemma in lemmas(item['question']))
+        phrases.discard(frozenset())
+        lemma_set = frozenset().union(*phrases) if phrases else frozenset()
+        return FaqEntry(
+            id=entry_id, question=item['question'], answer=item['answer'], phrases=list(phrases),
+            lemma_set=lemma_set, question_lemmas=frozenset(lemmas(item['question']))
+        )
+
+    def _add(self, entry: FaqEntry):
+        self._entries[entry.id] = entry
+        for phrase in entry.phrases:
+            self._phrase_entries[phrase].add(entry.id)
+            for lemma in phrase:
+                self._postings[lemma].add(phrase)
+        self._lemma_df.update(entry.lemma_set)
+
+    def _remove(self, entry_id: str):
+        entry = self._entries.pop(entry_id)
+        for phrase in entry.phrases:
+            owners = self._phrase_entries[phrase]
+            owners.discard(entry_id)
+            if not owners:
+                del self._phrase_entries[phrase]
+                for lemma in phrase:
+                    self._postings[lemma].discard(phrase)
+                    if not self._postings[lemma]:
+                        del self._postings[lemma]
+        self._lemma_df.subtract(entry.lemma_set)
+        self._lemma_df += Counter()
+
+    def reload(self) -> bool:
+        """Перечитывает файл и применяет разницу к индексу. Возвращает True, если были изменения."""
+        try:
+            mtime = os.path.getmtime(self.file_path)
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                items = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Could not load FAQ file {self.file_path}: {e}")
+            return False
+
+        fresh = {self._entry_id(item): item for item in items if item.get('question') and item.get('answer')}
+        with self._lock:
+            removed = [entry_id for entry_id in self._entries if entry_id not in fresh]
+            added = [entry_id for entry_id in fresh if entry_id not in self._entries]
+            for entry_id in removed:
+                self._remove(entry_id)
+            for entry_id in added:
+                self._add(self._build_entry(entry_id, fresh[entry_id]))
+            self._mtime = mtime
+        if removed or added:
+            logger.info(f"FAQ index updated from {self.file_path}: +{len(added)} / -{len(removed)} entries, {len(self._entries)} total.")
+        return bool(removed or added)
+
+    def refresh_if_changed(self):
+        now = time.monotonic()
+        if now - self._last_check < self.reload_check_interval:
+            return
+        self._last_check = now
+        try:
+            if os.path.getmtime(self.file_path) != self._mtime:
+                self.reload()
+        except OSError:
+            pass
+
+    # --- Поиск ---
+
+    def _idf(self, lemma: str) -> float:
+        return math.log((len(self._entries) + 1) / (self._lemma_df.get(lemma, 0) + 0.5))
+
+    def search(self, question: str, top_k: int = 3) -> List[FaqMatch]:
+        self.refresh_if_changed()
+        query = set(lemmas(question))
+        if not query:
+            return []
+        with self._lock:
+            matched_phrases = {
+                phrase
+                for lemma in query
+                for phrase in self._postings.get(lemma, ())
+                if phrase <= query
+            }
+            covered: Dict[str, Set[str]] = defaultdict(set)
+            for phrase in matched_phrases:
+                for entry_id in self._phrase_entries[phrase]:
+                    covered[entry_id] |= phrase
+            if not covered:
+                return []
+            idf = {lemma: self._idf(lemma) for lemma in query}
+            total = sum(idf.values()) or 1.0
+            matches = []
+            for entry_id, lemmas_covered in covered.items():
+                entry = self._entries[entry_id]
+                score = sum(idf[lemma] for lemma in lemmas_covered)
+                entry_total = sum(self._idf(lemma) for lemma in entry.question_lemmas) or 1.0
+                entry_score = sum(self._idf(lemma) for lemma in entry.question_lemmas & query)
+                matches.append(FaqMatch(
+                    entry=entry, score=score, coverage=score / total,
+                    entry_coverage=entry_score / entry_total, matched=len(lemmas_covered)
+                ))
+        matches.sort(key=lambda m: m.score, reverse=True)
+        return matches[:top_k]
+
+# END OF FILE: src/infra/knowledge/faq_index.py
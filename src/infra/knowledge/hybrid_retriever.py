@@ -0,0 +1,179 @@
+# START OF FILE: src/infra/knowledge/hybrid_retriever.py
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.infra.knowledge.bm25_index import BM25Index
+from src.infra.knowledge.vector_store import VectorStore, TenantIndex, lock_file
+from src.shared.logger import logger
+from src.shared.metrics import metrics
+
+FUSION_MODES = ('rrf', 'weighted', 'vector', 'bm25')
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> Dict[int, float]:
+    """RRF: score(d) = Σ 1 / (k + rank(d)) по всем ранжированиям, rank с единицы."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (k + rank)
+    return fused
+
+def weighted_fusion(vector_hits: Dict[int, float], bm25_hits: Dict[int, float], alpha: float) -> Dict[int, float]:
+    """alpha * косинус + (1 - alpha) * BM25, нормированный на лучший результат запроса."""
+    best_bm25 = max(bm25_hits.values(), default=0.0) or 1.0
+    rows = set(vector_hits) | set(bm25_hits)
+    return {
+        row: alpha * vector_hits.get(row, 0.0) + (1 - alpha) * bm25_hits.get(row, 0.0) / best_bm25
+        for row in rows
+    }
+
+class HybridRetriever:
+    """
+    Гибридный поиск по базе знаний клиента: векторный индекс (VectorStore) плюс
+    BM25 по леммам над теми же чанками. Ранжирования объединяются через RRF или
+    взвешенную сумму (fusion='weighted', вес вектора — alpha).
+
+    Векторные кандидаты отсекаются по match_threshold, лексические — по bm25_threshold:
+    доле максимально возможной для запроса BM25-оценки. Без порога в выдачу попадал бы
+    любой чанк с одним общим словом.
+
+    BM25-индекс строится один раз на версию векторного индекса клиента и дальше
+    используется всеми потоками только на чтение. Он сохраняется рядом с файлами этой
+    версии, поэтому лемматизирует чанки один процесс (под flock), а остальные воркеры
+    открывают готовые массивы через mmap. Сборки разных клиентов не ждут друг друга.
+    Без vector_store доступен только search_index по заранее собранному индексу
+    (например, в бенчмарке).
+    """
+    def __init__(
+        self,
+        vector_store: Optional[VectorStore],
+        fusion: str = 'rrf',
+        alpha: float = 0.5,
+        rrf_k: int = 60,
+        candidates: int = 20,
+        bm25_threshold: float = 0.0
+    ):
+        if fusion not in FUSION_MODES:
+            raise ValueError(f"Unknown fusion mode '{fusion}'. Expected one of {FUSION_MODES}.")
+        self.vector_store = vector_store
+        self.fusion = fusion
+        self.alpha = alpha
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+        self.bm25_threshold = bm25_threshold
+        self._bm25: Dict[int, Tuple[TenantIndex, BM25Index]] = {}
+        self._locks: Dict[int, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock_for(self, client_id: int) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(client_id, threading.Lock())
+
+    def _bm25_for(self, index: TenantIndex) -> BM25Index:
+        cached = self._bm25.get(index.client_id)
+        if cached is not None and cached[0] is index:
+            return cached[1]
+        with self._lock_for(index.client_id):
+            cached = self._bm25.get(index.client_id)
+            if cached is not None and cached[0] is index:
+                return cached[1]
+            bm25 = self._load_or_build_bm25(index)
+            self._bm25[index.client_id] = (index, bm25)
+            return bm25
+
+    def _load_or_build_bm25(self, index: TenantIndex) -> BM25Index:
+        """BM25 версии индекса из файлов кэша; если их нет — собирает и сохраняет (один процесс на клиента)."""
+        if self.vector_store is None or index.version is None:
+            return self._build_bm25(index)
+        prefix = self.vector_store.version_prefix(index.client_id, index.version)
+        bm25 = BM25Index.load(prefix)
+        if bm25 is not None and len(bm25) == len(index):
+            return bm25
+        handle = lock_file(self.vector_store.lock_path(index.client_id, "bm25"))
+        try:
+            # Пока ждали блокировку, индекс мог собрать другой воркер
+            bm25 = BM25Index.load(prefix)
+            if bm25 is not None and len(bm25) == len(index):
+                return bm25
+            bm25 = self._build_bm25(index)
+            try:
+                bm25.save(prefix)
+            except OSError as e:
+                logger.warning(f"Could not save BM25 index for client {index.client_id}: {e}")
+            return bm25
+        finally:
+            handle.close()
+
+    @staticmethod
+    def _build_bm25(index: TenantIndex) -> BM25Index:
+        started = time.monotonic()
+        bm25 = BM25Index.build([chunk['content'] for chunk in index.chunks])
+        logger.info(f"BM25 index for client {index.client_id} built: {len(bm25)} chunks in {time.monotonic() - started:.2f}s.")
+        return bm25
+
+    def search(
+        self,
+        client_id: int,
+        question: str,
+        query_vector: Optional[np.ndarray],
+        top_k: int = 3,
+        match_threshold: float = 0.5
+    ) -> List[Dict[str, Any]]:
+        """
+        Возвращает до top_k чанков в формате find_similar_chunks. Векторные кандидаты
+        отсекаются по match_threshold, лексические — по bm25_threshold.
+        """
+        index = self.vector_store.get_index(client_id)
+        if index is None or len(index) == 0:
+            return []
+        started = time.perf_counter()
+        results = self.search_index(index, question, query_vector, top_k, match_threshold)
+        metrics.observe("rag.search_ms", (time.perf_counter() - started) * 1000, client_id=client_id)
+        return results
+
+    def search_index(
+        self,
+        index: TenantIndex,
+        question: str,
+        query_vector: Optional[np.ndarray],
+        top_k: int = 3,
+        match_threshold: float = 0.5,
+        fusion: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Поиск по уже загруженному индексу; fusion переопределяет режим объединения."""
+        fusion = fusion or self.fusion
+
+        vector_hits: Dict[int, float] = {}
+        if fusion != 'bm25' and query_vector is not None:
+            queries = np.atleast_2d(np.asarray(query_vector, dtype=np.float32))
+            if VectorStore.is_searchable(index, queries):
+                rows, scores = VectorStore.rank(index, queries, self.candidates)
+                vector_hits = {int(r): float(s) for r, s in zip(rows[0], scores[0]) if s >= match_threshold}
+
+        bm25_hits: Dict[int, float] = {}
+        if fusion != 'vector':
+            bm25_hits = dict(self._bm25_for(index).search(question, self.candidates, self.bm25_threshold))
+
+        if fusion == 'vector':
+            fused = vector_hits
+        elif fusion == 'bm25':
+            fused = bm25_hits
+        elif fusion == 'weighted':
+            fused = weighted_fusion(vector_hits, bm25_hits, self.alpha)
+        else:
+            fused = reciprocal_rank_fusion([list(vector_hits), list(bm25_hits)], self.rrf_k)
+
+        best = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            {
+                **index.chunks[row],
+                "similarity": round(vector_hits[row], 4) if row in vector_hits else None,
+                "score": round(score, 4),
+            }
+            for row, score in best
+        ]
+
+# END OF FILE: src/infra/knowledge/hybrid_retriever.py
@@ -0,0 +1,111 @@
+# START OF FILE: src/infra/knowledge/ivf_index.py
+
+import math
+from typing import List, Optional
+
+import numpy as np
+
+# Сколько векторов сравнивать с центроидами за раз (ограничивает временную матрицу)
+_ASSIGN_BLOCK = 8192
+
+class IVFIndex:
+    """
+    Приближенный поиск ближайших соседей (IVF, inverted file) для нормированных векторов.
+
+    Векторы разбиваются сферическим k-means на n_lists кластеров. Запрос сравнивается
+    только с центроидами, после чего точно оцениваются строки n_probe ближайших
+    кластеров, а не вся матрица. Индекс хранит лишь центроиды и номер кластера
+    для каждой строки матрицы TenantIndex, поэтому сами векторы не дублируются.
+
+    Обновление инкрементальное: у сохранившихся строк кластер переносится из прошлой
+    версии, новые строки приписываются к ближайшему центроиду. Переобучение нужно,
+    только когда размер базы сильно ушел от того, на котором учились центроиды.
+    """
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray, trained_count: int, n_probe: int = 16):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.assignments = np.asarray(assignments, dtype=np.int32)
+        self.trained_count = trained_count
+        self.n_probe = n_probe
+        # Строки, сгруппированные по кластерам: rows[offsets[c]:offsets[c + 1]] — кластер c
+        self._rows = np.argsort(self.assignments, kind='stable').astype(np.int32)
+        counts = np.bincount(self.assignments, minlength=len(self.centroids))
+        self._offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.assignments)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @staticmethod
+    def default_lists(count: int) -> int:
+        return max(1, int(math.sqrt(count)))
+
+    @staticmethod
+    def assign(centroids: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        """Номер ближайшего (по косинусу) центроида для каждой строки vectors."""
+        result = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), _ASSIGN_BLOCK):
+            block = np.asarray(vectors[start:start + _ASSIGN_BLOCK], dtype=np.float32)
+            result[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return result
+
+    @classmethod
+    def train(
+        cls,
+        matrix: np.ndarray,
+        n_lists: Optional[int] = None,
+        n_probe: int = 16,
+        iterations: int = 10,
+        sample_size: int = 100000,
+        seed: int = 0
+    ) -> "IVFIndex":
+        """Сферический k-means на выборке строк, затем разметка всей матрицы."""
+        count = len(matrix)
+        n_lists = min(n_lists or cls.default_lists(count), count)
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(count, size=min(count, max(sample_size, n_lists)), replace=False))
+        sample = np.asarray(matrix[sample_rows], dtype=np.float32)
+
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = cls.assign(centroids, sample)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1)
+            # Пустой кластер переносим на случайную точку выборки
+            empty = norms == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+                norms[empty] = np.linalg.norm(sums[empty], axis=1)
+            centroids = sums / np.where(norms == 0, 1.0, norms)[:, None]
+
+        return cls(centroids, cls.assign(centroids, matrix), count, n_probe)
+
+    def updated(self, matrix: np.ndarray, previous_rows: np.ndarray) -> "IVFIndex":
+        """
+        Индекс для новой версии матрицы. previous_rows[i] — номер той же записи в прошлой
+        версии или -1 для новой; кодировать заново нужно только новые строки.
+        """
+        assignments = np.empty(len(matrix), dtype=np.int32)
+        kept = previous_rows >= 0
+        assignments[kept] = self.assignments[previous_rows[kept]]
+        fresh = np.flatnonzero(~kept)
+        if len(fresh):
+            assignments[fresh] = self.assign(self.centroids, matrix[fresh])
+        return IVFIndex(self.centroids, assignments, self.trained_count, self.n_probe)
+
+    def needs_retrain(self, count: int) -> bool:
+        return count > 2 * self.trained_count or count < self.trained_count // 2
+
+    def candidates(self, queries: np.ndarray) -> List[np.ndarray]:
+        """Номера строк из n_probe ближайших кластеров для каждого запроса (по возрастанию)."""
+        n_probe = min(self.n_probe, self.n_lists)
+        nearest = np.argpartition(-(queries @ self.centroids.T), n_probe - 1, axis=1)[:, :n_probe]
+        return [
+            np.sort(np.concatenate([self._rows[self._offsets[c]:self._offsets[c + 1]] for c in lists]))
+            for lists in nearest
+        ]
+
+# END OF FILE: src/infra/knowledge/ivf_index.py
@@ -0,0 +1,549 @@
+# START OF FILE: src/infra/knowledge/vector_store.py
+
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.infra.clients.supabase_repo import SupabaseRepo
+from src.infra.knowledge.ivf_index import IVFIndex
+from src.shared.logger import logger
+from src.shared.metrics import metrics
+
+# Сколько строк int8-матрицы разворачивать во float32 за раз при первом проходе
+_SCAN_BLOCK = 16384
+
+def parse_embedding(raw: Any) -> Optional[List[float]]:
+    """pgvector через PostgREST отдается строкой вида '[0.1,0.2,...]'."""
+    if raw is None:
+        return None
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+    return raw if isinstance(raw, list) and raw else None
+
+def quantize_int8(matrix: np.ndarray):
+    """Симметричное квантование строк в int8 с отдельным масштабом на вектор: v ≈ q * scale."""
+    scales = np.abs(matrix).max(axis=1) / 127.0 if len(matrix) else np.zeros(0, dtype=np.float32)
+    scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+    quantized = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales
+
+def lock_file(path: str, blocking: bool = True):
+    """Открывает файл и берет на нем flock; None, если его держит другой процесс (при blocking=False)."""
+    handle = open(path, 'a')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return handle
+    except OSError:
+        handle.close()
+        return None
+
+@dataclass
+class TenantIndex:
+    client_id: int
+    matrix: np.ndarray  # (n, dim), float32, строки нормированы; обычно np.memmap
+    chunks: List[Dict[str, Any]] = field(default_factory=list)
+    built_at: float = 0.0
+    # Необязательная int8-копия для первого прохода: при поиске целиком читается только она,
+    # а из float-матрицы подгружаются лишь строки кандидатов для точного пересчета
+    quantized: Optional[np.ndarray] = None
+    scales: Optional[np.ndarray] = None
+    # Необязательный IVF-индекс для больших баз: кандидаты берутся из ближайших кластеров
+    ann: Optional[IVFIndex] = None
+    version: Optional[str] = None  # версия файлов кэша, из которых загружен индекс
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+class VectorStore:
+    """
+    Локальный поиск по базе знаний клиента без обращения к БД на каждый вопрос.
+
+    Эмбеддинги knowledge_base клиента складываются в непрерывную нормированную матрицу
+    float32 в .npy (плюс .json с текстами) в cache_dir. Матрица открывается через
+    np.load(mmap_mode='r'), поэтому воркеры делят одни и те же страницы файла в page cache.
+    Поиск — косинусная близость пачкой запросов и top-k.
+
+    Кэш сверяется с БД, когда с последней проверки прошло refresh_interval. Сверка
+    инкрементальная: из БД читается список id и content_hash, а эмбеддинги выгружаются
+    только для новых и измененных записей — постранично, прямо в заранее выделенную
+    memmap-матрицу новой версии; строки сохранившихся записей копируются из прошлой
+    версии блоками. Сверку выполняет один процесс (flock на kb_<client>.build.lock); остальные
+    воркеры продолжают искать по старой версии и подхватывают новую по метаданным.
+
+    С quantize=True рядом хранится int8-версия матрицы (масштаб на вектор): первый проход
+    идет по ней, а top кандидатов пересчитывается по точным float-векторам. Резидентная
+    память на поиск сокращается примерно в 4 раза.
+
+    Для баз от ann_min_chunks чанков (0 — никогда) строится IVF-индекс (см. ivf_index.py):
+    поиск просматривает только ann_probe ближайших кластеров. Он хранится в тех же
+    версионных файлах кэша и при пересборке обновляется инкрементально.
+    """
+    def __init__(
+        self,
+        repo: SupabaseRepo,
+        cache_dir: str,
+        refresh_interval: float = 3600,
+        quantize: bool = False,
+        ann_min_chunks: int = 0,
+        ann_lists: int = 0,
+        ann_probe: int = 16
+    ):
+        self.repo = repo
+        self.cache_dir = cache_dir
+        self.refresh_interval = refresh_interval
+        self.quantize = quantize
+        self.ann_min_chunks = ann_min_chunks
+        self.ann_lists = ann_lists
+        self.ann_probe = ann_probe
+        self._indexes: Dict[int, TenantIndex] = {}
+        self._locks: Dict[int, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # --- Файлы кэша ---
+    # kb_<client>.json — метаданные и тексты с номером версии; матрицы лежат в файлах
+    # kb_<client>.<версия>.*.npy. Переключение версии — атомарная замена .json.
+    # Время изменения kb_<client>.checked — момент последней сверки с БД.
+
+    def _meta_path(self, client_id: int) -> str:
+        return os.path.join(self.cache_dir, f"kb_{client_id}.json")
+
+    def _data_path(self, client_id: int, version: str, kind: str) -> str:
+        return os.path.join(self.cache_dir, f"kb_{client_id}.{version}.{kind}.npy")
+
+    def version_prefix(self, client_id: int, version: str) -> str:
+        """Префикс файлов версии: производные индексы (например, BM25) удаляются вместе с ней."""
+        return os.path.join(self.cache_dir, f"kb_{client_id}.{version}")
+
+    def lock_path(self, client_id: int, kind: str = "build") -> str:
+        return os.path.join(self.cache_dir, f"kb_{client_id}.{kind}.lock")
+
+    def _checked_path(self, client_id: int) -> str:
+        return os.path.join(self.cache_dir, f"kb_{client_id}.checked")
+
+    def _wants_ann(self, count: int) -> bool:
+        return bool(self.ann_min_chunks) and count >= self.ann_min_chunks
+
+    def _mark_checked(self, client_id: int):
+        with open(self._checked_path(client_id), 'a'):
+            pass
+        os.utime(self._checked_path(client_id))
+
+    def _checked_at(self, client_id: int) -> Optional[float]:
+        try:
+            return os.path.getmtime(self._checked_path(client_id))
+        except OSError:
+            return None
+
+    def _is_due(self, client_id: int) -> bool:
+        checked_at = self._checked_at(client_id)
+        return checked_at is None or time.time() - checked_at >= self.refresh_interval
+
+    def _publish(self, client_id: int, version: str, dim: int, chunks: List[Dict[str, Any]], ann: Optional[IVFIndex], previous_version: Optional[str]):
+        """Дописывает файлы IVF и атомарно подменяет метаданные; матрицы версии уже записаны."""
+        if ann is not None:
+            for kind, array in (("centroids", ann.centroids), ("assign", ann.assignments)):
+                with open(self._data_path(client_id, version, kind), 'wb') as f:
+                    np.save(f, array)
+        meta_path = self._meta_path(client_id)
+        with open(meta_path + f".{version}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({
+                "version": version, "count": len(chunks), "dim": dim,
+                "quantized": self.quantize, "ann": {"trained_count": ann.trained_count} if ann else None,
+                "chunks": chunks
+            }, f, ensure_ascii=False)
+        os.replace(meta_path + f".{version}.tmp", meta_path)
+        self._mark_checked(client_id)
+        # Предыдущую версию оставляем для читателей, которые успели прочитать старые метаданные
+        keep = {version, previous_version}
+        self._remove_data_files(client_id, keep)
+
+    def _remove_data_files(self, client_id: int, keep_versions=()):
+        prefix = f"kb_{client_id}."
+        for name in os.listdir(self.cache_dir):
+            if not name.startswith(prefix) or not name.endswith(".npy"):
+                continue
+            if name[len(prefix):].split(".", 1)[0] in keep_versions:
+                continue
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+
+    def _read_meta(self, client_id: int) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._meta_path(client_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _read_cache(self, client_id: int) -> Optional[TenantIndex]:
+        meta_path = self._meta_path(client_id)
+        try:
+            built_at = os.path.getmtime(meta_path)
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            version, count = meta["version"], meta["count"]
+            if bool(meta.get("quantized")) != self.quantize or bool(meta.get("ann")) != self._wants_ann(count):
+                return None  # кэш в другом формате — пересоберем
+            quantized, scales, ann = None, None, None
+            if count == 0:
+                matrix = np.zeros((0, meta["dim"]), dtype=np.float32)
+            else:
+                matrix = np.load(self._data_path(client_id, version, "f32"), mmap_mode='r')
+                if self.quantize:
+                    quantized = np.load(self._data_path(client_id, version, "i8"), mmap_mode='r')
+                    scales = np.load(self._data_path(client_id, version, "scale"))
+                if meta.get("ann"):
+                    ann = self._load_ann(client_id, meta)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Vector cache for client {client_id} is unreadable: {e}")
+            return None
+        if matrix.shape[0] != count:
+            return None
+        return TenantIndex(
+            client_id=client_id, matrix=matrix, chunks=meta["chunks"], built_at=built_at,
+            quantized=quantized if count else None, scales=scales, ann=ann, version=version
+        )
+
+    def _load_ann(self, client_id: int, meta: Dict[str, Any]) -> IVFIndex:
+        version = meta["version"]
+        return IVFIndex(
+            np.load(self._data_path(client_id, version, "centroids")),
+            np.load(self._data_path(client_id, version, "assign")),
+            meta["ann"]["trained_count"],
+            self.ann_probe
+        )
+
+    def _build_ann(self, client_id: int, matrix: np.ndarray, chunks: List[Dict[str, Any]], meta: Optional[Dict[str, Any]]) -> IVFIndex:
+        """
+        Переносит кластеры сохранившихся записей из текущей версии кэша (id записи
+        knowledge_base не меняется, эмбеддинг у него тоже) и размечает только новые.
+        Центроиды переобучаются, если их нет или база выросла/уменьшилась больше чем вдвое.
+        """
+        started = time.monotonic()
+        previous, previous_ids = None, {}
+        if meta and meta.get("ann") and meta.get("dim") == matrix.shape[1]:
+            try:
+                previous = self._load_ann(client_id, meta)
+                previous_ids = {chunk["id"]: row for row, chunk in enumerate(meta["chunks"])}
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Previous ANN index for client {client_id} is unreadable, retraining: {e}")
+                previous = None
+
+        if previous is None or previous.needs_retrain(len(matrix)):
+            ann = IVFIndex.train(matrix, self.ann_lists or None, self.ann_probe)
+            action = f"trained ({ann.n_lists} lists)"
+        else:
+            previous_rows = np.fromiter((previous_ids.get(chunk["id"], -1) for chunk in chunks), dtype=np.int64, count=len(chunks))
+            ann = previous.updated(matrix, previous_rows)
+            action = f"updated ({int((previous_rows < 0).sum())} new rows)"
+        logger.info(f"ANN index for client {client_id} {action} in {time.monotonic() - started:.2f}s.")
+        return ann
+
+    # --- Построение ---
+
+    def _lock_build(self, client_id: int, blocking: bool):
+        """Кэш клиента пересобирает один процесс. None, если занято (при blocking=False)."""
+        return lock_file(self.lock_path(client_id), blocking)
+
+    def _previous_version(self, client_id: int):
+        """Метаданные и float-матрица текущей версии кэша (любого формата) или (None, None)."""
+        meta = self._read_meta(client_id)
+        if not meta or not meta.get("count"):
+            return meta, None
+        try:
+            matrix = np.load(self._data_path(client_id, meta["version"], "f32"), mmap_mode='r')
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Previous vector cache for client {client_id} is unreadable, rebuilding from scratch: {e}")
+            return None, None
+        if matrix.shape[0] != meta["count"]:
+            return None, None
+        return meta, matrix
+
+    def build(self, client_id: int) -> TenantIndex:
+        """Сверяет кэш с БД и публикует новую версию; ждет, если кэш сверяет другой процесс."""
+        handle = self._lock_build(client_id, blocking=True)
+        try:
+            return self._build_locked(client_id)
+        finally:
+            handle.close()
+
+    def _build_locked(self, client_id: int) -> TenantIndex:
+        started = time.monotonic()
+        hashes = self.repo.get_knowledge_base_hashes(client_id)
+        current = {record_id: content_hash for content_hash, ids in hashes.items() for record_id in ids}
+
+        meta, previous = self._previous_version(client_id)
+        previous_rows: Dict[int, int] = {}
+        if previous is not None:
+            # Сохранившаяся запись — тот же id с тем же content_hash; записи без хэша перечитываем
+            previous_rows = {
+                chunk["id"]: row for row, chunk in enumerate(meta["chunks"])
+                if chunk.get("hash") is not None and current.get(chunk["id"]) == chunk.get("hash")
+            }
+        kept_ids = sorted(previous_rows)
+        fresh_ids = sorted(record_id for record_id in current if record_id not in previous_rows)
+
+        if (
+            meta is not None and not fresh_ids and len(kept_ids) == meta.get("count")
+            and bool(meta.get("quantized")) == self.quantize and bool(meta.get("ann")) == self._wants_ann(len(kept_ids))
+        ):
+            self._mark_checked(client_id)
+            logger.info(f"Vector index for client {client_id} is up to date ({len(kept_ids)} chunks), checked in {time.monotonic() - started:.2f}s.")
+            cached = self._read_cache(client_id)
+            if cached is not None:
+                return cached
+
+        version = f"{int(time.time())}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        dim = int(meta["dim"]) if previous is not None else None
+        capacity = len(kept_ids) + len(fresh_ids)
+        matrix: Optional[np.ndarray] = None
+        chunks: List[Dict[str, Any]] = []
+        skipped = 0
+
+        def allocate(size: int) -> np.ndarray:
+            return np.lib.format.open_memmap(self._data_path(client_id, version, "f32"), mode='w+', dtype=np.float32, shape=(size, dim))
+
+        if kept_ids:
+            matrix = allocate(capacity)
+            positions = np.fromiter((previous_rows[record_id] for record_id in kept_ids), dtype=np.int64, count=len(kept_ids))
+            for start in range(0, len(positions), _SCAN_BLOCK):
+                part = positions[start:start + _SCAN_BLOCK]
+                matrix[start:start + len(part)] = previous[part]
+            chunks.extend(meta["chunks"][row] for row in positions.tolist())
+        del previous
+
+        for page in self.repo.iter_knowledge_base_records(client_id, fresh_ids):
+            page_chunks, page_vectors = [], []
+            for row in page:
+                embedding = parse_embedding(row.get('embedding'))
+                if embedding is None or not row.get('content'):
+                    skipped += 1
+                    continue
+                if dim is None:
+                    dim = len(embedding)
+                if len(embedding) != dim:
+                    # Записи от разных моделей несравнимы — берем размерность уже собранной матрицы
+                    skipped += 1
+                    continue
+                page_vectors.append(embedding)
+                page_chunks.append({"id": row.get('id'), "content": row['content'], "source": row.get('source'), "hash": row.get('content_hash')})
+            if not page_vectors:
+                continue
+            if matrix is None:
+                matrix = allocate(capacity)
+            block = np.asarray(page_vectors, dtype=np.float32)
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix[len(chunks):len(chunks) + len(block)] = block / norms
+            chunks.extend(page_chunks)
+        if skipped:
+            logger.warning(f"Skipped {skipped} knowledge base record(s) of client {client_id} without content or with a mismatched embedding.")
+
+        if matrix is None:
+            matrix = np.zeros((0, dim or 0), dtype=np.float32)
+        elif len(chunks) < capacity:
+            # Часть записей пропущена или удалена за время выгрузки — ужимаем файл до заполненных строк
+            full, full_path = matrix, self._data_path(client_id, version, "f32")
+            os.replace(full_path, full_path + ".tmp")
+            matrix = allocate(len(chunks))
+            for start in range(0, len(chunks), _SCAN_BLOCK):
+                matrix[start:start + _SCAN_BLOCK] = full[start:min(start + _SCAN_BLOCK, len(chunks))]
+            del full
+            os.remove(full_path + ".tmp")
+        if len(chunks):
+            matrix.flush()
+            if self.quantize:
+                self._write_quantized(client_id, version, matrix)
+
+        ann = self._build_ann(client_id, matrix, chunks, meta) if self._wants_ann(len(chunks)) else None
+        self._publish(client_id, version, int(matrix.shape[1]), chunks, ann, meta.get("version") if meta else None)
+        logger.info(
+            f"Vector index for client {client_id} built: {len(chunks)} chunks ({len(kept_ids)} reused, "
+            f"{len(chunks) - min(len(kept_ids), len(chunks))} fetched) in {time.monotonic() - started:.2f}s."
+        )
+        return self._read_cache(client_id) or TenantIndex(client_id, matrix, chunks, time.time())
+
+    def _write_quantized(self, client_id: int, version: str, matrix: np.ndarray):
+        """int8-копия матрицы блоками, без второй полной float-копии в памяти."""
+        quantized = np.lib.format.open_memmap(self._data_path(client_id, version, "i8"), mode='w+', dtype=np.int8, shape=matrix.shape)
+        scales = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), _SCAN_BLOCK):
+            quantized[start:start + _SCAN_BLOCK], scales[start:start + _SCAN_BLOCK] = quantize_int8(np.asarray(matrix[start:start + _SCAN_BLOCK]))
+        quantized.flush()
+        del quantized
+        with open(self._data_path(client_id, version, "scale"), 'wb') as f:
+            np.save(f, scales)
+
+    def _lock_for(self, client_id: int) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(client_id, threading.Lock())
+
+    def _cache_mtime(self, client_id: int) -> Optional[float]:
+        """Время записи кэша: если его пересобрал другой процесс (воркер, скрипт векторизации), подхватываем."""
+        try:
+            return os.path.getmtime(self._meta_path(client_id))
+        except OSError:
+            return None
+
+    def get_index(self, client_id: int) -> Optional[TenantIndex]:
+        """
+        Возвращает индекс клиента, при необходимости подгружая или пересобирая его.
+        Пока один поток (или другой процесс) сверяет устаревший индекс с БД, остальные
+        продолжают искать по старому и подхватывают новую версию, когда она опубликована.
+        """
+        index = self._indexes.get(client_id)
+        published = self._cache_mtime(client_id)
+        if index is not None and published == index.built_at and not self._is_due(client_id):
+            return index
+        lock = self._lock_for(client_id)
+        if not lock.acquire(blocking=index is None):
+            return index
+        try:
+            if index is None or published != index.built_at:
+                index = self._read_cache(client_id) or index
+            if index is None or index.built_at != self._cache_mtime(client_id) or self._is_due(client_id):
+                index = self._refresh(client_id, index)
+            self._indexes[client_id] = index
+            metrics.set_gauge("rag.index_chunks", len(index), client_id=client_id)
+            return index
+        except Exception as e:
+            logger.error(f"Failed to load vector index for client {client_id}: {e}", exc_info=True)
+            return self._indexes.get(client_id)
+        finally:
+            lock.release()
+
+    def _refresh(self, client_id: int, current: Optional[TenantIndex]) -> TenantIndex:
+        """Сверяет кэш с БД, если этого уже не делает другой процесс; иначе отдает текущий индекс."""
+        handle = self._lock_build(client_id, blocking=current is None)
+        if handle is None:
+            metrics.incr("rag.index_refresh_skipped", client_id=client_id)
+            return current
+        try:
+            # Пока ждали блокировку, кэш мог обновить другой процесс
+            if not self._is_due(client_id):
+                if current is not None and current.built_at == self._cache_mtime(client_id):
+                    return current
+                fresh = self._read_cache(client_id)
+                if fresh is not None:
+                    return fresh
+            return self._build_locked(client_id)
+        finally:
+            handle.close()
+
+    def invalidate(self, client_id: int):
+        """Сбрасывает индекс клиента: следующий поиск пересоберет его из БД."""
+        self._indexes.pop(client_id, None)
+        for path in (self._meta_path(client_id), self._checked_path(client_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._remove_data_files(client_id)
+
+    # --- Поиск ---
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int):
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    @staticmethod
+    def rank(index: TenantIndex, queries: np.ndarray, top_k: int, rescore_factor: int = 4):
+        """
+        Косинусный top-k по матрице индекса для пачки нормированных запросов (b, dim).
+        Возвращает (rows, scores): номера строк индекса и их близость, по убыванию.
+        Для квантованного индекса top_k * rescore_factor кандидатов из int8-прохода
+        пересчитываются по точным float-векторам, так что оценки всегда точные.
+        """
+        n = len(index)
+        k = min(top_k, n)
+        if index.ann is not None:
+            return VectorStore._rank_ann(index, queries, k, rescore_factor)
+        if index.quantized is None:
+            return VectorStore._top_k(queries @ index.matrix.T, k)
+
+        approx = np.empty((len(queries), n), dtype=np.float32)
+        for start in range(0, n, _SCAN_BLOCK):
+            block = index.quantized[start:start + _SCAN_BLOCK].astype(np.float32)
+            approx[:, start:start + _SCAN_BLOCK] = (queries @ block.T) * index.scales[start:start + _SCAN_BLOCK]
+        candidates, _ = VectorStore._top_k(approx, min(n, max(k * rescore_factor, k)))
+        # Строки кандидатов читаются из mmap по возрастанию номера — почти последовательно
+        candidates = np.sort(candidates, axis=1)
+        vectors = np.asarray(index.matrix[candidates.ravel()]).reshape(*candidates.shape, index.dim)
+        exact = np.einsum('bcd,bd->bc', vectors, queries)
+        rows, scores = VectorStore._top_k(exact, k)
+        return np.take_along_axis(candidates, rows, axis=1), scores
+
+    @staticmethod
+    def _rank_ann(index: TenantIndex, queries: np.ndarray, k: int, rescore_factor: int):
+        """top-k только по строкам ближайших кластеров IVF; оценки точные."""
+        result_rows = np.empty((len(queries), k), dtype=np.int64)
+        result_scores = np.empty((len(queries), k), dtype=np.float32)
+        for i, (query, rows) in enumerate(zip(queries, index.ann.candidates(queries))):
+            if len(rows) < k:
+                rows = np.arange(len(index))  # слишком мелкие кластеры — честный полный просмотр
+            metrics.observe("rag.ann_candidates", len(rows))
+            shortlist = k * rescore_factor
+            if index.quantized is not None and len(rows) > shortlist:
+                approx = (index.quantized[rows].astype(np.float32) @ query) * index.scales[rows]
+                rows = np.sort(rows[np.argpartition(-approx, shortlist - 1)[:shortlist]])
+            exact = np.asarray(index.matrix[rows]) @ query
+            top, scores = VectorStore._top_k(exact[None, :], k)
+            result_rows[i], result_scores[i] = rows[top[0]], scores[0]
+        return result_rows, result_scores
+
+    def search_batch(self, client_id: int, queries: np.ndarray, top_k: int = 3, match_threshold: float = 0.5) -> List[List[Dict[str, Any]]]:
+        """
+        Косинусный top-k для пачки нормированных векторов запросов (shape (b, dim)).
+        Возвращает по списку чанков на запрос в формате find_similar_chunks.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        index = self.get_index(client_id)
+        if not self.is_searchable(index, queries):
+            return [[] for _ in range(len(queries))]
+
+        started = time.perf_counter()
+        rows, scores = self.rank(index, queries, top_k)
+        results = [
+            [
+                {**index.chunks[row], "similarity": round(float(score), 4)}
+                for row, score in zip(query_rows, query_scores) if score >= match_threshold
+            ]
+            for query_rows, query_scores in zip(rows, scores)
+        ]
+        metrics.observe("rag.search_ms", (time.perf_counter() - started) * 1000, client_id=client_id)
+        return results
+
+    def search(self, client_id: int, query: np.ndarray, top_k: int = 3, match_threshold: float = 0.5) -> List[Dict[str, Any]]:
+        return self.search_batch(client_id, query, top_k, match_threshold)[0]
+
+    @staticmethod
+    def is_searchable(index: Optional[TenantIndex], queries: np.ndarray) -> bool:
+        if index is None or len(index) == 0:
+            return False
+        if queries.shape[1] != index.dim:
+            logger.error(f"Query embedding size {queries.shape[1]} does not match index size {index.dim} for client {index.client_id}.")
+            return False
+        return True
+
+# END OF FILE: src/infra/knowledge/vector_store.py
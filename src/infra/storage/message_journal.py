@@ -0,0 +1,250 @@
+# START OF FILE: src/infra/storage/message_journal.py
+
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.domain.models import Message
+from src.infra.clients.supabase_repo import SupabaseRepo
+from src.shared.logger import logger
+from src.shared.metrics import metrics
+
+class MessageJournal:
+    """
+    Отложенная запись истории диалогов (write-behind) в таблицу messages.
+
+    append не ждет сети: строка дописывается в локальный JSONL-журнал воркера
+    и в буфер в памяти. Фоновый поток сбрасывает буфер в Supabase многострочными
+    вставками, когда набирается batch_size строк или проходит flush_interval секунд,
+    после чего подтвержденные строки вычеркиваются из журнала. При остановке буфер
+    сбрасывается полностью.
+
+    Журнал каждого воркера защищен flock на файле .lock, пока процесс жив. Имя журнала
+    уникально для каждого запуска (pid и случайный суффикс): перезапущенный воркер с тем же
+    pid не откроет старый журнал и не затрет его строки при первой чистке. На старте
+    replay забирает журналы, чьи владельцы мертвы (упавший или перезапущенный воркер),
+    и дописывает их строки в свой буфер. Доставка "хотя бы один раз": если процесс упал
+    между вставкой и чисткой журнала, последняя пачка запишется повторно.
+
+    on_confirmed получает ключи (client_id, user_id) строк, вставка которых подтверждена
+    (например, ConversationMemory.confirm): только после этого строки видны другим воркерам.
+    """
+    def __init__(
+        self,
+        repo: SupabaseRepo,
+        journal_dir: str,
+        batch_size: int = 50,
+        flush_interval: float = 1.0,
+        on_confirmed: Optional[Callable[[List[Tuple[int, int]]], None]] = None
+    ):
+        self.repo = repo
+        self.journal_dir = journal_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_confirmed = on_confirmed
+        os.makedirs(journal_dir, exist_ok=True)
+        self._path = os.path.join(journal_dir, f"messages.{os.getpid()}.{uuid.uuid4().hex[:8]}.jsonl")
+        self._lock_file = None
+        self._file = None
+        self._pending: List[Tuple[float, Dict[str, Any]]] = []  # (время добавления, строка)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    # --- Файлы журнала ---
+
+    @staticmethod
+    def _try_lock(path: str):
+        """Открывает и блокирует .lock-файл; None, если его держит живой процесс."""
+        handle = open(path, 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return handle
+        except OSError:
+            handle.close()
+            return None
+
+    @staticmethod
+    def _read_rows(path: str) -> List[Dict[str, Any]]:
+        rows = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping a torn line in message journal {path}.")
+        return rows
+
+    def _open(self):
+        """Вызывается под self._lock."""
+        if self._file is None:
+            self._lock_file = self._try_lock(self._path + ".lock")
+            if self._lock_file is None:
+                raise RuntimeError(f"Message journal {self._path} is locked by another process.")
+            if os.path.exists(self._path):
+                # Строки, уже лежащие в журнале, должны попасть в буфер, иначе _rewrite их сотрет
+                now = time.monotonic()
+                self._pending.extend((now, row) for row in self._read_rows(self._path))
+            self._file = open(self._path, 'a', encoding='utf-8')
+
+    def _rewrite(self):
+        """Оставляет в журнале только неподтвержденные строки. Вызывается под self._lock."""
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(row, ensure_ascii=False) + "\n" for _, row in self._pending)
+        self._file.close()
+        os.replace(tmp_path, self._path)
+        self._file = open(self._path, 'a', encoding='utf-8')
+
+    def replay(self) -> int:
+        """Забирает журналы мертвых воркеров в свой буфер; возвращает число строк."""
+        with self._lock:
+            self._open()
+        replayed = 0
+        for path in glob.glob(os.path.join(self.journal_dir, "messages.*.jsonl")):
+            if path == self._path:
+                continue
+            lock = self._try_lock(path + ".lock")
+            if lock is None:
+                continue  # владелец жив
+            try:
+                rows = self._read_rows(path)
+                now = time.monotonic()
+                with self._lock:
+                    for row in rows:
+                        self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+                        self._pending.append((now, row))
+                    self._file.flush()
+                os.remove(path)
+                os.remove(path + ".lock")
+                replayed += len(rows)
+            except FileNotFoundError:
+                # Журнал одновременно забрал другой воркер; .lock мы могли создать заново
+                try:
+                    os.remove(path + ".lock")
+                except FileNotFoundError:
+                    pass
+            finally:
+                lock.close()
+        if replayed:
+            metrics.incr("journal.replayed", replayed)
+            logger.info(f"Replayed {replayed} unsaved message(s) from previous workers' journals.")
+            self._wakeup.set()
+        return replayed
+
+    # --- Запись ---
+
+    def start(self):
+        if self._thread is None:
+            with self._lock:
+                self._open()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="message-journal", daemon=True)
+            self._thread.start()
+            logger.info(f"Message journal started (batch {self.batch_size}, interval {self.flush_interval}s).")
+
+    def stop(self, timeout: float = 30):
+        """Останавливает поток после полного сброса буфера."""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+        with self._lock:
+            left = len(self._pending)
+        if left:
+            logger.error(f"Message journal stopped with {left} unsaved message(s); they stay in {self._path} for replay.")
+        else:
+            logger.info("Message journal flushed and stopped.")
+
+    def append(self, user_id: int, message: Message, client_id: int) -> bool:
+        """Ставит сообщение в очередь на запись; True — запись отложена. Без запущенного потока пишет сразу."""
+        if self._thread is None:
+            self.repo.save_message(user_id, message, client_id)
+            return False
+        row = {
+            'user_id': user_id, 'role': message.role, 'content': message.content, 'client_id': client_id,
+            # Время фиксируется здесь: у строк одной вставки now() в БД совпал бы
+            'created_at': datetime.now(timezone.utc).isoformat()
+        }
+        with self._lock:
+            self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self._pending.append((time.monotonic(), row))
+            size = len(self._pending)
+        metrics.set_gauge("journal.pending", size)
+        if size >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def pending_messages(self, user_id: int, client_id: int) -> List[Message]:
+        """Еще не записанные в БД сообщения пользователя (для чтения истории без задержки)."""
+        with self._lock:
+            return [
+                Message(role=row['role'], content=row['content'])
+                for _, row in self._pending
+                if row['user_id'] == user_id and row['client_id'] == client_id
+            ]
+
+    def flush(self) -> bool:
+        """Записывает все накопленное пачками по batch_size. False, если часть осталась."""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+            if not batch:
+                return True
+            started = time.monotonic()
+            confirmed = 0
+            for start in range(0, len(batch), self.batch_size):
+                part = batch[start:start + self.batch_size]
+                if not self.repo.save_messages_batch([row for _, row in part]):
+                    metrics.incr("journal.flush_errors")
+                    break
+                metrics.observe("journal.batch_size", len(part))
+                metrics.observe("journal.lag_ms", (time.monotonic() - part[0][0]) * 1000)
+                confirmed += len(part)
+                self._notify_confirmed([row for _, row in part])
+            if confirmed:
+                with self._lock:
+                    # Новые строки добавляются только в конец, поэтому подтверждена ровно голова буфера
+                    del self._pending[:confirmed]
+                    self._rewrite()
+                    size = len(self._pending)
+                metrics.set_gauge("journal.pending", size)
+                metrics.observe("journal.flush_ms", (time.monotonic() - started) * 1000)
+            return confirmed == len(batch)
+
+    def _notify_confirmed(self, rows: List[Dict[str, Any]]):
+        if self.on_confirmed is None:
+            return
+        try:
+            self.on_confirmed([(row['client_id'], row['user_id']) for row in rows])
+        except Exception as e:
+            logger.error(f"Message journal confirmation callback failed: {e}", exc_info=True)
+
+    def _run(self):
+        failures = 0
+        while not self._stopping:
+            # После неудачной записи ждем дольше, чтобы не долбить недоступную БД
+            self._wakeup.wait(self.flush_interval * min(2 ** failures, 30))
+            self._wakeup.clear()
+            try:
+                failures = 0 if self.flush() else failures + 1
+            except Exception as e:
+                failures += 1
+                logger.error(f"Message journal flush failed: {e}", exc_info=True)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Final message journal flush failed: {e}", exc_info=True)
+
+# END OF FILE: src/infra/storage/message_journal.py
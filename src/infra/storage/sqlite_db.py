@@ -0,0 +1,53 @@
+# START OF FILE: src/infra/storage/sqlite_db.py
+
+import os
+import sqlite3
+import threading
+
+class SQLiteDB:
+    """
+    Локальная SQLite-база в режиме WAL, общая для всех воркеров Gunicorn на одной машине.
+    Каждый поток получает собственное соединение; запись сериализуется самой SQLite.
+    """
+    def __init__(self, db_path: str, schema: str = ""):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        if schema:
+            self.connection().executescript(schema)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        return self.connection().execute(sql, params)
+
+    def transaction(self) -> "_Transaction":
+        """Контекстный менеджер для BEGIN IMMEDIATE ... COMMIT/ROLLBACK."""
+        return _Transaction(self.connection())
+
+class _Transaction:
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
+
+# END OF FILE: src/infra/storage/sqlite_db.py
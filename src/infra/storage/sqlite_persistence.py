@@ -0,0 +1,224 @@
+# START OF FILE: src/infra/storage/sqlite_persistence.py
+
+import asyncio
+import copy
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from src.infra.storage.sqlite_db import SQLiteDB
+from src.shared.logger import logger
+from src.shared.metrics import metrics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_data (
+    namespace TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (namespace, user_id)
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    namespace TEXT NOT NULL,
+    name TEXT NOT NULL,
+    conv_key TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (namespace, name, conv_key)
+);
+CREATE TABLE IF NOT EXISTS shared_values (
+    namespace TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (namespace, name)
+);
+"""
+
+ConversationKey = Tuple[int, ...]
+# (SQL, параметры, необязательный обработчик строки, возвращенной RETURNING)
+_WriteOp = Tuple[str, tuple, Optional[Callable[[tuple], None]]]
+
+class SQLitePersistence(BasePersistence):
+    """
+    Persistence для PTB на локальной SQLite (WAL), общая для всех воркеров Gunicorn.
+    Хранит user_data и состояния ConversationHandler в пространстве имен клиента (client_id).
+
+    Записи, накопленные за один проход Application.update_persistence, объединяются
+    в одну транзакцию. Чтение идет через in-process кэш с проверкой версии строки,
+    так что JSON декодируется заново только если данные менял другой воркер.
+    bot_data не сохраняется (там лежат сервисы), для общих значений есть save_shared_value.
+    """
+    def __init__(self, db_path: str, namespace: Any, update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.db = SQLiteDB(db_path, _SCHEMA)
+        self.namespace = str(namespace)
+        self._user_cache: Dict[int, Tuple[int, Dict]] = {}
+        self._pending: Dict[Tuple, _WriteOp] = {}
+        self._flush_future: Optional[asyncio.Future] = None
+
+    # --- Загрузка при старте: данные подтягиваются лениво, по мере прихода апдейтов ---
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, Dict]:
+        return {}
+
+    async def get_bot_data(self) -> Dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[ConversationKey, object]:
+        return {}
+
+    # --- Чтение ---
+
+    def load_conversation_states(self, keys: List[Tuple[str, ConversationKey]]) -> Dict[Tuple[str, ConversationKey], object]:
+        """Состояния нескольких диалогов (имя обработчика, ключ) одним запросом; завершенных в ответе нет."""
+        if not keys:
+            return {}
+        encoded = {(name, json.dumps(key)): (name, key) for name, key in keys}
+        rows = self.db.execute(
+            "SELECT name, conv_key, state FROM conversations WHERE namespace = ? AND (name, conv_key) IN (VALUES "
+            + ", ".join("(?, ?)" for _ in encoded) + ")",
+            (self.namespace, *(value for pair in encoded for value in pair))
+        ).fetchall()
+        return {encoded[(name, conv_key)]: json.loads(state) for name, conv_key, state in rows}
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict) -> None:
+        row = await asyncio.to_thread(
+            lambda: self.db.execute(
+                "SELECT version, data FROM user_data WHERE namespace = ? AND user_id = ?",
+                (self.namespace, user_id)
+            ).fetchone()
+        )
+        if row is None:
+            self._user_cache.pop(user_id, None)
+            user_data.clear()
+            return
+        version, raw = row
+        cached = self._user_cache.get(user_id)
+        if cached and cached[0] == version:
+            metrics.incr("state.cache_hits")
+            if user_data == cached[1]:
+                return
+            data = cached[1]
+        else:
+            metrics.incr("state.cache_misses")
+            data = json.loads(raw)
+            self._user_cache[user_id] = (version, data)
+        user_data.clear()
+        user_data.update(copy.deepcopy(data))
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict) -> None:
+        pass
+
+    async def load_shared_value(self, name: str) -> Optional[Any]:
+        row = await asyncio.to_thread(
+            lambda: self.db.execute(
+                "SELECT data FROM shared_values WHERE namespace = ? AND name = ?",
+                (self.namespace, name)
+            ).fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    # --- Запись (с объединением в одну транзакцию) ---
+
+    async def update_user_data(self, user_id: int, data: Dict) -> None:
+        cached = self._user_cache.get(user_id)
+        if cached and cached[1] == data:
+            return
+
+        def remember_version(row: tuple):
+            self._user_cache[user_id] = (row[0], data)
+
+        await self._stage(('user', user_id), (
+            "INSERT INTO user_data (namespace, user_id, data, version) VALUES (?, ?, ?, 1) "
+            "ON CONFLICT (namespace, user_id) DO UPDATE SET data = excluded.data, version = user_data.version + 1 "
+            "RETURNING version",
+            (self.namespace, user_id, json.dumps(data, ensure_ascii=False)),
+            remember_version
+        ))
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._user_cache.pop(user_id, None)
+        await self._stage(('user', user_id), (
+            "DELETE FROM user_data WHERE namespace = ? AND user_id = ?",
+            (self.namespace, user_id),
+            None
+        ))
+
+    async def update_conversation(self, name: str, key: ConversationKey, new_state: Optional[object]) -> None:
+        conv_key = json.dumps(key)
+        if new_state is None:
+            op = ("DELETE FROM conversations WHERE namespace = ? AND name = ? AND conv_key = ?",
+                  (self.namespace, name, conv_key), None)
+        else:
+            op = ("INSERT OR REPLACE INTO conversations (namespace, name, conv_key, state) VALUES (?, ?, ?, ?)",
+                  (self.namespace, name, conv_key, json.dumps(new_state)), None)
+        await self._stage(('conv', name, conv_key), op)
+
+    async def save_shared_value(self, name: str, value: Any) -> None:
+        await self._stage(('shared', name), (
+            "INSERT OR REPLACE INTO shared_values (namespace, name, data) VALUES (?, ?, ?)",
+            (self.namespace, name, json.dumps(value, ensure_ascii=False, default=str)),
+            None
+        ))
+
+    async def update_chat_data(self, chat_id: int, data: Dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def update_bot_data(self, data: Dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def _stage(self, key: Tuple, op: _WriteOp) -> None:
+        """
+        Ставит запись в очередь. Все записи, поставленные в одной итерации event loop
+        (например, из asyncio.gather в update_persistence), уходят одной транзакцией.
+        """
+        self._pending[key] = op
+        if self._flush_future is None:
+            loop = asyncio.get_running_loop()
+            self._flush_future = loop.create_future()
+            loop.call_soon(lambda: asyncio.ensure_future(self._flush_pending()))
+        await asyncio.shield(self._flush_future)
+
+    async def _flush_pending(self) -> None:
+        future, self._flush_future = self._flush_future, None
+        ops, self._pending = list(self._pending.values()), {}
+        try:
+            await asyncio.to_thread(self._write_ops, ops)
+            metrics.observe("state.batch_size", len(ops))
+            future.set_result(None)
+        except Exception as e:
+            logger.error(f"Failed to persist {len(ops)} state change(s): {e}", exc_info=True)
+            future.set_exception(e)
+
+    def _write_ops(self, ops):
+        with self.db.transaction() as conn:
+            for sql, params, on_result in ops:
+                cursor = conn.execute(sql, params)
+                if on_result is not None:
+                    row = cursor.fetchone()
+                    if row is not None:
+                        on_result(row)
+
+    async def flush(self) -> None:
+        if self._flush_future is not None:
+            await asyncio.shield(self._flush_future)
+
+# END OF FILE: src/infra/storage/sqlite_persistence.py
@@ -0,0 +1,98 @@
+# START OF FILE: src/infra/storage/update_dedup.py
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+from src.infra.storage.sqlite_db import SQLiteDB
+from src.shared.logger import logger
+from src.shared.metrics import metrics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS processed_updates (
+    bot_key TEXT NOT NULL,
+    update_id INTEGER NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (bot_key, update_id)
+);
+CREATE INDEX IF NOT EXISTS idx_processed_updates_seen ON processed_updates (seen_at);
+"""
+
+# Как часто (в секундах) чистить устаревшие записи в общей таблице
+_PRUNE_INTERVAL = 60
+
+class UpdateDeduplicator:
+    """
+    Отсекает повторные доставки апдейтов Telegram по паре (бот, update_id).
+    Общий для воркеров реестр хранится в локальной SQLite, перед ним — небольшой
+    in-process LRU, чтобы частые повторы не доходили до диска.
+    """
+    def __init__(self, db_path: str, ttl_seconds: int = 3600, max_entries: int = 100_000):
+        self.db = SQLiteDB(db_path, _SCHEMA)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._recent: "OrderedDict[Tuple[str, int], float]" = OrderedDict()
+        self._recent_limit = min(max_entries, 10_000)
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    @staticmethod
+    def bot_key(bot_token: str) -> str:
+        """Ключ бота без секретной части токена."""
+        return bot_token.split(':', 1)[0]
+
+    def is_duplicate(self, bot_key: str, update_id: int) -> bool:
+        """Регистрирует апдейт и возвращает True, если он уже был получен в пределах TTL."""
+        now = time.time()
+        key = (bot_key, update_id)
+        with self._lock:
+            seen_at = self._recent.get(key)
+            if seen_at is not None and now - seen_at < self.ttl_seconds:
+                metrics.incr("dedup.hits")
+                return True
+
+        cursor = self.db.execute(
+            "INSERT INTO processed_updates (bot_key, update_id, seen_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (bot_key, update_id) DO UPDATE SET seen_at = excluded.seen_at "
+            "WHERE processed_updates.seen_at < ?",
+            (bot_key, update_id, now, now - self.ttl_seconds)
+        )
+        duplicate = cursor.rowcount == 0
+        with self._lock:
+            self._recent[key] = now if not duplicate else self._recent.get(key, now)
+            self._recent.move_to_end(key)
+            while len(self._recent) > self._recent_limit:
+                self._recent.popitem(last=False)
+        metrics.incr("dedup.hits" if duplicate else "dedup.misses")
+        if now - self._last_prune > _PRUNE_INTERVAL:
+            self._last_prune = now
+            self.prune(now)
+        return duplicate
+
+    def forget(self, bot_key: str, update_id: int):
+        """
+        Снимает регистрацию апдейта, который не удалось принять в обработку: повторная
+        доставка от Telegram не должна быть отброшена как дубликат.
+        """
+        with self._lock:
+            self._recent.pop((bot_key, update_id), None)
+        self.db.execute("DELETE FROM processed_updates WHERE bot_key = ? AND update_id = ?", (bot_key, update_id))
+        metrics.incr("dedup.released")
+
+    def prune(self, now: float = None):
+        """Удаляет записи старше TTL и ограничивает размер таблицы max_entries."""
+        now = now or time.time()
+        try:
+            with self.db.transaction() as conn:
+                conn.execute("DELETE FROM processed_updates WHERE seen_at < ?", (now - self.ttl_seconds,))
+                conn.execute(
+                    "DELETE FROM processed_updates WHERE rowid IN ("
+                    "  SELECT rowid FROM processed_updates ORDER BY seen_at DESC LIMIT -1 OFFSET ?"
+                    ")",
+                    (self.max_entries,)
+                )
+        except Exception as e:
+            logger.error(f"Failed to prune processed updates: {e}", exc_info=True)
+
+# END OF FILE: src/infra/storage/update_dedup.py
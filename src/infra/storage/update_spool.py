@@ -0,0 +1,283 @@
+# START OF FILE: src/infra/storage/update_spool.py
+
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from src.infra.storage.sqlite_db import SQLiteDB
+from src.shared.logger import logger
+from src.shared.metrics import metrics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS update_spool (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    bot_token TEXT NOT NULL,
+    update_id INTEGER NOT NULL,
+    chat_key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    received_at REAL NOT NULL,
+    claimed_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_update_spool_chat ON update_spool (bot_token, chat_key, id);
+CREATE INDEX IF NOT EXISTS idx_update_spool_status ON update_spool (status, id);
+"""
+
+@dataclass
+class SpooledUpdate:
+    id: int
+    bot_token: str
+    update_id: int
+    payload: dict
+    received_at: float
+
+class UpdateSpool:
+    """
+    Долговременная очередь входящих апдейтов в локальной SQLite (WAL), общая для воркеров.
+    Апдейты одного чата выдаются строго по порядку: следующий апдейт чата становится
+    доступен только после подтверждения (ack) предыдущего.
+
+    Захват апдейта — аренда на lease_seconds: пока апдейт в работе, владелец продлевает
+    ее через renew, иначе апдейт считается брошенным и достается другому воркеру.
+    Апдейт, обработка которого упала, возвращается в очередь через fail; после
+    max_attempts попыток он остается в спуле со статусом failed и больше не блокирует чат.
+    """
+    def __init__(self, db_path: str, lease_seconds: int = 300, max_attempts: int = 3):
+        self.db = SQLiteDB(db_path, _SCHEMA)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._migrate()
+
+    def _migrate(self):
+        """Спулы, созданные до появления счетчика попыток, получают колонку attempts."""
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(update_spool)").fetchall()}
+        if 'attempts' not in columns:
+            try:
+                self.db.execute("ALTER TABLE update_spool ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass  # колонку одновременно добавил другой воркер
+
+    def append(self, bot_token: str, update_id: int, chat_id: Optional[int], payload: dict) -> int:
+        # Апдейты без чата (например, inline-запросы) не упорядочиваются между собой
+        chat_key = str(chat_id) if chat_id is not None else f"update:{update_id}"
+        cursor = self.db.execute(
+            "INSERT INTO update_spool (bot_token, update_id, chat_key, payload, received_at) VALUES (?, ?, ?, ?, ?)",
+            (bot_token, update_id, chat_key, json.dumps(payload, ensure_ascii=False), time.time())
+        )
+        return cursor.lastrowid
+
+    def claim_batch(self, limit: int) -> List[SpooledUpdate]:
+        """Забирает в обработку головные апдейты чатов, у которых нет апдейта в работе."""
+        if limit <= 0:
+            return []
+        now = time.time()
+        with self.db.transaction() as conn:
+            conn.execute(
+                "UPDATE update_spool SET status = 'pending', owner = NULL, claimed_at = NULL "
+                "WHERE status = 'processing' AND claimed_at < ?",
+                (now - self.lease_seconds,)
+            )
+            rows = conn.execute(
+                "SELECT s.id, s.bot_token, s.update_id, s.payload, s.received_at FROM update_spool s "
+                "WHERE s.status = 'pending' AND s.id = ("
+                "  SELECT MIN(t.id) FROM update_spool t"
+                "  WHERE t.bot_token = s.bot_token AND t.chat_key = s.chat_key AND t.status != 'failed'"
+                ") ORDER BY s.id LIMIT ?",
+                (limit,)
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE update_spool SET status = 'processing', owner = ?, claimed_at = ? WHERE id = ?",
+                    [(self.owner, now, row[0]) for row in rows]
+                )
+        return [
+            SpooledUpdate(id=row[0], bot_token=row[1], update_id=row[2], payload=json.loads(row[3]), received_at=row[4])
+            for row in rows
+        ]
+
+    def ack(self, spool_id: int):
+        self.db.execute("DELETE FROM update_spool WHERE id = ?", (spool_id,))
+
+    def renew(self, spool_ids: List[int]) -> int:
+        """Продлевает аренду апдейтов, которые этот процесс еще обрабатывает; возвращает число продленных."""
+        if not spool_ids:
+            return 0
+        now = time.time()
+        with self.db.transaction() as conn:
+            return sum(
+                conn.execute(
+                    "UPDATE update_spool SET claimed_at = ? WHERE id = ? AND owner = ? AND status = 'processing'",
+                    (now, spool_id, self.owner)
+                ).rowcount
+                for spool_id in spool_ids
+            )
+
+    def fail(self, spool_id: int) -> bool:
+        """
+        Возвращает апдейт с упавшей обработкой в очередь и увеличивает счетчик попыток.
+        False — попытки исчерпаны (апдейт помечен failed) или аренду уже забрал другой воркер.
+        """
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts FROM update_spool WHERE id = ? AND owner = ? AND status = 'processing'",
+                (spool_id, self.owner)
+            ).fetchone()
+            if row is None:
+                return False
+            attempts = row[0] + 1
+            status = 'pending' if attempts < self.max_attempts else 'failed'
+            conn.execute(
+                "UPDATE update_spool SET status = ?, owner = NULL, claimed_at = NULL, attempts = ? WHERE id = ?",
+                (status, attempts, spool_id)
+            )
+        return status == 'pending'
+
+    def release(self, spool_ids: List[int]):
+        """Возвращает незавершенные апдейты в очередь (например, при остановке воркера)."""
+        if spool_ids:
+            self.db.connection().executemany(
+                "UPDATE update_spool SET status = 'pending', owner = NULL, claimed_at = NULL WHERE id = ?",
+                [(spool_id,) for spool_id in spool_ids]
+            )
+
+    def recover_orphans(self) -> int:
+        """Освобождает апдейты, захваченные уже несуществующими процессами на этой машине."""
+        host = socket.gethostname()
+        owners = [row[0] for row in self.db.execute(
+            "SELECT DISTINCT owner FROM update_spool WHERE status = 'processing' AND owner IS NOT NULL"
+        ).fetchall()]
+        released = 0
+        for owner in owners:
+            owner_host, _, pid = owner.rpartition(':')
+            if owner_host != host or owner == self.owner or _pid_alive(int(pid)):
+                continue
+            cursor = self.db.execute(
+                "UPDATE update_spool SET status = 'pending', owner = NULL, claimed_at = NULL "
+                "WHERE status = 'processing' AND owner = ?",
+                (owner,)
+            )
+            released += cursor.rowcount
+        return released
+
+    def pending_count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM update_spool WHERE status != 'failed'").fetchone()[0]
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class SpoolConsumer:
+    """Фоновая задача воркера, которая вычитывает спул и передает апдейты в обработку."""
+    def __init__(
+        self,
+        spool: UpdateSpool,
+        handler: Callable[[SpooledUpdate], Awaitable[None]],
+        max_in_flight: int = 32,
+        poll_interval: float = 0.5
+    ):
+        self.spool = spool
+        self.handler = handler
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self._in_flight: Dict[asyncio.Task, int] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def start(self):
+        released = self.spool.recover_orphans()
+        if released:
+            logger.warning(f"Recovered {released} spooled update(s) left by a dead worker.")
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Spool consumer started (owner {self.spool.owner}).")
+
+    def notify(self):
+        """Будит потребителя сразу после записи нового апдейта в спул."""
+        self._wakeup.set()
+
+    async def _renew_leases(self):
+        """Продлевает аренду апдейтов в работе: ожидание блокировки чата или LLM не должно ее истечь."""
+        spool_ids = list(self._in_flight.values())
+        if not spool_ids:
+            return
+        try:
+            renewed = await asyncio.to_thread(self.spool.renew, spool_ids)
+        except Exception as e:
+            logger.error(f"Failed to renew spool leases: {e}", exc_info=True)
+            return
+        if renewed < len(spool_ids):
+            logger.warning(f"Lost the lease on {len(spool_ids) - renewed} spooled update(s); another worker may process them again.")
+
+    async def _run(self):
+        last_renewal = time.monotonic()
+        while not self._stopping:
+            self._wakeup.clear()
+            if time.monotonic() - last_renewal >= self.spool.lease_seconds / 3:
+                await self._renew_leases()
+                last_renewal = time.monotonic()
+            capacity = self.max_in_flight - len(self._in_flight)
+            try:
+                items = await asyncio.to_thread(self.spool.claim_batch, capacity)
+            except Exception as e:
+                logger.error(f"Failed to claim updates from spool: {e}", exc_info=True)
+                items = []
+            for item in items:
+                task = asyncio.create_task(self._process(item))
+                self._in_flight[task] = item.id
+                task.add_done_callback(self._on_done)
+            if items and len(items) == capacity:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _process(self, item: SpooledUpdate):
+        metrics.observe("spool.lag_ms", (time.time() - item.received_at) * 1000)
+        try:
+            await self.handler(item)
+        except Exception as e:
+            logger.error(f"Error processing spooled update {item.update_id}: {e}", exc_info=True)
+            metrics.incr("spool.failed")
+            if not await asyncio.to_thread(self.spool.fail, item.id):
+                logger.error(f"Spooled update {item.update_id} will not be retried: attempts exhausted or lease lost.")
+            return
+        await asyncio.to_thread(self.spool.ack, item.id)
+        metrics.incr("spool.processed")
+
+    def _on_done(self, task: asyncio.Task):
+        self._in_flight.pop(task, None)
+        # Освободился слот и, возможно, следующий апдейт того же чата
+        self._wakeup.set()
+
+    async def stop(self, timeout: float = 20):
+        """Дожидается текущих апдейтов, остальные возвращает в спул для других воркеров."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._task:
+            await self._task
+        if self._in_flight:
+            _, not_done = await asyncio.wait(list(self._in_flight), timeout=timeout)
+            unfinished = [self._in_flight[task] for task in not_done]
+            for task in not_done:
+                task.cancel()
+            await asyncio.gather(*not_done, return_exceptions=True)
+            await asyncio.to_thread(self.spool.release, unfinished)
+            if unfinished:
+                logger.warning(f"Released {len(unfinished)} unfinished spooled update(s) back to the spool.")
+        logger.info("Spool consumer stopped.")
+
+# END OF FILE: src/infra/storage/update_spool.py
@@ -5,6 +5,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 # --- API Keys ---
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
 SUPABASE_URL = os.getenv('SUPABASE_URL')
@@ -14,9 +16,92 @@ GOOGLE_CREDENTIALS_JSON = os.getenv('GOOGLE_CREDENTIALS_JSON')
 
 # --- AI Models & APIs ---
 LLM_MODEL_NAME = os.getenv('LLM_MODEL_NAME', "tngtech/deepseek-r1t2-chimera:free")
+# Модель для коротких ответов (маршруты offtopic и cost); по умолчанию та же, что и основная —
+# тогда и лимиты у этих маршрутов как у основной (1024 токена, LLM_REQUEST_TIMEOUT)
+LLM_FAST_MODEL_NAME = os.getenv('LLM_FAST_MODEL_NAME', LLM_MODEL_NAME)
+LLM_FAST_TIMEOUT = float(os.getenv('LLM_FAST_TIMEOUT', 20))  # применяется, только если LLM_FAST_MODEL_NAME задана отдельно
+# JSON с переопределениями маршрутов, например {"cost": {"max_tokens": 300}}; см. ModelRouter
+LLM_ROUTES = os.getenv('LLM_ROUTES', '')
 OPENROUTER_API_URL = "https://openrouter.ai/api/v1"
 STT_API_URL = "https://api-inference.huggingface.co/models/openai/whisper-large-v3"
 
+# --- LLM Client Pool ---
+# Общий пул соединений и ограничение числа одновременных запросов к OpenRouter на воркер
+LLM_REQUEST_TIMEOUT = float(os.getenv('LLM_REQUEST_TIMEOUT', 60))
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', 10))
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 32))
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', 64))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 1))
+
+# --- FAQ Index ---
+# Мгновенные ответы по ключевым словам data/faq.json
+FAQ_INDEX_ENABLED = os.getenv('FAQ_INDEX_ENABLED', 'true').lower() == 'true'
+FAQ_FILE_PATH = os.getenv('FAQ_FILE_PATH', os.path.join(PROJECT_ROOT, 'data', 'faq.json'))
+# Двусторонняя уверенность, при которой отдаем ответ из FAQ без LLM (см. scripts/benchmark_faq_index.py)
+FAQ_DIRECT_ANSWER_CONFIDENCE = float(os.getenv('FAQ_DIRECT_ANSWER_CONFIDENCE', 0.8))
+# Минимум совпавших лемм для прямого ответа: короткий запрос ("ипотека") отвечает LLM
+FAQ_DIRECT_ANSWER_MIN_LEMMAS = int(os.getenv('FAQ_DIRECT_ANSWER_MIN_LEMMAS', 3))
+# Доля вопроса пользователя, покрытая ключами записи, при которой запись FAQ добавляется в промпт как справочный материал
+FAQ_GROUNDING_CONFIDENCE = float(os.getenv('FAQ_GROUNDING_CONFIDENCE', 0.4))
+
+# --- Prompt Budget ---
+# Оценочный лимит токенов промпта: системный промпт и вопрос входят всегда, фрагменты базы
+# знаний и старые сообщения истории отбрасываются по приоритету, если не помещаются
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', 6000))
+
+# --- Intent Classifier ---
+# Локальная модель категорий запроса; LLM — только при низкой уверенности. Модель в репозитории
+# не хранится: ее обучение — шаг развертывания (python scripts/train_intent_classifier.py на машине
+# с доступом к БД и OpenRouter, затем файл кладется в data/ до сборки образа или на INTENT_MODEL_PATH).
+# Без модели выбор маршрута модели (ModelRouter) не знает категорию и отправляет все вопросы в "general"
+INTENT_MODEL_PATH = os.getenv('INTENT_MODEL_PATH', os.path.join(PROJECT_ROOT, 'data', 'intent_model.json'))
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv('INTENT_CONFIDENCE_THRESHOLD', 0.7))
+
+# --- Response Cache ---
+# Кэш ответов на типовые вопросы (только для первого вопроса без истории и квиза)
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 500))
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 86400))
+
+# --- Streaming Replies ---
+# Ответ показывается по мере генерации; правки сообщения не чаще STREAM_EDIT_INTERVAL секунд
+STREAM_REPLIES_ENABLED = os.getenv('STREAM_REPLIES_ENABLED', 'true').lower() == 'true'
+STREAM_EDIT_INTERVAL = float(os.getenv('STREAM_EDIT_INTERVAL', 1.5))
+
+# --- RAG ---
+# Поиск по knowledge_base клиента в памяти воркера (матрица эмбеддингов из локального кэша)
+RAG_ENABLED = os.getenv('RAG_ENABLED', 'true').lower() == 'true'
+EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', 'cointegrated/rubert-tiny2')
+# Микробатчинг: вопросы, пришедшие в пределах окна, кодируются моделью одним вызовом
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv('EMBEDDING_BATCH_MAX_SIZE', 32))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv('EMBEDDING_BATCH_MAX_WAIT_MS', 5))
+RAG_TOP_K = int(os.getenv('RAG_TOP_K', 3))
+RAG_MATCH_THRESHOLD = float(os.getenv('RAG_MATCH_THRESHOLD', 0.5))
+# Как часто пересобирать локальный кэш эмбеддингов из БД
+VECTOR_CACHE_REFRESH_INTERVAL = int(os.getenv('VECTOR_CACHE_REFRESH_INTERVAL', 3600))
+# int8-копия матрицы для первого прохода поиска (~4x меньше памяти), кандидаты пересчитываются по float32 с диска.
+# Выключено по умолчанию: потеря recall измерена только на синтетических векторах, на реальных
+# эмбеддингах data/faq.json и data/bankruptcy_law.md — еще нет. Включать только после прогона
+# scripts/benchmark_retrieval.py с моделью EMBEDDING_MODEL_NAME, если "recall@k i8 - f32" не ниже нуля
+VECTOR_INDEX_QUANTIZED = os.getenv('VECTOR_INDEX_QUANTIZED', 'false').lower() == 'true'
+# IVF-индекс для баз от VECTOR_ANN_MIN_CHUNKS чанков (0 — всегда полный просмотр);
+# VECTOR_ANN_LISTS=0 — число кластеров sqrt(n), VECTOR_ANN_PROBE — сколько ближайших кластеров просматривать
+VECTOR_ANN_MIN_CHUNKS = int(os.getenv('VECTOR_ANN_MIN_CHUNKS', 50000))
+VECTOR_ANN_LISTS = int(os.getenv('VECTOR_ANN_LISTS', 0))
+VECTOR_ANN_PROBE = int(os.getenv('VECTOR_ANN_PROBE', 16))
+# Объединение векторного поиска и BM25: rrf | weighted | vector | bm25.
+# Без sentence-transformers (векторы запросов кодировать нечем) воркер переходит на bm25
+RAG_FUSION = os.getenv('RAG_FUSION', 'rrf').lower()
+# Вес векторной близости при RAG_FUSION=weighted (1 - вес достается BM25)
+RAG_HYBRID_ALPHA = float(os.getenv('RAG_HYBRID_ALPHA', 0.5))
+RAG_RRF_K = int(os.getenv('RAG_RRF_K', 60))
+# Сколько кандидатов берет каждый из методов перед объединением
+RAG_CANDIDATES = int(os.getenv('RAG_CANDIDATES', 20))
+# Минимальная доля максимально возможной BM25-оценки запроса, с которой лексический кандидат
+# участвует в объединении (аналог match_threshold для векторов). 0.15 на data/ почти не меняет
+# recall@3, но отсекает чанки, совпавшие с вопросом не по теме одним частым словом
+RAG_BM25_THRESHOLD = float(os.getenv('RAG_BM25_THRESHOLD', 0.15))
+
 # --- Deployment & Runtime ---
 RENDER_SERVICE_NAME = os.getenv('RENDER_SERVICE_NAME')
 PUBLIC_APP_URL = f"https://{RENDER_SERVICE_NAME}.onrender.com" if RENDER_SERVICE_NAME else "http://localhost"
@@ -24,6 +109,81 @@ PUBLIC_APP_URL = f"https://{RENDER_SERVICE_NAME}.onrender.com" if RENDER_SERVICE
 PORT = int(os.environ.get('PORT', 8443))
 RUN_MODE = os.getenv('RUN_MODE', 'WEBHOOK')
 
+# Каталог для локального состояния воркеров (SQLite-файлы, кэши).
+# На Render его нужно смонтировать на persistent disk, чтобы данные пережили деплой.
+LOCAL_STATE_DIR = os.getenv('LOCAL_STATE_DIR', os.path.join(PROJECT_ROOT, 'var'))
+VECTOR_CACHE_DIR = os.getenv('VECTOR_CACHE_DIR', os.path.join(LOCAL_STATE_DIR, 'vectors'))
+
+# --- Embedding Cache ---
+# Дисковый кэш эмбеддингов (model, sha256 текста), общий для воркеров и scripts/vectorize_knowledge_base.py
+EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true'
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', os.path.join(LOCAL_STATE_DIR, 'embeddings'))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', 200000))
+
+# --- Tenant Config Cache ---
+# Настройки клиентов (промпт, чек-лист, лид-магнит) кэшируются в воркере; версии в общей SQLite
+# позволяют всем воркерам увидеть изменение с /set_prompt или загрузки чек-листа на следующем апдейте
+TENANT_CONFIG_TTL = int(os.getenv('TENANT_CONFIG_TTL', 300))
+TENANT_CONFIG_DB_PATH = os.getenv('TENANT_CONFIG_DB_PATH', os.path.join(LOCAL_STATE_DIR, 'tenant_config.sqlite3'))
+
+# --- Message Journal ---
+# История диалогов пишется в messages в фоне пачками; до записи строки лежат в локальном журнале
+MESSAGE_JOURNAL_ENABLED = os.getenv('MESSAGE_JOURNAL_ENABLED', 'true').lower() == 'true'
+MESSAGE_JOURNAL_DIR = os.getenv('MESSAGE_JOURNAL_DIR', os.path.join(LOCAL_STATE_DIR, 'journal'))
+MESSAGE_JOURNAL_BATCH_SIZE = int(os.getenv('MESSAGE_JOURNAL_BATCH_SIZE', 50))
+MESSAGE_JOURNAL_FLUSH_INTERVAL = float(os.getenv('MESSAGE_JOURNAL_FLUSH_INTERVAL', 1.0))
+
+# --- Conversation Memory ---
+# Последние сообщения диалогов хранятся в памяти воркера; БД читается только при промахе.
+# Версии диалогов в общей SQLite отмечают буферы, устаревшие из-за записи в другом воркере
+CONVERSATION_MEMORY_ENABLED = os.getenv('CONVERSATION_MEMORY_ENABLED', 'true').lower() == 'true'
+CONVERSATION_MEMORY_MAX_MESSAGES = int(os.getenv('CONVERSATION_MEMORY_MAX_MESSAGES', 20))
+CONVERSATION_MEMORY_IDLE_TTL = int(os.getenv('CONVERSATION_MEMORY_IDLE_TTL', 1800))
+CONVERSATION_MEMORY_MAX_MB = int(os.getenv('CONVERSATION_MEMORY_MAX_MB', 64))
+CONVERSATION_MEMORY_DB_PATH = os.getenv('CONVERSATION_MEMORY_DB_PATH', os.path.join(LOCAL_STATE_DIR, 'conversation_memory.sqlite3'))
+
+# --- Conversation Summaries ---
+# Старые сообщения сворачиваются в сводку (users.conversation_summary) в фоне после каждых
+# CONVERSATION_SUMMARY_EVERY_TURNS ответов; последние KEEP_RECENT сообщений остаются несвернутыми.
+# В промпт дословно идут KEEP_RECENT + 2 * EVERY_TURNS последних сообщений — все более старые уже в сводке
+CONVERSATION_SUMMARY_ENABLED = os.getenv('CONVERSATION_SUMMARY_ENABLED', 'true').lower() == 'true'
+CONVERSATION_SUMMARY_EVERY_TURNS = int(os.getenv('CONVERSATION_SUMMARY_EVERY_TURNS', 3))
+CONVERSATION_SUMMARY_KEEP_RECENT = int(os.getenv('CONVERSATION_SUMMARY_KEEP_RECENT', 4))
+CONVERSATION_SUMMARY_MAX_BATCH = int(os.getenv('CONVERSATION_SUMMARY_MAX_BATCH', 30))
+CONVERSATION_SUMMARY_MAX_CHARS = int(os.getenv('CONVERSATION_SUMMARY_MAX_CHARS', 1500))
+CONVERSATION_SUMMARY_MAX_CONCURRENCY = int(os.getenv('CONVERSATION_SUMMARY_MAX_CONCURRENCY', 2))
+CONVERSATION_SUMMARY_DB_PATH = os.getenv('CONVERSATION_SUMMARY_DB_PATH', os.path.join(LOCAL_STATE_DIR, 'conversation_summary.sqlite3'))
+
+# --- Update Dispatching ---
+# CONCURRENT: апдейты разных чатов обрабатываются параллельно, одного чата — по порядку.
+# SEQUENTIAL: прежнее поведение, апдейт обрабатывается прямо в запросе вебхука.
+UPDATE_DISPATCH_MODE = os.getenv('UPDATE_DISPATCH_MODE', 'CONCURRENT').upper()
+UPDATE_CONCURRENCY_LIMIT = int(os.getenv('UPDATE_CONCURRENCY_LIMIT', 16))
+
+# --- Webhook Ingress ---
+# SYNC: вебхук отвечает 200 только после обработки апдейта.
+# SPOOL: апдейт сохраняется в локальный спул и сразу подтверждается, обработка идет в фоне.
+WEBHOOK_INGRESS_MODE = os.getenv('WEBHOOK_INGRESS_MODE', 'SPOOL').upper()
+SPOOL_DB_PATH = os.getenv('SPOOL_DB_PATH', os.path.join(LOCAL_STATE_DIR, 'update_spool.sqlite3'))
+SPOOL_MAX_IN_FLIGHT = int(os.getenv('SPOOL_MAX_IN_FLIGHT', 32))
+SPOOL_POLL_INTERVAL = float(os.getenv('SPOOL_POLL_INTERVAL', 0.5))
+# Аренда апдейта в работе; потребитель продлевает ее каждую треть срока, пока обработка идет
+SPOOL_LEASE_SECONDS = int(os.getenv('SPOOL_LEASE_SECONDS', 300))
+# Сколько раз повторять апдейт, обработка которого упала, прежде чем оставить его со статусом failed
+SPOOL_MAX_ATTEMPTS = int(os.getenv('SPOOL_MAX_ATTEMPTS', 3))
+
+# --- Shared Conversation State ---
+# user_data и состояния ConversationHandler хранятся в общей для воркеров SQLite
+STATE_PERSISTENCE_ENABLED = os.getenv('STATE_PERSISTENCE_ENABLED', 'true').lower() == 'true'
+STATE_DB_PATH = os.getenv('STATE_DB_PATH', os.path.join(LOCAL_STATE_DIR, 'bot_state.sqlite3'))
+
+# --- Update Deduplication ---
+# Повторные доставки одного и того же update_id отбрасываются до любой обработки
+UPDATE_DEDUP_ENABLED = os.getenv('UPDATE_DEDUP_ENABLED', 'true').lower() == 'true'
+UPDATE_DEDUP_DB_PATH = os.getenv('UPDATE_DEDUP_DB_PATH', os.path.join(LOCAL_STATE_DIR, 'update_dedup.sqlite3'))
+UPDATE_DEDUP_TTL = int(os.getenv('UPDATE_DEDUP_TTL', 3600))
+UPDATE_DEDUP_MAX_ENTRIES = int(os.getenv('UPDATE_DEDUP_MAX_ENTRIES', 100000))
+
 # --- Conversation States ---
 # Состояния для анкеты
 GET_NAME, GET_DEBT, GET_INCOME, GET_REGION = range(4)
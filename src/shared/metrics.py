@@ -0,0 +1,96 @@
+# START OF FILE: src/shared/metrics.py
+
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, Optional, Tuple, Any
+
+# Сколько последних наблюдений хранить для расчета перцентилей
+_SAMPLE_WINDOW = 512
+
+MetricKey = Tuple[str, Optional[int]]
+
+class _Timing:
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=_SAMPLE_WINDOW)
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def summary(self) -> Dict[str, float]:
+        ordered = sorted(self.samples)
+        p50 = ordered[len(ordered) // 2] if ordered else 0.0
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else 0.0
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "p50": p50,
+            "p95": p95,
+            "max": self.max,
+        }
+
+class Metrics:
+    """
+    Простой in-process реестр метрик воркера: счетчики, гейджи и тайминги.
+    Метрики могут быть глобальными или привязанными к клиенту (client_id).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[MetricKey, int] = defaultdict(int)
+        self._gauges: Dict[MetricKey, float] = {}
+        self._timings: Dict[MetricKey, _Timing] = defaultdict(_Timing)
+        self.started_at = time.time()
+
+    def incr(self, name: str, value: int = 1, client_id: Optional[int] = None):
+        with self._lock:
+            self._counters[(name, client_id)] += value
+
+    def set_gauge(self, name: str, value: float, client_id: Optional[int] = None):
+        with self._lock:
+            self._gauges[(name, client_id)] = value
+
+    def observe(self, name: str, value: float, client_id: Optional[int] = None):
+        with self._lock:
+            self._timings[(name, client_id)].add(value)
+
+    def get_counter(self, name: str, client_id: Optional[int] = None) -> int:
+        return self._counters.get((name, client_id), 0)
+
+    def snapshot(self, client_id: Optional[int] = None) -> Dict[str, Any]:
+        """Возвращает глобальные метрики и метрики указанного клиента."""
+        wanted = {None, client_id}
+        with self._lock:
+            return {
+                "counters": {name: v for (name, cid), v in self._counters.items() if cid in wanted},
+                "gauges": {name: v for (name, cid), v in self._gauges.items() if cid in wanted},
+                "timings": {name: t.summary() for (name, cid), t in self._timings.items() if cid in wanted},
+            }
+
+    def format_report(self, client_id: Optional[int] = None) -> str:
+        """Форматирует снимок метрик в HTML для админ-панели."""
+        snap = self.snapshot(client_id)
+        lines = [f"<b>--- 📈 Метрики воркера (Клиент ID: {client_id}) ---</b>"]
+        for name, value in sorted(snap["counters"].items()):
+            lines.append(f"<b>{name}:</b> {value}")
+        for name, value in sorted(snap["gauges"].items()):
+            lines.append(f"<b>{name}:</b> {value:g}")
+        for name, t in sorted(snap["timings"].items()):
+            lines.append(
+                f"<b>{name}:</b> n={t['count']} avg={t['avg']:.1f} p50={t['p50']:.1f} "
+                f"p95={t['p95']:.1f} max={t['max']:.1f}"
+            )
+        if len(lines) == 1:
+            lines.append("<i>Нет данных</i>")
+        return "\n".join(lines)
+
+metrics = Metrics()
+
+# END OF FILE: src/shared/metrics.py
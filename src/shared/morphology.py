@@ -0,0 +1,62 @@
+# START OF FILE: src/shared/morphology.py
+
+import re
+import threading
+from functools import lru_cache
+from typing import List, Optional
+
+import pymorphy3
+
+_TOKEN_RE = re.compile(r"[а-яa-z0-9]+")
+
+# Служебные слова и вежливые "обертки" вопроса (в нормальной форме).
+# Отрицание "не", вопросительные слова ("сколько", "когда", "как") и предлоги, меняющие смысл
+# ("без", "через", "до", "после", "при", "для", "от", "с", "за", "против"), намеренно оставлены:
+# "банкротство без суда" и "банкротство через суд" — разные вопросы.
+STOPWORDS = frozenset({
+    "и", "а", "но", "или", "да", "же", "ли", "бы", "то", "вот", "ну", "ведь", "уж", "ж",
+    "в", "во", "на", "к", "ко", "у", "о", "об", "из", "по",
+    "я", "ты", "он", "она", "оно", "мы", "вы", "они", "себя", "мой", "твой", "ваш", "наш", "свой",
+    "этот", "тот", "весь", "это", "так", "там", "тут", "здесь", "очень", "просто", "еще", "уже",
+    "быть", "есть", "пожалуйста", "здравствуйте", "добрый", "подсказать", "сказать", "скажите",
+    "хотеть", "интересовать", "вопрос",
+})
+
+_morph: Optional[pymorphy3.MorphAnalyzer] = None
+_morph_lock = threading.Lock()
+
+def _get_morph() -> pymorphy3.MorphAnalyzer:
+    global _morph
+    if _morph is None:
+        with _morph_lock:
+            if _morph is None:
+                _morph = pymorphy3.MorphAnalyzer()
+    return _morph
+
+def tokenize(text: str) -> List[str]:
+    """Разбивает текст на слова в нижнем регистре без пунктуации (ё приводится к е)."""
+    return _TOKEN_RE.findall(text.lower().replace('ё', 'е'))
+
+@lru_cache(maxsize=100_000)
+def lemmatize(word: str) -> str:
+    """Нормальная форма слова по pymorphy3 (результат кэшируется)."""
+    if not word.isalpha():
+        return word
+    return _get_morph().parse(word)[0].normal_form.replace('ё', 'е')
+
+def lemmas(text: str, drop_stopwords: bool = True) -> List[str]:
+    """Токенизирует и лемматизирует текст, по умолчанию убирая стоп-слова."""
+    result = [lemmatize(token) for token in tokenize(text)]
+    if drop_stopwords:
+        result = [lemma for lemma in result if lemma not in STOPWORDS]
+    return result
+
+def normalize_question(text: str) -> str:
+    """
+    Канонический вид вопроса для сравнения "почти одинаковых" формулировок: леммы без
+    стоп-слов в исходном порядке. Порядок и повторы сохраняются, чтобы вопросы из одних
+    и тех же слов с разным смыслом ("до банкротства" / "банкротства до") не совпадали.
+    """
+    return " ".join(lemmas(text))
+
+# END OF FILE: src/shared/morphology.py
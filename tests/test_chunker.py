@@ -0,0 +1,42 @@
+import json
+from pathlib import Path
+
+from src.app.parsing.chunker import estimate_tokens, iter_chunks, iter_json_array, window_text
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+def test_markdown_chunks_fit_the_limit_with_heading_path():
+    for name in ("bankruptcy_law.md", "interviews.md"):
+        chunks = list(iter_chunks(str(DATA_DIR / name), max_tokens=256))
+        assert chunks
+        assert max(estimate_tokens(chunk.content) for chunk in chunks) <= 256, name
+        for chunk in chunks:
+            if chunk.metadata["headings"]:
+                assert chunk.content.startswith(chunk.metadata["headings"] + "\n\n")
+
+def test_long_heading_path_is_shortened_instead_of_overflowing(tmp_path):
+    path = tmp_path / "doc.md"
+    heading = " ".join(f"слово{i}" for i in range(30))
+    path.write_text(f"# {heading}\n\n" + " ".join(f"текст{i}." for i in range(100)), encoding='utf-8')
+
+    chunks = list(iter_chunks(str(path), max_tokens=20, overlap_tokens=5))
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk.content) <= 20 for chunk in chunks)
+    assert all(chunk.content.startswith("… ") and "слово29" in chunk.content for chunk in chunks)
+
+def test_windows_overlap_and_cover_the_text():
+    paragraphs = [" ".join(f"p{p}w{w}" for w in range(10)) for p in range(10)]
+    windows = list(window_text("\n\n".join(paragraphs), max_tokens=30, overlap_tokens=10))
+
+    assert all(estimate_tokens(window) <= 30 for window in windows)
+    for previous, current in zip(windows, windows[1:]):
+        assert previous.split("\n\n")[-1] == current.split("\n\n")[0]
+    covered = {paragraph for window in windows for paragraph in window.split("\n\n")}
+    assert covered == set(paragraphs)
+
+def test_json_array_is_streamed_in_small_reads():
+    path = DATA_DIR / "faq.json"
+    with open(path, 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+    assert list(iter_json_array(str(path), read_size=64)) == expected
+    assert len(list(iter_chunks(str(path)))) == len(expected)
@@ -0,0 +1,78 @@
+import asyncio
+
+from src.app.memory.conversation_memory import ConversationMemory
+from src.app.services.ai_service import AIService
+from src.domain.models import Message
+from src.infra.storage.message_journal import MessageJournal
+
+class FakeRepo:
+    """Таблица messages в памяти, общая для всех воркеров."""
+    def __init__(self):
+        self.rows = []
+
+    def save_message(self, user_id, message, client_id):
+        self.rows.append({'user_id': user_id, 'role': message.role, 'content': message.content, 'client_id': client_id})
+
+    def save_messages_batch(self, rows):
+        self.rows.extend(rows)
+        return True
+
+    def get_recent_messages(self, user_id, client_id, limit=4):
+        messages = [
+            Message(role=row['role'], content=row['content'])
+            for row in self.rows if row['user_id'] == user_id and row['client_id'] == client_id
+        ]
+        return messages[-limit:]
+
+def make_worker(repo, db_path, journal_dir=None):
+    memory = ConversationMemory(db_path, max_messages=10)
+    journal = None
+    if journal_dir is not None:
+        # Поток журнала ждет долго: сброс в тестах вызывается вручную
+        journal = MessageJournal(repo, journal_dir, batch_size=100, flush_interval=3600, on_confirmed=memory.confirm)
+        journal.start()
+    return AIService(None, None, repo, journal=journal, memory=memory)
+
+def history(service):
+    return [m.content for m in asyncio.run(service._load_history(20, 1, 10))]
+
+def test_append_from_another_worker_makes_the_buffer_stale(tmp_path):
+    repo, path = FakeRepo(), str(tmp_path / "memory.sqlite3")
+    first, second = make_worker(repo, path), make_worker(repo, path)
+
+    first.save_message(20, Message(role='user', content="q1"), 1)
+    assert history(second) == ["q1"]
+    assert second.memory.get(1, 20, 10) is not None
+
+    first.save_message(20, Message(role='assistant', content="a1"), 1)
+    assert second.memory.get(1, 20, 10) is None
+    assert history(second) == ["q1", "a1"]
+
+    second.save_message(20, Message(role='user', content="q2"), 1)
+    assert second.memory.get(1, 20, 10) is not None
+    assert first.memory.get(1, 20, 10) is None
+
+def test_unflushed_row_of_another_worker_is_not_lost(tmp_path):
+    repo, path, journal_dir = FakeRepo(), str(tmp_path / "memory.sqlite3"), str(tmp_path / "journal")
+    first, second = make_worker(repo, path, journal_dir), make_worker(repo, path, journal_dir)
+    try:
+        first.save_message(20, Message(role='user', content="q1"), 1)
+        # Строка q1 пока только в журнале первого воркера: второй ее не видит
+        assert history(second) == []
+        second.save_message(20, Message(role='user', content="q2"), 1)
+        assert history(second) == ["q2"]
+
+        # Пока строка не в БД, версия не меняется и буфер первого воркера остается актуальным
+        assert history(first) == ["q1"]
+        assert first.journal.flush()
+        assert first.memory.get(1, 20, 10) == [Message(role='user', content="q1")]
+        assert second.memory.get(1, 20, 10) is None
+        assert history(second) == ["q1", "q2"]
+
+        assert second.journal.flush()
+        assert first.memory.get(1, 20, 10) is None
+        assert history(first) == ["q1", "q2"]
+        assert second.memory.get(1, 20, 10) is not None
+    finally:
+        first.journal.stop()
+        second.journal.stop()
@@ -0,0 +1,25 @@
+import json
+import os
+
+from src.infra.knowledge.faq_index import FaqIndex, pick_direct_answer
+from src.shared.config import FAQ_DIRECT_ANSWER_CONFIDENCE, FAQ_DIRECT_ANSWER_MIN_LEMMAS, FAQ_FILE_PATH, PROJECT_ROOT
+
+def _direct(index, question):
+    return pick_direct_answer(index.search(question, top_k=3), FAQ_DIRECT_ANSWER_CONFIDENCE, FAQ_DIRECT_ANSWER_MIN_LEMMAS)
+
+def test_short_and_near_miss_questions_are_not_answered_from_faq():
+    index = FaqIndex(FAQ_FILE_PATH)
+    for question in ("ипотека", "Можно ли сохранить ипотеку?", "Можно ли пройти банкротство без суда?", "Можно ли пройти банкротство через суд?"):
+        assert _direct(index, question) is None, question
+
+def test_held_out_eval_set_has_no_wrong_direct_answers():
+    index = FaqIndex(FAQ_FILE_PATH)
+    with open(os.path.join(PROJECT_ROOT, 'data', 'faq_eval.json'), 'r', encoding='utf-8') as f:
+        rows = json.load(f)
+    answered = 0
+    for row in rows:
+        match = _direct(index, row['question'])
+        if match is not None:
+            assert match.entry.question == row['expected'], row['question']
+            answered += 1
+    assert answered >= len([row for row in rows if row['expected']]) // 2
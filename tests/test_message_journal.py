@@ -0,0 +1,78 @@
+from src.domain.models import Message
+from src.infra.storage.message_journal import MessageJournal
+
+class FakeRepo:
+    def __init__(self):
+        self.rows = []
+
+    def save_message(self, user_id, message, client_id):
+        self.rows.append({'user_id': user_id, 'role': message.role, 'content': message.content, 'client_id': client_id})
+
+    def save_messages_batch(self, rows):
+        self.rows.extend(rows)
+        return True
+
+class FailingRepo(FakeRepo):
+    def __init__(self):
+        super().__init__()
+        self.fail = True
+
+    def save_messages_batch(self, rows):
+        return False if self.fail else super().save_messages_batch(rows)
+
+def test_flush_writes_batches_and_confirms_keys(tmp_path):
+    repo, confirmed = FakeRepo(), []
+    journal = MessageJournal(repo, str(tmp_path), batch_size=2, flush_interval=3600, on_confirmed=confirmed.extend)
+    journal.start()
+    try:
+        for i in range(3):
+            assert journal.append(20 + i % 2, Message(role='user', content=f"m{i}"), 1) is True
+        assert [m.content for m in journal.pending_messages(20, 1)] == ["m0", "m2"]
+        assert journal.flush()
+        assert [row['content'] for row in repo.rows] == ["m0", "m1", "m2"]
+        assert confirmed == [(1, 20), (1, 21), (1, 20)]
+        assert journal.pending_messages(20, 1) == []
+    finally:
+        journal.stop()
+
+def test_failed_batch_stays_in_the_journal(tmp_path):
+    repo, confirmed = FailingRepo(), []
+    journal = MessageJournal(repo, str(tmp_path), batch_size=10, flush_interval=3600, on_confirmed=confirmed.extend)
+    journal.start()
+    try:
+        journal.append(20, Message(role='user', content="m0"), 1)
+        assert journal.flush() is False
+        assert confirmed == [] and repo.rows == []
+        assert len(journal.pending_messages(20, 1)) == 1
+
+        repo.fail = False
+        assert journal.flush()
+        assert confirmed == [(1, 20)]
+    finally:
+        journal.stop()
+
+def test_journal_of_a_dead_worker_is_replayed(tmp_path):
+    repo = FailingRepo()
+    dead = MessageJournal(repo, str(tmp_path), flush_interval=3600)
+    dead.start()
+    dead.append(20, Message(role='user', content="m0"), 1)
+    dead.append(20, Message(role='assistant', content="m1"), 1)
+    # Воркер "умер": поток не сбросил строки, блокировка журнала отпущена
+    dead._stopping = True
+    dead._wakeup.set()
+    dead._thread.join()
+    dead._lock_file.close()
+
+    repo.fail = False
+    survivor = MessageJournal(repo, str(tmp_path), flush_interval=3600)
+    assert survivor.replay() == 2
+    assert [m.content for m in survivor.pending_messages(20, 1)] == ["m0", "m1"]
+    assert survivor.flush()
+    assert [row['content'] for row in repo.rows] == ["m0", "m1"]
+    assert MessageJournal(repo, str(tmp_path)).replay() == 0
+
+def test_journal_without_thread_writes_directly(tmp_path):
+    repo = FakeRepo()
+    journal = MessageJournal(repo, str(tmp_path))
+    assert journal.append(20, Message(role='user', content="m0"), 1) is False
+    assert [row['content'] for row in repo.rows] == ["m0"]
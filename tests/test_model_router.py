@@ -0,0 +1,37 @@
+from src.app.services.model_router import ModelRouter, DEFAULT_ROUTE
+
+def test_unknown_or_missing_category_uses_the_default_route():
+    router = ModelRouter()
+    assert router.route(1, None).name == DEFAULT_ROUTE
+    assert router.route(1, "Неизвестная категория").name == DEFAULT_ROUTE
+    assert router.route(1, "Вопрос о стоимости").name == "cost"
+
+def test_global_overrides_accept_route_names_and_categories():
+    router = ModelRouter({
+        "cost": {"max_tokens": 300},
+        "Нецелевой запрос": {"model": "small-model", "temperature": 0.1, "colour": "red"},
+        "missing": {"max_tokens": 1},
+        "general": "not an object",
+    })
+    assert router.route(1, "Вопрос о стоимости").max_tokens == 300
+    offtopic = router.route(1, "Нецелевой запрос")
+    assert (offtopic.model, offtopic.temperature) == ("small-model", 0.1)
+    assert "missing" not in router.routes
+    assert router.route(1, None) == ModelRouter().route(1, None)
+
+def test_tenant_overrides_apply_only_to_that_client():
+    router = ModelRouter({"cost": {"max_tokens": 300}})
+    overrides = {"cost": {"timeout": 5}}
+
+    tenant_route = router.route(7, "Вопрос о стоимости", overrides)
+    assert (tenant_route.max_tokens, tenant_route.timeout) == (300, 5)
+    assert router.route(8, "Вопрос о стоимости").timeout != 5
+    # Таблица клиента разбирается один раз на объект переопределений
+    assert router._routes_for(7, overrides) is router._routes_for(7, overrides)
+    assert router.route(7, "Вопрос о стоимости", {"cost": {"timeout": 9}}).timeout == 9
+
+def test_tenant_overrides_as_json_string():
+    router = ModelRouter()
+    assert router.route(7, "Вопрос о стоимости", '{"cost": {"max_tokens": 111}}').max_tokens == 111
+    assert router.route(8, "Вопрос о стоимости", "not json") == router.route(8, "Вопрос о стоимости")
+    assert router.route(9, "Вопрос о стоимости", '["cost"]') == router.route(9, "Вопрос о стоимости")
@@ -0,0 +1,16 @@
+from src.app.services.response_cache import ResponseCache
+
+def test_cache_key_keeps_meaningful_prepositions():
+    pairs = [
+        ("Можно ли пройти банкротство без суда?", "Можно ли пройти банкротство через суд?"),
+        ("Что будет с квартирой при банкротстве?", "Что будет с квартирой до банкротства?"),
+        ("Можно ли взять кредит после банкротства?", "Можно ли взять кредит до банкротства?"),
+        ("Можно ли не платить кредит?", "Можно ли платить кредит?"),
+        ("Сколько стоит банкротство для пенсионера?", "Сколько стоит банкротство от пенсионера?"),
+    ]
+    for first, second in pairs:
+        assert ResponseCache.make_key(first) != ResponseCache.make_key(second), (first, second)
+
+def test_cache_key_ignores_filler_words_and_word_forms():
+    assert ResponseCache.make_key("Здравствуйте, подскажите, сколько стоит банкротство?") == ResponseCache.make_key("Сколько стоит банкротство")
+    assert ResponseCache.make_key("Сколько стоит банкротство физлица?") == ResponseCache.make_key("сколько стоит банкротство физлиц")
@@ -0,0 +1,96 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.infra.clients.openrouter_client import LLM_ERROR_MESSAGE, OpenRouterClient
+
+def chunk(content=None, finish_reason=None):
+    return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=content), finish_reason=finish_reason)])
+
+class FakeStream:
+    def __init__(self, chunks, error=None):
+        self.chunks, self.error = chunks, error
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for item in self.chunks:
+            yield item
+        if self.error:
+            raise self.error
+
+def make_client(stream: FakeStream) -> OpenRouterClient:
+    client = OpenRouterClient.__new__(OpenRouterClient)
+    client.headers = {}
+    client._semaphore = asyncio.Semaphore(1)
+
+    async def create(**kwargs):
+        return stream
+
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return client
+
+def collect(client: OpenRouterClient) -> tuple:
+    stats = {}
+
+    async def scenario():
+        return [piece async for piece in client.stream_chat_completion([], stats=stats)]
+
+    return "".join(asyncio.run(scenario())), stats
+
+def test_complete_stream_reports_stop():
+    text, stats = collect(make_client(FakeStream([chunk("Отв"), chunk("ет"), chunk(finish_reason="stop")])))
+    assert text == "Ответ"
+    assert stats["finish_reason"] == "stop"
+
+def test_stream_cut_by_token_limit_reports_length():
+    _, stats = collect(make_client(FakeStream([chunk("Начало"), chunk(finish_reason="length")])))
+    assert stats["finish_reason"] == "length"
+
+def test_stream_failing_midway_reports_error_and_keeps_partial_text():
+    text, stats = collect(make_client(FakeStream([chunk("Начало ответа")], error=RuntimeError("connection reset"))))
+    assert text == "Начало ответа"
+    assert stats["finish_reason"] == "error"
+
+def test_stream_failing_before_any_text_yields_error_message():
+    text, stats = collect(make_client(FakeStream([], error=RuntimeError("connection reset"))))
+    assert text == LLM_ERROR_MESSAGE
+    assert stats["finish_reason"] == "error"
+
+def test_incomplete_streamed_answer_is_not_cached():
+    from src.app.services.ai_service import AIService
+    from src.app.services.response_cache import ResponseCache
+    from src.domain.models import TurnContext
+
+    streams = [
+        FakeStream([chunk("Начало ответа")], error=RuntimeError("connection reset")),
+        FakeStream([chunk("Полный ответ"), chunk(finish_reason="stop")]),
+    ]
+    or_client = make_client(streams[0])
+
+    async def create(**kwargs):
+        return streams.pop(0)
+
+    or_client.client.chat.completions.create = create
+    service = AIService(or_client, whisper_client=None, repo=None)
+    service.response_cache = ResponseCache()
+    turn = TurnContext(user_id=1, client_id=1, system_prompt="Промпт", history=[])
+    partials = []
+
+    async def on_partial(text):
+        partials.append(text)
+
+    async def ask():
+        return await service.get_text_response(1, "Сколько стоит банкротство?", 1, on_partial=on_partial, turn=turn)
+
+    text, debug_info = asyncio.run(ask())
+    assert text == "Начало ответа"
+    assert debug_info["incomplete"] == "error"
+
+    text, debug_info = asyncio.run(ask())
+    assert text == "Полный ответ"
+    assert debug_info["incomplete"] is None
+    assert not debug_info.get("cache_hit")
+
+    _, debug_info = asyncio.run(ask())
+    assert debug_info.get("cache_hit")
@@ -0,0 +1,56 @@
+from src.app.prompts.compiler import PromptCompiler
+from src.domain.models import Message
+
+def words(prefix: str, count: int) -> str:
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+HISTORY = [Message(role='user' if i % 2 == 0 else 'assistant', content=words(f"h{i}_", 20)) for i in range(10)]
+CHUNKS = [{'content': words(f"c{i}_", 50)} for i in range(5)]
+
+def test_everything_fits_a_large_budget():
+    compiled = PromptCompiler(100000).compile("система", "вопрос", HISTORY, CHUNKS, quiz_context="квиз", summary="сводка")
+
+    assert compiled.dropped == {}
+    assert compiled.history == HISTORY and compiled.rag_chunks == CHUNKS
+    assert [m['role'] for m in compiled.messages] == ['system'] * 5 + ['user']
+    assert compiled.messages[0]['content'] == "система"
+    assert compiled.total_tokens == sum(v for k, v in compiled.usage.items() if k != 'total')
+
+def test_small_budget_drops_old_history_and_low_ranked_chunks():
+    compiler = PromptCompiler(200)
+    compiled = compiler.compile("система", "вопрос", HISTORY, CHUNKS, quiz_context="квиз", summary="сводка")
+
+    assert compiled.total_tokens <= compiled.budget
+    assert 0 < len(compiled.history) < len(HISTORY)
+    # История обрезается с начала, фрагменты — с конца ранжированного списка
+    assert compiled.history == HISTORY[-len(compiled.history):]
+    assert compiled.rag_chunks == CHUNKS[:len(compiled.rag_chunks)]
+    assert compiled.dropped['history'] == len(HISTORY) - len(compiled.history)
+    assert compiled.dropped.get('knowledge', 0) == len(CHUNKS) - len(compiled.rag_chunks)
+    assert 'quiz' in compiled.usage and 'summary' in compiled.usage
+
+def test_quiz_and_summary_take_priority_over_knowledge_and_history():
+    quiz, summary = words("q", 40), words("s", 40)
+    full = PromptCompiler(100000).compile("система", "вопрос", [], [], quiz_context=quiz, summary=summary)
+    # Бюджет с запасом меньше одного фрагмента или сообщения истории
+    budget = full.total_tokens + 5
+    compiled = PromptCompiler(budget).compile("система", "вопрос", HISTORY, CHUNKS, quiz_context=quiz, summary=summary)
+
+    assert 'quiz' not in compiled.dropped and 'summary' not in compiled.dropped
+    assert compiled.rag_chunks == [] and compiled.history == []
+    assert compiled.dropped == {'knowledge': len(CHUNKS), 'history': len(HISTORY)}
+    assert compiled.total_tokens == full.total_tokens
+
+def test_oversized_summary_is_dropped_but_question_always_stays():
+    compiled = PromptCompiler(60).compile("система", "вопрос", HISTORY, CHUNKS, summary=words("s", 500))
+
+    assert compiled.dropped['summary'] == 1
+    assert compiled.messages[-1] == {"role": "user", "content": "Вопрос клиента: «вопрос»"}
+    assert compiled.messages[-2]['content'].endswith("user: вопрос")
+
+def test_system_prompt_over_budget_still_compiles():
+    compiled = PromptCompiler(10).compile(words("p", 100), "вопрос", HISTORY, CHUNKS)
+
+    assert compiled.total_tokens > compiled.budget
+    assert compiled.history == [] and compiled.rag_chunks == []
+    assert compiled.dropped == {'knowledge': len(CHUNKS), 'history': len(HISTORY)}
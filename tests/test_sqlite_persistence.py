@@ -0,0 +1,87 @@
+import asyncio
+
+from telegram import Update
+from telegram.ext import Application, CommandHandler
+
+from src.api.telegram.shared_conversation import SharedConversationHandler, sync_shared_conversations
+from src.infra.storage.sqlite_persistence import SQLitePersistence
+
+def make_update(chat_id: int, user_id: int) -> Update:
+    return Update.de_json({
+        "update_id": 1,
+        "message": {
+            "message_id": 1, "date": 0, "text": "привет",
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+        }
+    }, None)
+
+def make_app(persistence: SQLitePersistence) -> tuple:
+    app = Application.builder().token("123:test").persistence(persistence).build()
+    handler = SharedConversationHandler(
+        entry_points=[CommandHandler("form", lambda update, context: None)],
+        states={}, fallbacks=[], name="form", persistent=True
+    )
+    app.add_handler(handler)
+    return app, handler
+
+def test_conversation_state_follows_the_other_worker(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    writer = SQLitePersistence(path, namespace=1)
+    app, handler = make_app(SQLitePersistence(path, namespace=1))
+    update = make_update(10, 20)
+
+    async def scenario():
+        await handler._initialize_persistence(app)
+        await writer.update_conversation("form", (10, 20), 2)
+        await sync_shared_conversations(app, update)
+        assert handler._conversations.get((10, 20)) == 2
+
+        await writer.update_conversation("form", (10, 20), None)
+        await sync_shared_conversations(app, update)
+        assert (10, 20) not in handler._conversations
+
+    asyncio.run(scenario())
+
+def test_conversation_states_are_isolated_by_namespace(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    first, second = SQLitePersistence(path, namespace=1), SQLitePersistence(path, namespace=2)
+
+    async def scenario():
+        await first.update_conversation("form", (10, 20), 3)
+        await first.update_conversation("broadcast", (10, 20), 1)
+
+    asyncio.run(scenario())
+    keys = [("form", (10, 20)), ("broadcast", (10, 20)), ("checklist_management", (10, 20))]
+    assert first.load_conversation_states(keys) == {("form", (10, 20)): 3, ("broadcast", (10, 20)): 1}
+    assert second.load_conversation_states(keys) == {}
+
+def test_user_data_refresh_sees_writes_from_another_worker(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    writer, reader = SQLitePersistence(path, namespace=1), SQLitePersistence(path, namespace=1)
+    user_data = {}
+
+    async def scenario():
+        await writer.update_user_data(20, {"step": 1})
+        await reader.refresh_user_data(20, user_data)
+        assert user_data == {"step": 1}
+
+        await writer.update_user_data(20, {"step": 2})
+        await reader.refresh_user_data(20, user_data)
+        assert user_data == {"step": 2}
+
+        await writer.drop_user_data(20)
+        await reader.refresh_user_data(20, user_data)
+        assert user_data == {}
+
+    asyncio.run(scenario())
+
+def test_shared_value_round_trip(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    writer, reader = SQLitePersistence(path, namespace=1), SQLitePersistence(path, namespace=1)
+
+    async def scenario():
+        await writer.save_shared_value("last_debug_info", {"user_question": "вопрос"})
+        return await reader.load_shared_value("last_debug_info")
+
+    assert asyncio.run(scenario()) == {"user_question": "вопрос"}
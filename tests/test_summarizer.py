@@ -0,0 +1,85 @@
+import asyncio
+
+from src.app.memory.summarizer import ConversationSummarizer
+
+class FakeRepo:
+    def __init__(self, count):
+        self.rows = [
+            {'role': 'user' if i % 2 == 0 else 'assistant', 'content': f"m{i}", 'created_at': f"t{i:03d}"}
+            for i in range(count)
+        ]
+        self.summary, self.through = None, None
+
+    def get_conversation_summary(self, user_id, client_id):
+        return self.summary, self.through
+
+    def get_messages_after(self, user_id, client_id, through, limit):
+        return [row for row in self.rows if through is None or row['created_at'] > through][:limit]
+
+    def update_conversation_summary(self, user_id, client_id, summary, through):
+        self.summary, self.through = summary, through
+        return True
+
+class FakeLLM:
+    def __init__(self, answer="сводка"):
+        self.answer = answer
+        self.calls = []
+
+    async def get_chat_completion(self, messages):
+        self.calls.append(messages)
+        return self.answer
+
+def make_summarizer(tmp_path, repo=None, llm=None, **kwargs):
+    return ConversationSummarizer(llm or FakeLLM(), repo or FakeRepo(0), str(tmp_path / "summary.sqlite3"), **kwargs)
+
+def test_turn_counter_is_shared_and_starts_due(tmp_path):
+    first, second = make_summarizer(tmp_path, every_turns=3), make_summarizer(tmp_path, every_turns=3)
+    key = (1, 20)
+
+    # У нового пользователя нет счетчика: сворачиваем на первом же ходе
+    assert first._take_turn(key) is True
+    assert [first._take_turn(key), second._take_turn(key), first._take_turn(key)] == [False, False, True]
+    assert second._take_turn(key) is False
+
+def test_failed_summary_is_retried_on_the_next_turn(tmp_path):
+    summarizer, key = make_summarizer(tmp_path, every_turns=3), (1, 20)
+    assert summarizer._take_turn(key) is True
+    summarizer._retry_next_turn(key)
+    assert summarizer._take_turn(key) is True
+    assert summarizer._take_turn(key) is False
+
+def test_idle_counters_are_pruned(tmp_path):
+    summarizer, key = make_summarizer(tmp_path, every_turns=3, idle_ttl=60), (1, 20)
+    assert summarizer._take_turn(key) is True
+    assert summarizer._take_turn(key) is False
+    summarizer.db.execute("UPDATE summary_turns SET updated_at = updated_at - 61")
+    summarizer._last_prune = 0.0
+    # Простаивающие счетчики удаляются при учете хода любого пользователя
+    summarizer._take_turn((1, 21))
+    assert summarizer._take_turn(key) is True
+
+def test_summary_keeps_recent_messages_unfolded(tmp_path):
+    repo, llm = FakeRepo(10), FakeLLM()
+    summarizer = make_summarizer(tmp_path, repo, llm, keep_recent=4, max_batch=30)
+
+    assert asyncio.run(summarizer.summarize(1, 20)) is True
+    assert (repo.summary, repo.through) == ("сводка", "t005")
+    assert "m5" in llm.calls[0][1]["content"] and "m6" not in llm.calls[0][1]["content"]
+    assert asyncio.run(summarizer.summarize(1, 20)) is False
+
+def test_failed_llm_call_leaves_the_summary_unchanged(tmp_path):
+    repo = FakeRepo(10)
+    summarizer = make_summarizer(tmp_path, repo, FakeLLM(answer=""), keep_recent=4)
+    assert asyncio.run(summarizer.summarize(1, 20)) is None
+    assert repo.through is None
+
+def test_long_backlog_is_folded_over_several_turns(tmp_path):
+    repo = FakeRepo(20)
+    summarizer = make_summarizer(tmp_path, repo, keep_recent=4, max_batch=5, every_turns=3)
+    key = (1, 20)
+    summarizer._take_turn(key)
+
+    assert asyncio.run(summarizer.summarize(*key)) is True
+    assert repo.through == "t004"
+    # Свернута не вся очередь: следующий ход снова запускает сворачивание
+    assert summarizer._take_turn(key) is True
@@ -0,0 +1,25 @@
+from src.infra.storage.update_dedup import UpdateDeduplicator
+
+def test_duplicate_is_detected_across_workers(tmp_path):
+    path = str(tmp_path / "dedup.sqlite3")
+    first, second = UpdateDeduplicator(path), UpdateDeduplicator(path)
+
+    assert first.is_duplicate("bot", 1) is False
+    assert first.is_duplicate("bot", 1) is True
+    assert second.is_duplicate("bot", 1) is True
+    assert second.is_duplicate("other-bot", 1) is False
+
+def test_update_is_accepted_again_after_ttl(tmp_path):
+    dedup = UpdateDeduplicator(str(tmp_path / "dedup.sqlite3"), ttl_seconds=60)
+    assert dedup.is_duplicate("bot", 1) is False
+    dedup.db.execute("UPDATE processed_updates SET seen_at = seen_at - 61")
+    dedup._recent.clear()
+    assert dedup.is_duplicate("bot", 1) is False
+
+def test_forgotten_update_is_not_a_duplicate(tmp_path):
+    path = str(tmp_path / "dedup.sqlite3")
+    first, second = UpdateDeduplicator(path), UpdateDeduplicator(path)
+    assert first.is_duplicate("bot", 1) is False
+    first.forget("bot", 1)
+    assert second.is_duplicate("bot", 1) is False
+    assert first.is_duplicate("bot", 1) is True
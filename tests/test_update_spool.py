@@ -0,0 +1,102 @@
+import asyncio
+
+from src.infra.storage.update_spool import SpoolConsumer, UpdateSpool
+
+def make_spool(tmp_path, **kwargs) -> UpdateSpool:
+    return UpdateSpool(str(tmp_path / "spool.sqlite3"), **kwargs)
+
+def other_worker(spool: UpdateSpool) -> UpdateSpool:
+    other = UpdateSpool(spool.db.db_path, lease_seconds=spool.lease_seconds, max_attempts=spool.max_attempts)
+    other.owner = "other-host:1"
+    return other
+
+def test_claims_one_update_per_chat_in_order(tmp_path):
+    spool = make_spool(tmp_path)
+    first = spool.append("bot", 1, 10, {"update_id": 1})
+    second = spool.append("bot", 2, 10, {"update_id": 2})
+    other_chat = spool.append("bot", 3, 20, {"update_id": 3})
+
+    assert [item.id for item in spool.claim_batch(10)] == [first, other_chat]
+    assert spool.claim_batch(10) == []
+
+    spool.ack(first)
+    assert [item.id for item in spool.claim_batch(10)] == [second]
+
+def test_expired_lease_is_reclaimed_and_renewal_keeps_it(tmp_path):
+    spool = make_spool(tmp_path, lease_seconds=60)
+    spool_id = spool.append("bot", 1, 10, {"update_id": 1})
+    assert [item.id for item in spool.claim_batch(1)] == [spool_id]
+    other = other_worker(spool)
+
+    spool.db.execute("UPDATE update_spool SET claimed_at = claimed_at - 61")
+    assert spool.renew([spool_id]) == 1
+    assert other.claim_batch(1) == []
+
+    spool.db.execute("UPDATE update_spool SET claimed_at = claimed_at - 61")
+    assert [item.id for item in other.claim_batch(1)] == [spool_id]
+    # Аренду забрал другой воркер: продлить или вернуть апдейт прежний владелец уже не может
+    assert spool.renew([spool_id]) == 0
+    assert spool.fail(spool_id) is False
+
+def test_failed_update_is_retried_then_parked(tmp_path):
+    spool = make_spool(tmp_path, max_attempts=2)
+    failing = spool.append("bot", 1, 10, {"update_id": 1})
+    following = spool.append("bot", 2, 10, {"update_id": 2})
+
+    spool.claim_batch(1)
+    assert spool.fail(failing) is True
+    assert [item.id for item in spool.claim_batch(1)] == [failing]
+    assert spool.fail(failing) is False
+
+    # Исчерпавший попытки апдейт не блокирует следующий апдейт того же чата
+    assert [item.id for item in spool.claim_batch(10)] == [following]
+    assert spool.pending_count() == 1
+
+def test_consumer_acks_successes_and_retries_failures(tmp_path):
+    spool = make_spool(tmp_path, max_attempts=2)
+    spool.append("bot", 1, 10, {"update_id": 1})
+    spool.append("bot", 2, 20, {"update_id": 2})
+    calls = []
+
+    async def handler(item):
+        calls.append(item.update_id)
+        if item.update_id == 2:
+            raise RuntimeError("handler failed")
+
+    async def scenario():
+        consumer = SpoolConsumer(spool, handler, poll_interval=0.01)
+        consumer.start()
+        for _ in range(200):
+            if calls.count(2) == 2 and not consumer._in_flight:
+                break
+            await asyncio.sleep(0.01)
+        await consumer.stop()
+
+    asyncio.run(scenario())
+    assert calls.count(1) == 1
+    assert calls.count(2) == 2
+    row = spool.db.execute("SELECT update_id, status, attempts FROM update_spool").fetchall()
+    assert row == [(2, 'failed', 2)]
+
+def test_consumer_renews_lease_of_slow_update(tmp_path):
+    spool = make_spool(tmp_path, lease_seconds=1)
+    spool.append("bot", 1, 10, {"update_id": 1})
+    other = other_worker(spool)
+    stolen = []
+
+    async def handler(item):
+        for _ in range(15):
+            await asyncio.sleep(0.1)
+            stolen.extend(await asyncio.to_thread(other.claim_batch, 1))
+
+    async def scenario():
+        consumer = SpoolConsumer(spool, handler, poll_interval=0.05)
+        consumer.start()
+        await asyncio.sleep(0.1)
+        while consumer._in_flight:
+            await asyncio.sleep(0.05)
+        await consumer.stop()
+
+    asyncio.run(scenario())
+    assert stolen == []
+    assert spool.pending_count() == 0